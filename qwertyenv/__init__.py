@@ -1,26 +1,54 @@
-from gymnasium.envs.registration import register
-from .ensure_valid_action import EnsureValidAction
-from .up_down_left_right import UpDownLeftRight
-from .pz_to_gymnasium_wrappers import aec_to_gymnasium, parallel_to_gymnasium
+import importlib
+
+from gymnasium.envs.registration import register, registry
 
 __version__ = "0.1.1"
 
 
-register(
-    id='qwertyenv/BlackJack-v0',
-    entry_point='qwertyenv.black_jack:BJEnv',
-    max_episode_steps=300
-)
-
-register(
-    id='qwertyenv/CollectCoins-v0',
-    entry_point='qwertyenv.collect_coins:CollectCoinsEnv',
-    max_episode_steps=300
-)
-
-__all__ = [
-    EnsureValidAction,
-    UpDownLeftRight,
-    aec_to_gymnasium,
-    parallel_to_gymnasium
-]
\ No newline at end of file
+# The public names are loaded (with their modules) on first access, so importing qwertyenv
+# (ex. for qwertyenv.black_jack or qwertyenv.collect_coins_game in a worker process)
+# does not import the wrappers and their dependencies (pettingzoo).
+_LAZY_NAMES = {
+    'EnsureValidAction': '.ensure_valid_action',
+    'UpDownLeftRight': '.up_down_left_right',
+    'RelativeMove': '.relative_move',
+    'TrajectoryRecorder': '.trajectory_recorder',
+    'aec_to_gymnasium': '.pz_to_gymnasium_wrappers',
+    'aec_to_gymnasium_vector': '.pz_to_gymnasium_wrappers',
+    'parallel_to_gymnasium': '.pz_to_gymnasium_wrappers',
+}
+
+
+_ENVS = {
+    'qwertyenv/BlackJack-v0': 'qwertyenv.black_jack:BJEnv',
+    'qwertyenv/CollectCoins-v0': 'qwertyenv.collect_coins:CollectCoinsEnv',
+}
+
+
+def register_envs():
+    """Registers the Gymnasium environments (once), ex. 'qwertyenv/CollectCoins-v0' for gymnasium.make.
+
+    Called on 'import qwertyenv'. The environments are registered by their entry points (strings),
+    so their modules are only imported on gymnasium.make.
+    """
+    for env_id, entry_point in _ENVS.items():
+        if env_id not in registry:
+            register(id=env_id, entry_point=entry_point, max_episode_steps=300)
+
+
+register_envs()
+
+
+def __getattr__(name):
+    if name in _LAZY_NAMES:
+        value = getattr(importlib.import_module(_LAZY_NAMES[name], __name__), name)
+        globals()[name] = value # next time found without __getattr__
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
+
+
+__all__ = list(_LAZY_NAMES) + ['register_envs']
@@ -0,0 +1,397 @@
+"""Throughput and memory benchmarks of the environments and the wrappers.
+
+Run with 'python -m qwertyenv.bench' (see --help). The results are printed, and optionally saved, as JSON,
+and can be compared with a stored run (--baseline), the exit code is then 1 when a benchmark regressed
+by more than the threshold.
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+
+class Result(NamedTuple):
+    name: str
+    value: float
+    unit: str  # '.../s' is better when higher, 'bytes' and 's' are better when lower
+
+
+def higher_is_better(unit: str) -> bool:
+    return unit.endswith("/s")
+
+
+# name -> a function that, given the duration to spend per measurement, yields results
+BENCHMARKS: Dict[str, Callable[[float], Iterator[Result]]] = {}
+
+
+def benchmark(name: str):
+    """Registers a benchmark (a function of the duration per measurement that yields Result-s)."""
+
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+
+    return register
+
+
+def rate(fn: Callable[[], None], duration: float) -> float:
+    """Calls fn repeatedly for about 'duration' seconds (after a warm-up call), returns the calls per second."""
+    fn()
+    calls, batch, start = 0, 1, time.perf_counter()
+    while True:
+        for _ in range(batch):
+            fn()
+        calls += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return calls / elapsed
+        batch = min(batch * 2, 1024)
+
+
+def memory_per_instance(make: Callable[[], object], n: int = 100) -> float:
+    """The memory (bytes, as traced by tracemalloc) allocated per instance, when making n instances."""
+    make()  # warm-up, ex. module level caches
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        instances = [make() for _ in range(n)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    del instances
+    return (after - before) / n
+
+
+def _stepper(env, action_fn: Callable[[object], object]) -> Callable[[], None]:
+    """A single Gymnasium environment's step (by the action of action_fn(observation)), resetting when done."""
+    observation = env.reset(seed=0)[0]
+
+    def step():
+        nonlocal observation
+        observation, _, terminated, truncated, _ = env.step(action_fn(observation))
+        if terminated or truncated:
+            observation = env.reset()[0]
+
+    return step
+
+
+def _vector_stepper(env, action_fn: Callable[[object], object]) -> Callable[[], None]:
+    """A vector environment's step (autoreset), by the batch of actions of action_fn(observations)."""
+    observations = env.reset(seed=0)[0]
+
+    def step():
+        nonlocal observations
+        observations = env.step(action_fn(observations))[0]
+
+    return step
+
+
+def _first_valid_move(observation):
+    return divmod(int(np.flatnonzero(observation["mask"])[0]), 8)
+
+
+def _midgame(pieces, moves: int = 10):
+    from .collect_coins_game import CollectCoinsGame
+
+    game = CollectCoinsGame(pieces)
+    rng = random.Random(0)
+    for _ in range(moves):
+        game.make_move(game.turn, rng.choice(game.legal_moves(game.turn)))
+    return game
+
+
+@benchmark("black_jack")
+def _black_jack(duration: float) -> Iterator[Result]:
+    from .black_jack import BJEnv
+
+    env = BJEnv()
+    yield Result("black_jack.step", rate(_stepper(env, lambda obs: 1 if obs["player_sum"] >= 6 else 0), duration), "steps/s")
+    yield Result("black_jack.reset", rate(env.reset, duration), "resets/s")
+    yield Result("black_jack.memory", memory_per_instance(BJEnv), "bytes")
+
+
+@benchmark("black_jack_vector")
+def _black_jack_vector(duration: float) -> Iterator[Result]:
+    from .black_jack_vector import BJVectorEnv
+
+    for num_envs in [64, 1024]:
+        env = BJVectorEnv(num_envs=num_envs)
+        sticks = np.ones(num_envs, dtype=np.int64)
+        steps = rate(_vector_stepper(env, lambda obs: sticks), duration) * num_envs
+        yield Result(f"black_jack_vector[{num_envs}].step", steps, "steps/s")
+
+
+@benchmark("black_jack_table")
+def _black_jack_table(duration: float) -> Iterator[Result]:
+    from .black_jack_table import BJTableEnv
+    from .pz_to_gymnasium_wrappers import parallel_to_gymnasium
+
+    env = BJTableEnv(num_seats=5)
+
+    def play_round():
+        observations = env.reset()
+        while env.agents:
+            observations = env.step({agent: 1 if observations[agent]["player_sum"] >= 6 else 0 for agent in env.agents})[0]
+
+    yield Result("black_jack_table[5].round", rate(play_round, duration), "rounds/s")
+    gym_env = parallel_to_gymnasium(
+        BJTableEnv(num_seats=5), "seat_0", lambda agent, obs: 1 if obs["player_sum"] >= 6 else 0
+    )
+    yield Result(
+        "parallel_to_gymnasium(black_jack_table[5]).step",
+        rate(_stepper(gym_env, lambda obs: 1 if obs["player_sum"] >= 6 else 0), duration),
+        "steps/s",
+    )
+
+
+@benchmark("collect_coins")
+def _collect_coins(duration: float) -> Iterator[Result]:
+    from .collect_coins import CollectCoinsEnv
+    from .collect_coins_search import AlphaBetaPlayer
+
+    for copy_observations in [True, False]:
+        env = CollectCoinsEnv(copy_observations=copy_observations)
+        step = _stepper(env, lambda obs: env.game.legal_moves(env.player)[0])
+        yield Result(f"collect_coins[copy_observations={copy_observations}].step", rate(step, duration), "steps/s")
+    for observation_mode in ["packed", "flat"]:
+        mode_env = CollectCoinsEnv(observation_mode=observation_mode)
+        step = _stepper(mode_env, lambda obs: mode_env.game.legal_moves(mode_env.player)[0])
+        yield Result(f"collect_coins[observation_mode={observation_mode}].step", rate(step, duration), "steps/s")
+    yield Result("collect_coins.reset", rate(env.reset, duration), "resets/s")
+    yield Result("collect_coins.memory", memory_per_instance(CollectCoinsEnv), "bytes")
+
+    game = _midgame(["knight", "knight"])
+
+    def mask():
+        game._action_masks[game.turn] = None  # as after a move
+        game.action_mask(game.turn)
+
+    yield Result("collect_coins_game.action_mask", rate(mask, duration), "masks/s")
+    yield Result("collect_coins_game.legal_moves", rate(lambda: game.legal_moves(game.turn), duration), "calls/s")
+
+    env.game = game
+    yield Result(
+        "collect_coins.opponent[random]",
+        rate(lambda: env.provide_alternative_valid_action(None, game.turn), duration),
+        "moves/s",
+    )
+    yield Result(
+        "collect_coins.opponent[alphabeta(depth=4)]",
+        rate(lambda: AlphaBetaPlayer(max_time=None, max_depth=4)(game, game.turn), duration),
+        "moves/s",
+    )
+
+
+@benchmark("collect_coins_pz")
+def _collect_coins_pz(duration: float) -> Iterator[Result]:
+    from .collect_coins_pz import CollectCoinsEnv
+
+    for with_mask in [False, True]:
+        env = CollectCoinsEnv(pieces=["knight", "knight"], with_mask=with_mask)
+        env.reset(seed=0)
+
+        def step():
+            observation, _, terminated, truncated, _ = env.last()
+            if terminated or truncated:
+                env.step(None)
+                if not env.agents:
+                    env.reset()
+                return
+            if with_mask:
+                env.step(_first_valid_move(observation))
+            else:
+                env.step(env.provide_alternative_valid_action(None))
+
+        yield Result(f"collect_coins_pz[{'mask' if with_mask else 'callback'}].step", rate(step, duration), "steps/s")
+    yield Result("collect_coins_pz.memory", memory_per_instance(lambda: CollectCoinsEnv(with_mask=True)), "bytes")
+
+
+@benchmark("collect_coins_vector")
+def _collect_coins_vector(duration: float) -> Iterator[Result]:
+    from .collect_coins_vector import CollectCoinsVectorEnv
+
+    for num_envs in [64, 1024]:
+        env = CollectCoinsVectorEnv(num_envs=num_envs)
+        def first_valid(observations):
+            squares = env.action_masks().argmax(axis=1)
+            return np.stack(np.divmod(squares, 8), axis=1)
+
+        steps = rate(_vector_stepper(env, first_valid), duration) * num_envs
+        yield Result(f"collect_coins_vector[{num_envs}].step", steps, "steps/s")
+        yield Result(f"collect_coins_vector[{num_envs}].action_masks", rate(env.action_masks, duration) * num_envs, "masks/s")
+
+
+@benchmark("wrappers")
+def _wrappers(duration: float) -> Iterator[Result]:
+    from .collect_coins import CollectCoinsEnv
+    from .collect_coins_game import KNIGHT_OFFSETS
+    from .collect_coins_vector import CollectCoinsVectorEnv
+    from .ensure_valid_action import EnsureValidAction
+    from .relative_move import RelativeMove
+    from .up_down_left_right import UpDownLeftRight
+
+    env = CollectCoinsEnv()
+    action_space = env.action_space
+    action_space.seed(0)
+    actions = [action_space.sample() for _ in range(1024)]
+    index = 0
+
+    def random_action(obs):
+        nonlocal index
+        index = (index + 1) % len(actions)
+        return actions[index]
+
+    wrapped = EnsureValidAction(env, env.check_action_valid, env.provide_alternative_valid_action, lambda a: None)
+    yield Result("ensure_valid_action[callbacks].step", rate(_stepper(wrapped, random_action), duration), "steps/s")
+    env = CollectCoinsEnv()
+    wrapped = EnsureValidAction(env, action_mask=lambda: env.game.legal_move_bits(env.player))
+    yield Result("ensure_valid_action[mask].step", rate(_stepper(wrapped, random_action), duration), "steps/s")
+
+    num_envs = 1024
+    vector_env = CollectCoinsVectorEnv(num_envs=num_envs)
+    wrapped = EnsureValidAction(vector_env, action_mask=vector_env.action_masks)
+    wrapped.action_space.seed(0)
+    batch = wrapped.action_space.sample()
+    steps = rate(_vector_stepper(wrapped, lambda obs: batch), duration) * num_envs
+    yield Result(f"ensure_valid_action[mask](collect_coins_vector[{num_envs}]).step", steps, "steps/s")
+
+    env = CollectCoinsEnv()
+    udlr = UpDownLeftRight(env, lambda: env.game.locations[env.player])
+    yield Result("up_down_left_right.action", rate(lambda: udlr.action(2), duration), "actions/s")
+    relative = RelativeMove(env, lambda: env.game.locations[env.player], offsets=KNIGHT_OFFSETS)
+    yield Result("relative_move.action", rate(lambda: relative.action(2), duration), "actions/s")
+    relative = RelativeMove(wrapped, lambda: vector_env.locations[:, vector_env.player], offsets=KNIGHT_OFFSETS)
+    directions = np.zeros(num_envs, dtype=np.int64)
+    yield Result(f"relative_move[{num_envs}].action", rate(lambda: relative.action(directions), duration) * num_envs, "actions/s")
+
+
+@benchmark("pz_to_gymnasium")
+def _pz_to_gymnasium(duration: float) -> Iterator[Result]:
+    from .collect_coins_pz import CollectCoinsEnv
+    from .pz_to_gymnasium_wrappers import aec_to_gymnasium, aec_to_gymnasium_vector
+
+    # All the agents are played by a small (random) two layers policy network over the masks, a call per batch:
+    # a single observation for aec_to_gymnasium, all the pending ones for aec_to_gymnasium_vector.
+    rng = np.random.default_rng(0)
+    hidden_weights, output_weights = rng.standard_normal((64, 128)), rng.standard_normal((128, 64))
+
+    def policy(masks):
+        scores = np.tanh(masks @ hidden_weights) @ output_weights
+        return np.where(masks, scores, -np.inf).argmax(axis=1)
+
+    def act(observation):
+        return divmod(int(policy(observation["mask"][None])[0]), 8)
+
+    env = aec_to_gymnasium(CollectCoinsEnv(with_mask=True), "player_0", lambda agent, observation: act(observation))
+    yield Result("aec_to_gymnasium(collect_coins_pz).step", rate(_stepper(env, act), duration), "steps/s")
+
+    def act_batch(observations):
+        return divmod(policy(observations["mask"]), 8)
+
+    def act_others_batch(agents, observations):
+        rows, cols = act_batch(dict(mask=np.stack([observation["mask"] for observation in observations])))
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    num_envs = 64
+    vector_env = aec_to_gymnasium_vector(
+        [CollectCoinsEnv(with_mask=True) for _ in range(num_envs)], "player_0", act_others_batch
+    )
+    steps = rate(_vector_stepper(vector_env, act_batch), duration) * num_envs
+    yield Result(f"aec_to_gymnasium_vector[{num_envs}](collect_coins_pz).step", steps, "steps/s")
+
+
+@benchmark("import")
+def _import(duration: float) -> Iterator[Result]:
+    for module in ["qwertyenv", "qwertyenv.collect_coins_game", "qwertyenv.collect_coins_pz"]:
+        code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+        seconds = min(
+            float(subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout)
+            for _ in range(3)
+        )
+        yield Result(f"import {module}", seconds, "s")
+
+
+def run(names: Optional[List[str]] = None, duration: float = 0.5) -> Dict[str, dict]:
+    """Runs the benchmarks (all, or the ones whose name contains any of 'names').
+
+    Returns:
+      Per result's name, a dict with 'value' and 'unit'.
+    """
+    results = {}
+    for name, fn in BENCHMARKS.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        for result in fn(duration):
+            results[result.name] = dict(value=result.value, unit=result.unit)
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float = 0.2) -> List[str]:
+    """The regressions, results worse than in the baseline by more than 'threshold' (a fraction, ex. 0.2 for 20%).
+
+    Returns:
+      A description per regression (benchmarks missing from either side are ignored).
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        value, base = result["value"], baseline[name]["value"]
+        if higher_is_better(result["unit"]):
+            regressed = value < base * (1 - threshold)
+        else:
+            regressed = value > base * (1 + threshold)
+        if regressed:
+            regressions.append(f"{name}: {value:.4g} {result['unit']} (baseline {base:.4g})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m qwertyenv.bench", description=__doc__)
+    parser.add_argument("names", nargs="*", help=f"run only the benchmarks containing those, of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--duration", type=float, default=0.5, help="seconds per measurement")
+    parser.add_argument("--output", help="save the results (JSON) to this file")
+    parser.add_argument("--baseline", help="a JSON file of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="the allowed slowdown (fraction) vs. the baseline")
+    args = parser.parse_args(argv)
+
+    report = dict(
+        meta=dict(
+            python=platform.python_version(),
+            platform=platform.platform(),
+            numpy=np.__version__,
+            time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+            duration=args.duration,
+        ),
+        results=run(args.names, args.duration),
+    )
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(report["results"], baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,132 @@
+from bisect import bisect_right
+import functools
 import gymnasium as gym
+import numpy as np
 import random
 
 
+# The dealer stops with 17 or more, hence ends with a sum between 17 and 26 (16 + 10).
+DEALER_FINAL_SUMS = np.arange(17, 27)
+
+
+@functools.lru_cache(maxsize=None)
+def _dealer_final_sum_probabilities(raw_sum, has_Ace):
+    """
+    the probabilities of each of DEALER_FINAL_SUMS, given the (raw) sum of the dealer's cards so far
+    """
+    cur_sum = raw_sum + 10 if raw_sum <= 11 and has_Ace else raw_sum
+    probabilities = np.zeros(len(DEALER_FINAL_SUMS))
+    if cur_sum >= 17:
+        probabilities[cur_sum - DEALER_FINAL_SUMS[0]] = 1.0
+        return probabilities
+    for card in range(1, 11):
+        probabilities += _dealer_final_sum_probabilities(raw_sum + card, has_Ace or card == 1) / 10
+    return probabilities
+
+
+@functools.lru_cache(maxsize=None)
+def dealer_outcome_table():
+    """
+    The distribution of the dealer's final sum given the dealer's two starting cards.
+
+    Returns an array of shape (10, 10, len(DEALER_FINAL_SUMS)),
+    indexed by [first card - 1, second card - 1, final sum - 17].
+    """
+    table = np.zeros((10, 10, len(DEALER_FINAL_SUMS)))
+    for first in range(1, 11):
+        for second in range(1, 11):
+            table[first - 1, second - 1] = _dealer_final_sum_probabilities(first + second, 1 in (first, second))
+    table.flags.writeable = False
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def _stick_reward_table():
+    """
+    The reward of sticking given the player's sum and the dealer's final sum,
+    an array of shape (11, len(DEALER_FINAL_SUMS)), indexed by [player sum - 11, final sum - 17].
+    """
+    player_sums = np.arange(11, 22)
+    rewards = np.where(
+        DEALER_FINAL_SUMS[None, :] > 21,
+        1, # dealer busted
+        np.sign(player_sums[:, None] - DEALER_FINAL_SUMS[None, :]) # lose, draw or win
+    )
+    rewards.flags.writeable = False
+    return rewards
+
+
+@functools.lru_cache(maxsize=None)
+def dealer_expected_reward_table():
+    """
+    The expected reward of sticking given the player's sum and the dealer's two starting cards.
+
+    Returns an array of shape (10, 10, 11), indexed by [first card - 1, second card - 1, player sum - 11].
+    """
+    table = dealer_outcome_table() @ _stick_reward_table().T
+    table.flags.writeable = False
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def _dealer_outcome_cdf():
+    # nested lists (rather than an array) for fast scalar access from BJEnv.State
+    cdf = np.cumsum(dealer_outcome_table(), axis=-1)
+    cdf[..., -1] = 1.0
+    return cdf.tolist()
+
+
+class _UniformBuffer:
+    """
+    Uniform numbers in [0, 1) drawn from a numpy Generator in blocks (a call to the generator per block rather than per number)
+    """
+    def __init__(self, np_random, block_size=1024):
+        self.np_random = np_random
+        self.block_size = block_size
+        self._buffer = []
+        self._next = 0
+
+    def uniform(self):
+        if self._next == len(self._buffer):
+            self._buffer = self.np_random.random(self.block_size).tolist()
+            self._next = 0
+        u = self._buffer[self._next]
+        self._next += 1
+        return u
+
+    def card(self):
+        return 1 + int(self.uniform() * 10) # 1 - Ace, 2, .. 10
+
+
+class _GlobalRandom:
+    """
+    As _UniformBuffer, from Python's global random module (as BJEnv.State did before it was given a _UniformBuffer)
+    """
+    def uniform(self):
+        return random.random()
+
+    def card(self):
+        return random.randint(1, 10) # 1 - Ace, 2, .. 10
+
+
 class BJEnv(gym.Env):
     """
     Blackjack
     """
     
     class State:
-        def __init__(self):
+        def __init__(self, randoms=None):
+            # a _UniformBuffer (of the environment), by default Python's global random module
+            self.randoms = _GlobalRandom() if randoms is None else randoms
             # for the player I start with the sum rather than the cards to assure uniformity in the randomized start
-            self.player_sum = random.randint(11, 21)
+            self.player_sum = 11 + int(self.randoms.uniform() * 11) # 11 - 21
             # and so for the useful Ace
-            self.player_useful_Ace = random.randint(0, 1) == 1 # boolean
+            self.player_useful_Ace = self.randoms.uniform() < 0.5 # boolean
 
             self.dealer_cards = [self._random_card(), self._random_card()]
 
         def _random_card(self):
-            return random.randint(1, 10) # 1 - Ace, 2, .. 10
+            return self.randoms.card() # 1 - Ace, 2, .. 10
 
         def hits(self):
             new_card = self._random_card()
@@ -32,15 +141,15 @@ class BJEnv(gym.Env):
             return self._dealers_turn()
             
         def _dealers_turn(self):
-            cur_sum = sum(self.dealer_cards)
-            if cur_sum <= 11 and 1 in self.dealer_cards:
-                cur_sum += 10
-            while cur_sum < 17:
-                self.dealer_cards.append(self._random_card())
-                cur_sum = sum(self.dealer_cards)
-                if cur_sum <= 11 and 1 in self.dealer_cards:
-                    cur_sum += 10
-            return cur_sum
+            # Sampling the dealer's final sum from the precomputed distribution.
+            # Same distribution as drawing the dealer's cards one by one (till 17 or more).
+            first, second = self.dealer_cards[:2]
+            cdf = _dealer_outcome_cdf()[first - 1][second - 1]
+            return 17 + bisect_right(cdf, self.randoms.uniform()) # DEALER_FINAL_SUMS start with 17
+
+        def expected_stick_reward(self):
+            first, second = self.dealer_cards[:2]
+            return float(dealer_expected_reward_table()[first - 1, second - 1, self.player_sum - 11])
 
         def render(self):
             if self.player_useful_Ace:
@@ -54,8 +163,12 @@ class BJEnv(gym.Env):
             return "A" if value == 1 else value
 
                     
-    def __init__(self):
-        self.action_space = gym.spaces.Discrete(2) # 0 hits, 1 sticks
+    @staticmethod
+    def make_spaces():
+        """
+        returns the action space and the observation space (shared with the vectorized variant)
+        """
+        action_space = gym.spaces.Discrete(2) # 0 hits, 1 sticks
         
         obs_space = dict(
             player_sum = gym.spaces.Discrete(11), # x -> x + 11
@@ -63,15 +176,27 @@ class BJEnv(gym.Env):
             dealer_shown_card = gym.spaces.Discrete(10) # 0 - Ace, x -> x + 1 (ex. 1 is 2, 9 is 10)
         )
         
-        self.observation_space = gym.spaces.Dict(obs_space)
+        return action_space, gym.spaces.Dict(obs_space)
+
+    def __init__(self, expected_reward=False):
+        """
+        expected_reward: when True, sticking returns the exact expected reward (given the dealer's cards)
+        rather than a sampled one. Less variance when estimating values.
+        """
+        self.action_space, self.observation_space = BJEnv.make_spaces()
         self.render_mode = None
+        self.expected_reward = expected_reward
         self.reset()
     def render(self):
         self.state.render()
     def reset(self, seed=None, options=None):
-        if seed:
-          random.seed(seed)
-        self.state = BJEnv.State()
+        """
+        Each environment has its own random generator (self.np_random), seeded (from a SeedSequence) when a seed is given.
+        """
+        if seed is not None or not hasattr(self, '_randoms'):
+            super().reset(seed=seed)
+            self._randoms = _UniformBuffer(self.np_random)
+        self.state = BJEnv.State(self._randoms)
         return self._state_to_obs(), {}
     def _state_to_obs(self):
         return {
@@ -84,16 +209,19 @@ class BJEnv(gym.Env):
         reward = None
         info = {}
         if action == 1: # sticks
-            dealer_sum = self.state.stick()
-            if dealer_sum > 21:
-                reward = 1 # dealer busted
-            elif self.state.player_sum < dealer_sum:
-                reward = -1 # lose
-            elif self.state.player_sum == dealer_sum:
-                reward = 0 # draw
+            if self.expected_reward:
+                reward = self.state.expected_stick_reward()
             else:
-                reward = 1 # win
-            info['dealer sum'] = dealer_sum 
+                dealer_sum = self.state.stick()
+                if dealer_sum > 21:
+                    reward = 1 # dealer busted
+                elif self.state.player_sum < dealer_sum:
+                    reward = -1 # lose
+                elif self.state.player_sum == dealer_sum:
+                    reward = 0 # draw
+                else:
+                    reward = 1 # win
+                info['dealer sum'] = dealer_sum 
             done = True
         elif action == 0: # hits
             new_card = self.state.hits()
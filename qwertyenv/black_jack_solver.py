@@ -0,0 +1,103 @@
+import functools
+from typing import Callable, Tuple
+
+import numpy as np
+
+from qwertyenv.black_jack import dealer_expected_reward_table
+
+
+# The arrays below are indexed like BJEnv's observation (and then the action):
+# [player_sum - 11, player_useful_Ace, dealer_shown_card - 1, action (0 hits, 1 sticks)]
+STATES_SHAPE = (11, 2, 10)
+
+
+@functools.lru_cache(maxsize=None)
+def stick_values():
+    """
+    The expected reward of sticking given the player's sum and the dealer's shown card, shape (11, 10).
+    The dealer's second card is not seen, the expectation is also over it (uniform, as any card).
+    """
+    table = dealer_expected_reward_table().mean(axis=1).T # [first card - 1, player sum - 11] -> [player sum - 11, first card - 1]
+    table.flags.writeable = False
+    return table
+
+
+def _solve(policy_probabilities=None):
+    """
+    q and v for the given policy (per state the probabilities of hits and sticks), for the optimal policy when None.
+
+    The player's sum only grows while the useful Ace is kept, and hitting with a useful Ace may only lead
+    to states without one. Hence a single backward pass (no useful Ace first, then the sums from 21 down) is exact.
+    """
+    stick = stick_values()
+    q = np.zeros(STATES_SHAPE + (2,))
+    v = np.zeros(STATES_SHAPE)
+    for useful_Ace in (0, 1):
+        for player_sum in range(21, 10, -1):
+            hit = np.zeros(10)
+            for card in range(1, 11): # note since we start with 11 another Ace counts as 1
+                new_sum = player_sum + card
+                if new_sum <= 21:
+                    hit += v[new_sum - 11, useful_Ace]
+                elif useful_Ace:
+                    hit += v[new_sum - 10 - 11, 0] # the Ace is counted as 1 from now on
+                else:
+                    hit -= 1 # busted
+            q[player_sum - 11, useful_Ace, :, 0] = hit / 10
+            q[player_sum - 11, useful_Ace, :, 1] = stick[player_sum - 11]
+            if policy_probabilities is None:
+                v[player_sum - 11, useful_Ace] = q[player_sum - 11, useful_Ace].max(axis=-1)
+            else:
+                v[player_sum - 11, useful_Ace] = (
+                    policy_probabilities[player_sum - 11, useful_Ace] * q[player_sum - 11, useful_Ace]
+                ).sum(axis=-1)
+    return v, q
+
+
+@functools.lru_cache(maxsize=None)
+def solve() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The exact optimal policy of BJEnv and its values.
+
+    Returns (policy, v, q): the policy (the action, ties to sticks) of shape (11, 2, 10),
+    the states' values of shape (11, 2, 10) and the actions' values of shape (11, 2, 10, 2). Read only.
+    """
+    v, q = _solve()
+    policy = (q[..., 1] >= q[..., 0]).astype(np.int64)
+    for array in (policy, v, q):
+        array.flags.writeable = False
+    return policy, v, q
+
+
+def evaluate_policy(policy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The exact values of the given policy, either the actions (shape (11, 2, 10))
+    or the probabilities of the actions (shape (11, 2, 10, 2)).
+
+    Returns (v, q), shaped as in solve.
+    """
+    policy = np.asarray(policy)
+    if policy.shape == STATES_SHAPE:
+        policy = np.eye(2)[policy]
+    assert policy.shape == STATES_SHAPE + (2,), f"unexpected policy shape {policy.shape}"
+    return _solve(policy)
+
+
+def policy_table(act: Callable[[dict], int]) -> np.ndarray:
+    """
+    The actions of an agent, given as a callable (BJEnv's observation) -> action, in all the states. Shape (11, 2, 10).
+    """
+    policy = np.zeros(STATES_SHAPE, dtype=np.int64)
+    for index in np.ndindex(*STATES_SHAPE):
+        player_sum, useful_Ace, dealer_shown_card = index
+        policy[index] = act(dict(
+            player_sum=player_sum, player_useful_Ace=useful_Ace, dealer_shown_card=dealer_shown_card
+        ))
+    return policy
+
+
+def start_value(v: np.ndarray) -> float:
+    """
+    The expected return from BJEnv's start (uniform over the sums, the useful Ace and the dealer's shown card).
+    """
+    return float(np.mean(v))
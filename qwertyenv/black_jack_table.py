@@ -0,0 +1,158 @@
+from bisect import bisect_right
+import functools
+
+from gymnasium.utils import seeding
+import numpy as np
+from pettingzoo import ParallelEnv
+
+from qwertyenv.black_jack import BJEnv, DEALER_FINAL_SUMS, _dealer_outcome_cdf, _stick_reward_table, dealer_expected_reward_table
+
+
+@functools.lru_cache(maxsize=None)
+def _stick_rewards_by_sum(expected_reward):
+    """
+    The rewards of sticking (as _stick_reward_table / dealer_expected_reward_table), indexed by the player's sum
+    rather than by the player's sum - 11, and padded with 0 for the sums over 21 (the seats that busted).
+    Indexed by [final sum - 17, player sum], or by [first card - 1, second card - 1, player sum] for the expected rewards.
+    """
+    table = dealer_expected_reward_table() if expected_reward else _stick_reward_table().T
+    padding = [(0, 0)] * (table.ndim - 1) + [(11, 10)] # the sums 0 - 10, and 22 - 31
+    table = np.pad(table, padding)
+    table.flags.writeable = False
+    return table
+
+
+class BJTableEnv(ParallelEnv):
+    """
+    Blackjack table, a PettingZoo ParallelEnv.
+
+    'num_seats' players (agents 'seat_0', 'seat_1', ...) play against one dealer's hand.
+    Each seat plays as in BJEnv (same spaces, rewards and infos), all the seats' decisions are stepped at once:
+    the seats' state is kept as arrays (as in BJVectorEnv) and hits / busts / sticks are resolved with array operations.
+    The dealer's final sum is resolved once per round (sampled from the precomputed distribution given the dealer's cards),
+    a seat that sticks is compared with it (a seat that busts loses). A seat is done once it sticks or busts,
+    the round is over when all the seats are done.
+    """
+
+    metadata = {"render_modes": ["human"], "name": "BJTable_v0"}
+
+    def __init__(self, num_seats=3, expected_reward=False, render_mode=None):
+        """
+        expected_reward: when True, sticking returns the exact expected reward (given the dealer's cards)
+        rather than a sampled one (as in BJEnv).
+        """
+        self.num_seats = num_seats
+        self.expected_reward = expected_reward
+        self.render_mode = render_mode
+        self.possible_agents = [f"seat_{i}" for i in range(num_seats)]
+        self.agent_name_mapping = {agent: i for i, agent in enumerate(self.possible_agents)}
+        self._action_space, self._observation_space = BJEnv.make_spaces()
+
+        self.player_sum = np.zeros(num_seats, dtype=np.int64)
+        self.player_useful_Ace = np.zeros(num_seats, dtype=bool)
+        self.dealer_cards = [0, 0]
+        self.dealer_sum = None
+        self._stick_rewards = None # the rewards of sticking in this round, indexed by player sum
+        self.agents = []
+        self._np_random, _ = seeding.np_random()
+
+    # the same space object is returned for the same agent (as in CollectCoinsEnv)
+    @functools.lru_cache(maxsize=None)
+    def observation_space(self, agent):
+        return self._observation_space
+
+    @functools.lru_cache(maxsize=None)
+    def action_space(self, agent):
+        return self._action_space
+
+    def _uniforms(self, n):
+        # one call to the generator for all the random numbers of a reset / step, much cheaper than a call per number
+        return self._np_random.random(n)
+
+    def reset(self, seed=None, return_info=False, options=None):
+        if seed is not None:
+            self._np_random, _ = seeding.np_random(seed)
+        self.agents = self.possible_agents[:]
+        K = self.num_seats
+        uniforms = self._uniforms(2 * K + 3)
+        # as in BJEnv, starting with the sum rather than the cards
+        self.player_sum = 11 + (uniforms[:K] * 11).astype(np.int64)
+        self.player_useful_Ace = uniforms[K:2 * K] < 0.5
+        self.dealer_cards = (1 + (uniforms[2 * K:2 * K + 2] * 10).astype(np.int64)).tolist() # 1 - Ace, 2, .. 10
+        # the dealer's play does not depend on the seats' decisions, hence the dealer can be resolved right away,
+        # and so the reward of sticking with each of the player's sums
+        first, second = self.dealer_cards
+        cdf = _dealer_outcome_cdf()[first - 1][second - 1]
+        outcome = bisect_right(cdf, uniforms[-1])
+        self.dealer_sum = int(DEALER_FINAL_SUMS[outcome])
+        if self.expected_reward:
+            self._stick_rewards = _stick_rewards_by_sum(True)[first - 1, second - 1]
+        else:
+            self._stick_rewards = _stick_rewards_by_sum(False)[outcome]
+        observations = self._seats_to_obs(self.agents, range(K))
+        if return_info:
+            return observations, {agent: {} for agent in self.agents}
+        return observations
+
+    def _seats_to_obs(self, agents, seats):
+        player_sums = self.player_sum.tolist()
+        useful_Aces = self.player_useful_Ace.tolist()
+        dealer_shown_card = self.dealer_cards[0] - 1
+        return {
+            agent: {
+                'player_sum': player_sums[seat] - 11,
+                'player_useful_Ace': 1 if useful_Aces[seat] else 0,
+                'dealer_shown_card': dealer_shown_card,
+            }
+            for agent, seat in zip(agents, seats)
+        }
+
+    def step(self, actions):
+        agents = self.agents
+        seats = [self.agent_name_mapping[agent] for agent in agents]
+        # all the seats are stepped together, the seats that are done (no action) neither hit nor stick
+        seat_actions = np.array([actions.get(agent, -1) for agent in self.possible_agents])
+        hits = seat_actions == 0
+        sticks = seat_actions == 1
+        assert np.count_nonzero(hits | sticks) == len(agents), f"unkown action in {actions}"
+
+        # hits
+        new_cards = hits * (1 + (self._uniforms(self.num_seats) * 10).astype(np.int64))
+        self.player_sum += new_cards # note since we start with 11 we cannot add another ACE.
+        use_Ace = (self.player_sum > 21) & self.player_useful_Ace
+        np.subtract(self.player_sum, 10, out=self.player_sum, where=use_Ace)
+        self.player_useful_Ace ^= use_Ace
+        busted = self.player_sum > 21 # only the seats that hit can bust (the seats that busted before are not reported)
+
+        # sticks, against the one dealer's sum of the round
+        rewards = np.where(busted, -1, self._stick_rewards[self.player_sum] * sticks).tolist()
+        terminated = (busted | sticks).tolist()
+        new_cards = new_cards.tolist()
+
+        stick_info = {} if self.expected_reward else {'dealer sum': self.dealer_sum}
+        infos = {}
+        for agent, seat in zip(agents, seats):
+            if new_cards[seat]:
+                infos[agent] = {'new card': "A" if new_cards[seat] == 1 else new_cards[seat]}
+            else:
+                infos[agent] = dict(stick_info)
+        observations = self._seats_to_obs(agents, seats)
+        rewards = {agent: rewards[seat] for agent, seat in zip(agents, seats)}
+        terminations = {agent: terminated[seat] for agent, seat in zip(agents, seats)}
+        truncations = {agent: False for agent in agents}
+
+        self.agents = [agent for agent in agents if not terminations[agent]]
+        if self.render_mode == "human":
+            self.render()
+        return observations, rewards, terminations, truncations, infos
+
+    def render(self):
+        print("Dealer showing: ", "A" if self.dealer_cards[0] == 1 else self.dealer_cards[0])
+        for agent in self.possible_agents:
+            seat = self.agent_name_mapping[agent]
+            playing = "" if agent in self.agents else " (done)"
+            useful_Ace = "useful Ace" if self.player_useful_Ace[seat] else "no useful Ace"
+            print(f"{agent}: {self.player_sum[seat]}, {useful_Ace}{playing}")
+
+    def close(self):
+        pass
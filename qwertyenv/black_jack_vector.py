@@ -0,0 +1,133 @@
+from typing import Optional
+
+import gymnasium as gym
+from gymnasium.utils import seeding
+import numpy as np
+
+from qwertyenv.black_jack import BJEnv
+
+
+class BJVectorEnv(gym.vector.VectorEnv):
+    """
+    Blackjack, vectorized.
+
+    Plays 'num_envs' independent hands at once. Rather than a BJEnv.State object per hand, the state is kept
+    as arrays (player sums, useful Ace flags, dealer cards), and hits / sticks / busts, as well as the dealer's
+    turn, are resolved with masked array operations.
+    The rules, the rewards and the observations are the ones of BJEnv.
+    The infos are arrays: info['new card'] holds the card values as ints, 1 for an Ace (BJEnv reports it as "A"),
+    0 where the hand did not hit (info['_new card'] is False there).
+
+    As with other Gymnasium vector environments, a hand that is done is reset automatically.
+    The observations the hands ended with are found in info['final_observation'] (an object array, a per-hand dict
+    where info['_final_observation'] is True, None elsewhere), as with Gymnasium's vector environments.
+    """
+
+    def __init__(self, num_envs: int = 1024):
+        action_space, observation_space = BJEnv.make_spaces()
+        super().__init__(num_envs, observation_space, action_space)
+
+        self.player_sum = np.zeros(num_envs, dtype=np.int64)
+        self.player_useful_Ace = np.zeros(num_envs, dtype=bool)
+        self.dealer_cards = np.zeros((num_envs, 2), dtype=np.int64) # the first is the one shown
+        self._actions = None
+
+    def _random_cards(self, n):
+        return self.np_random.integers(1, 11, size=n) # 1 - Ace, 2, .. 10
+
+    def _deal(self, mask):
+        """
+        starts new hands where mask is True, same (uniform) start as BJEnv.State
+        """
+        n = int(np.count_nonzero(mask))
+        self.player_sum[mask] = self.np_random.integers(11, 22, size=n)
+        self.player_useful_Ace[mask] = self.np_random.integers(0, 2, size=n) == 1
+        self.dealer_cards[mask] = self._random_cards((n, 2))
+
+    def _state_to_obs(self):
+        return {
+            'player_sum': self.player_sum - 11,
+            'player_useful_Ace': self.player_useful_Ace.astype(np.int64),
+            'dealer_shown_card': self.dealer_cards[:, 0] - 1,
+        }
+
+    def reset_wait(
+        self,
+        seed: Optional[int] = None,
+        options: Optional[dict] = None,
+    ):
+        """
+        The hands share a single random generator, seeded with 'seed' (an int, not a per-hand list).
+        """
+        if seed is not None:
+            self._np_random, _ = seeding.np_random(seed)
+        self._deal(np.ones(self.num_envs, dtype=bool))
+        return self._state_to_obs(), {}
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions)
+
+    def _dealers_turn(self, mask):
+        """
+        plays the dealer for the hands in mask, returns the dealer's sums (0 where not in mask)
+        """
+
+        def dealer_sum(raw_sum, has_Ace):
+            return np.where((raw_sum <= 11) & has_Ace, raw_sum + 10, raw_sum)
+
+        raw_sum = self.dealer_cards.sum(axis=1)
+        has_Ace = (self.dealer_cards == 1).any(axis=1)
+        cur_sum = dealer_sum(raw_sum, has_Ace)
+        drawing = mask & (cur_sum < 17)
+        while drawing.any():
+            new_cards = self._random_cards(np.count_nonzero(drawing))
+            raw_sum[drawing] += new_cards
+            has_Ace[drawing] |= new_cards == 1
+            cur_sum = dealer_sum(raw_sum, has_Ace)
+            drawing &= cur_sum < 17
+        return np.where(mask, cur_sum, 0)
+
+    def step_wait(self):
+        actions = self._actions
+        assert np.isin(actions, (0, 1)).all(), f"unkown action in {actions}"
+        hits = actions == 0
+        sticks = ~hits
+
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+
+        # hits
+        new_cards = np.where(hits, self._random_cards(self.num_envs), 0)
+        self.player_sum += new_cards # note since we start with 11 we cannot add another ACE.
+        use_Ace = (self.player_sum > 21) & self.player_useful_Ace
+        self.player_sum[use_Ace] -= 10
+        self.player_useful_Ace[use_Ace] = False
+        busted = hits & (self.player_sum > 21)
+        rewards[busted] = -1
+
+        # sticks
+        dealer_sum = self._dealers_turn(sticks)
+        rewards[sticks] = np.where(
+            dealer_sum > 21,
+            1, # dealer busted
+            np.sign(self.player_sum - dealer_sum) # lose, draw or win
+        )[sticks]
+
+        terminated = busted | sticks
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        infos = {
+            'dealer sum': dealer_sum, '_dealer sum': sticks,
+            'new card': new_cards, '_new card': hits,
+        }
+
+        if terminated.any():
+            final_obs = self._state_to_obs()
+            keys = list(final_obs)
+            columns = [final_obs[key][terminated].tolist() for key in keys]
+            final_observations = np.full(self.num_envs, None, dtype=object)
+            for i, values in zip(np.flatnonzero(terminated).tolist(), zip(*columns)):
+                final_observations[i] = dict(zip(keys, values))
+            infos['final_observation'] = final_observations
+            infos['_final_observation'] = terminated
+            self._deal(terminated)
+
+        return self._state_to_obs(), rewards, terminated, truncated, infos
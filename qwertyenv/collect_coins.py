@@ -1,8 +1,12 @@
-from itertools import product
 import gymnasium as gym
+import numpy as np
 import random
+import time
 
-from qwertyenv.collect_coins_game import CollectCoinsGame
+from qwertyenv.collect_coins_game import (
+  BOARD_SIZE, OBSERVATION_MODES, CollectCoinsGame, bitboard_to_bytes, read_only_view
+)
+from qwertyenv.collect_coins_search import AlphaBetaPlayer
 
 
 class CollectCoinsEnv(gym.Env):
@@ -16,53 +20,142 @@ class CollectCoinsEnv(gym.Env):
   The game ends when there are not more coins on the board to collect. We then compare which player got the most.
   """
 
-  def __init__(self, pieces=['rock', 'rock'], player=0):
+  def __init__(self, pieces=['rock', 'rock'], player=0, copy_observations=True, opponent='random', profiler=None,
+               observation_mode='dict', board_size=BOARD_SIZE, coin_density=1.0):
     """
     player 0 is the first entry, AKA white
     player 1 is the second entry, AKA black
+
+    copy_observations: when True (the default) each observation has its own arrays, safe to keep.
+    When False, the observations are read only views of buffers preallocated for this env,
+    overwritten by the next step or reset (copy them if you store transitions).
+
+    opponent: how the other player plays. 'random' (the default) for a random valid move,
+    'alphabeta' for an AlphaBetaPlayer (with its default budget per move),
+    or a callable (game, player) -> move, for example AlphaBetaPlayer(max_time=0.001).
+
+    profiler: optional, a qwertyenv.profiling.StepProfiler, to time the phases of each step
+    ('make_move', 'play_other', 'observation', 'reward', and the whole 'step').
+
+    observation_mode: 'dict' (the default) as above, 'packed' as 'dict' but the board is packed 8 squares per byte
+    (as np.packbits(board, bitorder='little'), for an 8 x 8 board 8 bytes, bit 'col' of byte 'row'), or 'flat' a single
+    uint8 vector: the packed board, the player's (row, col) and the other player's (row, col), 12 bytes for an 8 x 8 board.
+
+    board_size: the number of rows (and columns) of the board, 8 by default ('flat' supports up to 256).
+    coin_density: the probability of a coin on each square (drawn on reset), 1.0 (the default) for a coin on every square.
     """
 
-    obs_space = dict(
-      board = gym.spaces.Box(low=0, high=1, shape=(8 * 8,), dtype=bool),
-      player = gym.spaces.MultiDiscrete([8, 8]),
-      other_player = gym.spaces.MultiDiscrete([8, 8]),
-    )    
-    self.observation_space = gym.spaces.Dict(spaces=obs_space)
-    self.action_space = gym.spaces.MultiDiscrete([8, 8])
+    assert observation_mode in OBSERVATION_MODES, f"unknown observation mode {observation_mode}"
+    assert observation_mode != 'flat' or board_size <= 256, "'flat' observations keep the locations in bytes"
+    self.observation_mode = observation_mode
+    self.board_size = board_size
+    self.coin_density = coin_density
+    num_squares = board_size * board_size
+    num_bytes = (num_squares + 7) // 8
+    if observation_mode == 'flat':
+      self.observation_space = gym.spaces.Box(
+        low=0, high=np.array([255] * num_bytes + [board_size - 1] * 4, dtype=np.uint8), shape=(num_bytes + 4,),
+        dtype=np.uint8
+      )
+    else:
+      obs_space = dict(
+        board = (
+          gym.spaces.Box(low=0, high=1, shape=(num_squares,), dtype=bool) if observation_mode == 'dict'
+          else gym.spaces.Box(low=0, high=255, shape=(num_bytes,), dtype=np.uint8)
+        ),
+        player = gym.spaces.MultiDiscrete([board_size, board_size]),
+        other_player = gym.spaces.MultiDiscrete([board_size, board_size]),
+      )    
+      self.observation_space = gym.spaces.Dict(spaces=obs_space)
+    self.action_space = gym.spaces.MultiDiscrete([board_size, board_size])
 
     self.pieces = pieces
     self.player = player
     self.other_player = 1 - player
+    self.copy_observations = copy_observations
+    assert opponent in ['random', 'alphabeta'] or callable(opponent), f"unknown opponent {opponent}"
+    self.opponent = AlphaBetaPlayer() if opponent == 'alphabeta' else opponent
+    self.profiler = profiler
+    if not copy_observations:
+      if observation_mode == 'flat':
+        self._observation_buffer = np.zeros(num_bytes + 4, dtype=np.uint8)
+        self._observation = read_only_view(self._observation_buffer)
+      else:
+        self._observation_buffers = dict(
+          board=np.zeros(num_squares, dtype=bool) if observation_mode == 'dict' else np.zeros(num_bytes, dtype=np.uint8),
+          player=np.zeros(2, dtype=np.int64),
+          other_player=np.zeros(2, dtype=np.int64),
+        )
+        self._observation = {key: read_only_view(buffer) for key, buffer in self._observation_buffers.items()}
+      self._board_in_buffer = None
     self.game = None
     self.previous_coins = None
     self.reset()
 
   def reset(self, seed=None, options=None):
-    self.game = CollectCoinsGame(self.pieces)
+    super().reset(seed=seed)
+    self.game = CollectCoinsGame(self.pieces, self.board_size, self.coin_density, self.np_random)
     self.previous_coins = 0
     return self._get_observation(), {} 
 
   def step(self, action):
+    profiler = self.profiler # without one, the only cost is this check
+    if profiler is not None:
+      start = step_start = time.perf_counter()
     self.game.make_move(self.player, action)
+    if profiler is not None:
+      start = profiler.lap('make_move', start)
     if not self.game.is_done():
       self._play_other()
-    info = {}
-    return self._get_observation(), self._calc_reward(), self.game.is_done(), False, info
+      if profiler is not None:
+        start = profiler.lap('play_other', start)
+    observation = self._get_observation()
+    if profiler is not None:
+      start = profiler.lap('observation', start)
+    reward = self._calc_reward()
+    if profiler is not None:
+      profiler.lap('reward', start)
+      profiler.end_step('step', step_start)
+    return observation, reward, self.game.is_done(), False, {}
 
   def _play_other(self):
     """
-    a random move for now
+    a random move, or the move of the given opponent
     """
 
-    move = self.provide_alternative_valid_action(None, self.other_player)
+    if self.opponent == 'random':
+      move = self.provide_alternative_valid_action(None, self.other_player)
+    else:
+      move = self.opponent(self.game, self.other_player)
     self.game.make_move(self.other_player, move)
 
   def _get_observation(self):
-    return dict(
-      board=self.game.board.flatten(),
-      player=self.game.locations[self.player],
-      other_player=self.game.locations[self.other_player]
-    )
+    if self.observation_mode == 'flat':
+      observation = np.frombuffer(self.game.observation_bytes(self.player), dtype=np.uint8)
+      if self.copy_observations:
+        return observation.copy()
+      self._observation_buffer[:] = observation
+      return self._observation
+    packed = self.observation_mode == 'packed'
+    if self.copy_observations:
+      return dict(
+        board=bitboard_to_bytes(self.game.coin_bits, self.board_size).copy() if packed else self.game.board.flatten(),
+        player=self.game.locations[self.player],
+        other_player=self.game.locations[self.other_player]
+      )
+    buffers = self._observation_buffers
+    if packed:
+      if self.game.coin_bits != self._board_in_buffer:
+        buffers['board'][:] = bitboard_to_bytes(self.game.coin_bits, self.board_size)
+        self._board_in_buffer = self.game.coin_bits
+    else:
+      board = self.game.board
+      if board is not self._board_in_buffer: # the game makes a new board array only when the coins change
+        buffers['board'][:] = board.reshape(-1)
+        self._board_in_buffer = board
+    buffers['player'][0], buffers['player'][1] = self.game.locations[self.player]
+    buffers['other_player'][0], buffers['other_player'][1] = self.game.locations[self.other_player]
+    return self._observation
 
   def _calc_reward(self):
     current_coins = self.game.coins[self.player]
@@ -76,6 +169,16 @@ class CollectCoinsEnv(gym.Env):
     else:
       return (current_coins - previous_coins) * 0.01
 
+  def get_state(self) -> tuple:
+    """
+    The state of the environment (see set_state), for example for a lookahead search.
+    """
+    return (self.game.snapshot(), self.previous_coins)
+
+  def set_state(self, state: tuple) -> None:
+    game_state, self.previous_coins = state
+    self.game.restore(game_state)
+
   def render(self, *args, **argv):
     self.game.render()
 
@@ -97,6 +200,5 @@ class CollectCoinsEnv(gym.Env):
     TOOD: maybe consult the provided action(move) and provide an action that is as close as possible.
     """
 
-    all_moves = product(range(8), repeat=2)
-    all_valid_moves = [move for move in all_moves if self.check_action_valid(move, player)]
-    return None if len(all_valid_moves) < 1 else random.choice(all_valid_moves)
+    legal_moves = self.game.legal_moves(self.player if player is None else player)
+    return None if len(legal_moves) < 1 else random.choice(legal_moves)
@@ -1,9 +1,117 @@
 from abc import ABC, abstractmethod
-from typing import List, Protocol
+import functools
+from itertools import product
+from typing import List, Optional, Protocol, Tuple
 
 import numpy as np
 
 
+BOARD_SIZE = 8 # the default, see CollectCoinsGame's board_size
+
+# The observations of the environments, 'dict' (the board as bools), 'packed' (the board as bytes),
+# or 'flat' (a single uint8 vector, see CollectCoinsGame.observation_bytes)
+OBSERVATION_MODES = ('dict', 'packed', 'flat')
+
+# (row, col) offsets of the moves of each piece
+ROCK_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1)) # a limited rock, one square at a time
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+
+
+def to_square(location) -> int:
+  """
+  (row, col) -> the index of the square (and of its bit in the bitboards)
+  """
+  return int(location[0]) * BOARD_SIZE + int(location[1])
+
+
+def to_location(square: int) -> Tuple[int, int]:
+  return divmod(square, BOARD_SIZE)
+
+
+@functools.lru_cache(maxsize=None)
+def _move_masks(offsets, board_size=BOARD_SIZE) -> Tuple[int, ...]:
+  """
+  For each square, a bitboard of the squares the piece can move to from that square.
+  """
+  masks = []
+  for row, col in product(range(board_size), repeat=2):
+    mask = 0
+    for d_row, d_col in offsets:
+      to_row, to_col = row + d_row, col + d_col
+      if 0 <= to_row < board_size and 0 <= to_col < board_size:
+        mask |= 1 << (to_row * board_size + to_col)
+    masks.append(mask)
+  return tuple(masks)
+
+
+@functools.lru_cache(maxsize=None)
+def _destinations(offsets, board_size=BOARD_SIZE) -> Tuple[Tuple[int, ...], ...]:
+  """
+  For each square, the squares (on the board) the piece can move to from that square.
+  """
+  return tuple(
+    tuple(
+      (row + d_row) * board_size + (col + d_col)
+      for d_row, d_col in offsets
+      if 0 <= row + d_row < board_size and 0 <= col + d_col < board_size
+    )
+    for row, col in product(range(board_size), repeat=2)
+  )
+
+
+@functools.lru_cache(maxsize=None)
+def _locations(board_size=BOARD_SIZE) -> Tuple[Tuple[int, int], ...]:
+  return tuple(divmod(square, board_size) for square in range(board_size * board_size))
+
+
+_LOCATIONS = _locations(BOARD_SIZE)
+
+
+def bitboard_to_array(bits: int, board_size: int = BOARD_SIZE) -> np.ndarray:
+  """
+  bitboard -> (board_size, board_size) bool array
+  """
+  as_bytes = np.frombuffer(bits.to_bytes((board_size * board_size + 7) // 8, 'little'), dtype=np.uint8)
+  return np.unpackbits(as_bytes, count=board_size * board_size, bitorder='little').view(bool).reshape(board_size, board_size)
+
+
+def bitboard_to_bytes(bits: int, board_size: int = BOARD_SIZE) -> np.ndarray:
+  """
+  bitboard -> (ceil(board_size * board_size / 8),) uint8 array, bit i (bitorder='little') for square i,
+  as np.packbits of the flattened board (for an 8 x 8 board, byte 'row' bit 'col'). Read only.
+  """
+  return np.frombuffer(bits.to_bytes((board_size * board_size + 7) // 8, 'little'), dtype=np.uint8)
+
+
+def bitboard_from_array(board: np.ndarray) -> int:
+  """
+  bool array (the board) -> bitboard
+  """
+  return int.from_bytes(np.packbits(np.asarray(board, dtype=bool).reshape(-1), bitorder='little').tobytes(), 'little')
+
+
+def start_locations(num_players: int, board_size: int = BOARD_SIZE) -> List[Tuple[int, int]]:
+  """
+  The players' starting squares, spaced evenly along the edge of the board (clockwise from (0, 0)).
+  Two players start at opposite corners, four at the corners.
+  """
+  last = board_size - 1
+  perimeter = 4 * last
+  assert num_players <= perimeter, f"{num_players} players do not fit on the edge of a {board_size}x{board_size} board"
+  locations = []
+  for player in range(num_players):
+    step = player * perimeter // num_players
+    side, offset = divmod(step, last)
+    locations.append(((0, offset), (offset, last), (last, last - offset), (last - offset, 0))[side])
+  return locations
+
+
+def read_only_view(array: np.ndarray) -> np.ndarray:
+  view = array.view()
+  view.flags.writeable = False
+  return view
+
+
 class Game(Protocol):
   ...
 
@@ -11,98 +119,277 @@ class Game(Protocol):
 class Piece(ABC):
   """
   Either a rock or a knight (Chess like).
+
+  The class attributes 'moves' and 'destinations' are for the default board (BOARD_SIZE), an instance has those of its
+  game's board. 'moves' is None for boards bigger than the default (a bitboard per square would take too much memory).
   """
+  offsets: Tuple[Tuple[int, int], ...]
+  moves: Optional[Tuple[int, ...]] # per square, the bitboard of the valid destinations
+  destinations: Tuple[Tuple[int, ...], ...] # per square, the valid destinations
+
   def __init__(self, game: Game, player: int) -> None:
     self.game = game
     self.player = player
+    board_size = getattr(game, 'board_size', BOARD_SIZE)
+    if board_size != BOARD_SIZE:
+      self.destinations = _destinations(self.offsets, board_size)
+      self.moves = _move_masks(self.offsets, board_size) if board_size < BOARD_SIZE else None
 
   @abstractmethod
   def __repr__(self) -> str:
     pass
-  
-  @abstractmethod
+
   def valid_move(self, move) -> bool:
-    pass
+    return self.game.to_square(move) in self.destinations[self.game.squares[self.player]]
+
+  @property
+  def color(self) -> str:
+    """
+    'w' (white) and 'b' (black) in a two players game, otherwise the player as a hex digit.
+    """
+    if len(self.game.pieces) == 2:
+      return 'w' if self.player == 0 else 'b'
+    return format(self.player, 'x')
 
 
 class Rock(Piece):
   """
   Rock
   """
+  offsets = ROCK_OFFSETS
+  moves = _move_masks(ROCK_OFFSETS)
+  destinations = _destinations(ROCK_OFFSETS)
+
   def __init__(self, game: Game, player: int) -> None:
     super().__init__(game, player)
 
   def __repr__(self) -> str:
-    return f'{"w" if self.player == 0 else "b"}R'
-  
-  def valid_move(self, move) -> bool:
-    current_location = self.game.locations[self.player]
-    abs_move_row = abs(move[0] - current_location[0]) 
-    abs_move_col = abs(move[1] - current_location[1]) 
-    return (
-      ((abs_move_row == 1) and (abs_move_col == 0))
-      or
-      ((abs_move_row == 0) and (abs_move_col == 1))
-    )
+    return f'{self.color}R'
 
 
 class Knight(Piece):
   """
   Knight
   """
+  offsets = KNIGHT_OFFSETS
+  moves = _move_masks(KNIGHT_OFFSETS)
+  destinations = _destinations(KNIGHT_OFFSETS)
+
   def __init__(self, game: Game, player: int) -> None:
     super().__init__(game, player)
 
   def __repr__(self) -> str:
-    return f'{"w" if self.player == 0 else "b"}K'
-  
-  def valid_move(self, move) -> bool:
-    current_location = self.game.locations[self.player]
-    abs_move_row = abs(move[0] - current_location[0]) 
-    abs_move_col = abs(move[1] - current_location[1]) 
-    return (
-      ((abs_move_row == 1) and (abs_move_col == 2))
-      or
-      ((abs_move_row == 2) and (abs_move_col == 1))
-    )
+    return f'{self.color}K'
 
 
 class CollectCoinsGame:
   """
   CollectCoinsGame
+
+  The state is kept in bitboards (bit 'row * board_size + col' stands for the square (row, col)):
+  'coin_bits' for the coins still on the board, and in an occupancy grid (a byte per square) for the players' pieces.
+  'board' (a (board_size, board_size) bool array), 'locations', 'coins' (the coins collected by each player)
+  and 'num_coins' (the coins still on the board) are kept available.
+
+  A piece per player (two or more players), the players play in turns, starting spaced along the edge of the board
+  (see start_locations). With a 'coin_density' below 1, each other square has a coin with that probability
+  (drawn with 'np_random', a np.random.Generator), otherwise all the other squares have coins.
   """
 
-  def __init__(self, pieces=['rock', 'rock']):
-    assert len(pieces) == 2
+  def __init__(self, pieces=['rock', 'rock'], board_size: int = BOARD_SIZE, coin_density: float = 1.0, np_random=None):
+    assert len(pieces) >= 2
     assert all(piece in ['rock', 'knight'] for piece in pieces)
+    assert board_size >= 2
+    assert 0.0 <= coin_density <= 1.0
+    self.board_size = board_size
+    self.num_players = len(pieces)
+    self._locations = _locations(board_size)
     game = self
     self.pieces: List[Piece] = [
       Rock(game, i) if piece == 'rock' else Knight(game, i) for i, piece in enumerate(pieces)
     ]
-    self.board = np.full((8, 8), True, dtype=bool)
-    self.locations = [(0, 0), (7, 7)]
-    for loc in self.locations:
-      self.board[loc] = False
-    self.coins = [0, 0]
+    self.locations = start_locations(self.num_players, board_size)
+    self.squares = [self.to_square(loc) for loc in self.locations]
+    self._occupancy = bytearray(board_size * board_size) # 1 where a piece is
+    occupied = 0
+    for square in self.squares:
+      self._occupancy[square] = 1
+      occupied |= 1 << square
+    if coin_density < 1.0:
+      if np_random is None:
+        np_random = np.random.default_rng()
+      coin_bits = bitboard_from_array(np_random.random(board_size * board_size) < coin_density)
+    else:
+      coin_bits = (1 << (board_size * board_size)) - 1
+    self.coin_bits = coin_bits & ~occupied
+    self.num_coins = bin(self.coin_bits).count('1')
+    self.coins = [0] * self.num_players
     self.turn = 0
+    self._board = None
+    self._board_bits = None
+    self._action_masks = [None] * self.num_players
+    self._undo = [] # (player, previous square or None, collected a coin), of the moves made with undoable=True
+
+  def others(self, player) -> List[int]:
+    """
+    The other players, in their turns' order after the player.
+    """
+    num_players = self.num_players
+    return [(player + i) % num_players for i in range(1, num_players)]
 
-  def make_move(self, player, move) -> None:
-    move = tuple(move)
+  def to_square(self, location) -> int:
+    return int(location[0]) * self.board_size + int(location[1])
+
+  @property
+  def board(self) -> np.ndarray:
+    """
+    The coins as a (board_size, board_size) bool array. Read only, a new array is made when the coins change.
+    """
+    if self._board_bits != self.coin_bits:
+      self._board = bitboard_to_array(self.coin_bits, self.board_size)
+      self._board.flags.writeable = False
+      self._board_bits = self.coin_bits
+    return self._board
+
+  def make_move(self, player, move, undoable=False) -> None:
+    """
+    The player moves to 'move' (row, col), None to pass. With undoable, the move can be taken back (see unmake_move),
+    for example in a search, otherwise nothing is kept (the environments' moves).
+    """
     assert self.turn == player
-    if move is not None:
+    if move is None:
+      if undoable:
+        self._undo.append((player, None, False))
+    else:
       assert self.valid_move(player, move)
-      self.coins[player] += int(self.board[move])
-      self.board[move] = False
-      self.locations[player] = move
-    self.turn = 1 - self.turn
+      square = self.to_square(move)
+      bit = 1 << square
+      collected = bool(self.coin_bits & bit)
+      if collected:
+        self.coins[player] += 1
+        self.num_coins -= 1
+        self.coin_bits ^= bit
+      previous_square = self.squares[player]
+      if undoable:
+        self._undo.append((player, previous_square, collected))
+      self._occupancy[previous_square] = 0
+      self._occupancy[square] = 1
+      self.squares[player] = square
+      self.locations[player] = self._locations[square]
+      self._clear_action_masks()
+    self.turn = player + 1 if player + 1 < self.num_players else 0
+
+  def unmake_move(self) -> None:
+    """
+    Takes back the last undoable move (made with make_move(..., undoable=True)).
+    """
+    player, previous_square, collected = self._undo.pop()
+    self.turn = player
+    if previous_square is None:
+      return
+    square = self.squares[player]
+    if collected:
+      self.coins[player] -= 1
+      self.num_coins += 1
+      self.coin_bits |= 1 << square
+    self._occupancy[square] = 0
+    self._occupancy[previous_square] = 1
+    self.squares[player] = previous_square
+    self.locations[player] = self._locations[previous_square]
+    self._clear_action_masks()
+
+  def _clear_action_masks(self) -> None:
+    masks = self._action_masks
+    for player in range(self.num_players):
+      masks[player] = None
+
+  def snapshot(self) -> tuple:
+    """
+    The state of the game as a compact, immutable, tuple (see restore).
+    """
+    return (self.coin_bits, tuple(self.squares), tuple(self.coins), self.turn)
+
+  def restore(self, state: tuple) -> None:
+    """
+    Sets the state of the game to one taken with snapshot. The moves made so far can no longer be taken back.
+    """
+    self.coin_bits, squares, coins, self.turn = state
+    self.num_coins = bin(self.coin_bits).count('1')
+    for square in self.squares:
+      self._occupancy[square] = 0
+    for square in squares:
+      self._occupancy[square] = 1
+    self.squares = list(squares)
+    self.locations = [self._locations[square] for square in squares]
+    self.coins = list(coins)
+    self._clear_action_masks()
+    self._undo.clear()
 
   def valid_move(self, player, move):
-    move = tuple(move)
-    if any(c < 0 or c > 7 for c in move):
+    row, col = int(move[0]), int(move[1])
+    board_size = self.board_size
+    if not (0 <= row < board_size and 0 <= col < board_size):
       return False
-    if any(location == move for location in self.locations):
+    square = row * board_size + col
+    if self._occupancy[square]:
       return False
-    return self.pieces[player].valid_move(move)
+    return square in self.pieces[player].destinations[self.squares[player]]
+
+  def legal_moves(self, player) -> List[Tuple[int, int]]:
+    """
+    The valid moves (destinations) for the player, at most 8.
+    """
+    occupancy = self._occupancy
+    locations = self._locations
+    return [
+      locations[square]
+      for square in self.pieces[player].destinations[self.squares[player]]
+      if not occupancy[square]
+    ]
+
+  def action_mask(self, player) -> np.ndarray:
+    """
+    The valid moves for the player as a flat (board_size * board_size,) bool array (index 'row * board_size + col').
+    Read only, computed once and kept till the next move.
+    """
+    mask = self._action_masks[player]
+    if mask is None:
+      if self.board_size == BOARD_SIZE:
+        mask = bitboard_to_array(self.legal_move_bits(player)).reshape(-1)
+      else:
+        mask = np.zeros(self.board_size * self.board_size, dtype=bool)
+        occupancy = self._occupancy
+        for square in self.pieces[player].destinations[self.squares[player]]:
+          mask[square] = not occupancy[square]
+      mask.flags.writeable = False
+      self._action_masks[player] = mask
+    return mask
+
+  def legal_move_bits(self, player) -> int:
+    """
+    The valid moves for the player as a bitboard.
+    """
+    bits = 0
+    occupancy = self._occupancy
+    for square in self.pieces[player].destinations[self.squares[player]]:
+      if not occupancy[square]:
+        bits |= 1 << square
+    return bits
+
+  def observation_bytes(self, player, with_mask=False) -> bytes:
+    """
+    The board (see bitboard_to_bytes, 8 bytes for an 8 x 8 board), the player's (row, col), the other players' (row, col)
+    (see others), and when with_mask, the valid moves of the player (as the board).
+    12 or 20 bytes for two players on an 8 x 8 board.
+    """
+    locations = self.locations
+    num_bytes = (self.board_size * self.board_size + 7) // 8
+    observation = self.coin_bits.to_bytes(num_bytes, 'little') + bytes(
+      coordinate for other in [player] + self.others(player) for coordinate in locations[other]
+    )
+    if with_mask:
+      observation += self.legal_move_bits(player).to_bytes(num_bytes, 'little')
+    return observation
 
   def render(self):
     horizontal = '-' * (self.board.shape[1] * 4 + 1)
@@ -115,7 +402,7 @@ class CollectCoinsGame:
       print("|" + " |".join(row_copy) + " |")
       print(horizontal)
     print()
-    print(f'{self.coins[0]}/{self.coins[1]}')
+    print('/'.join(map(str, self.coins)))
 
   def is_done(self) -> bool:
-    return np.sum(self.board) < 1
+    return self.num_coins == 0
@@ -1,20 +1,23 @@
 import functools
-from itertools import product
 import gymnasium as gym
+from gymnasium.utils import seeding
 import numpy as np
 from pettingzoo import AECEnv
 from pettingzoo.utils import agent_selector, wrappers
 import random
+import time
 
-from qwertyenv.collect_coins_game import CollectCoinsGame
+from qwertyenv.collect_coins_game import (
+  BOARD_SIZE, OBSERVATION_MODES, CollectCoinsGame, bitboard_to_bytes, read_only_view
+)
 
 
 class CollectCoinsEnv(AECEnv):
   """
   CollectCoins PettingZoo environment.
 
-  This a Chess like, two players turns board game.
-  The aim of the game is to collect more coins than the opponent.
+  This a Chess like, two (or more) players turns board game.
+  The aim of the game is to collect more coins than the opponent (than any of the other players).
   On each turn a the player's piece makes a move.
   If a coin is present in the destination the count is increased for the player.
   The game ends when there are not more coins on the board to collect. We then compare which player got the most.
@@ -27,29 +30,105 @@ class CollectCoinsEnv(AECEnv):
 
   metadata = {"render_modes": ["human"], "name": "CollectCoins_v0"}
 
-  def __init__(self, pieces=['rock', 'rock'], render_mode=None, with_mask=False):
+  def __init__(self, pieces=['rock', 'rock'], render_mode=None, with_mask=False, copy_observations=True,
+               observation_mode='dict', board_size=BOARD_SIZE, coin_density=1.0, profiler=None):
     """
     player 0 is the first entry, AKA white
     player 1 is the second entry, AKA black
+    A piece per player, more than two pieces for more than two players ('player_0', 'player_1', ...).
+
+    copy_observations: when True (the default) each observation has its own arrays, safe to keep.
+    When False, the observations are read only views of buffers preallocated for this env (the board and the locations
+    are shared by the agents), overwritten by the next step or reset (copy them if you store transitions).
+
+    With more than two players, 'other_player' is replaced by 'other_players', the (row, col) of the other players
+    in their turns' order after the agent, shape (num_players - 1, 2). In 'flat' those follow the agent's (row, col).
+
+    observation_mode: 'dict' (the default), 'packed' as 'dict' but the board is packed 8 squares per byte
+    (as np.packbits(board.reshape(-1), bitorder='little'), for an 8 x 8 board 8 bytes, bit 'col' of byte 'row'),
+    or 'flat' a single uint8 vector: the packed board, the agent's (row, col), the other agent's (row, col),
+    and with_mask the mask packed as the board (12 or 20 bytes for an 8 x 8 board).
+
+    board_size: the number of rows (and columns) of the board, 8 by default ('flat' supports up to 256).
+    coin_density: the probability of a coin on each square (drawn on reset), 1.0 (the default) for a coin on every square.
+
+    profiler: optional, a qwertyenv.profiling.StepProfiler, to time the phases of each step
+    ('make_move', 'rewards', and the whole 'step'), and 'observation' on each observe
+    (the observations are made when observed, not in step).
     """
 
+    assert observation_mode in OBSERVATION_MODES, f"unknown observation mode {observation_mode}"
+    assert observation_mode != 'flat' or board_size <= 256, "'flat' observations keep the locations in bytes"
+    self.observation_mode = observation_mode
+    self.board_size = board_size
+    self.coin_density = coin_density
+    self.profiler = profiler
+    num_squares = board_size * board_size
+    num_bytes = (num_squares + 7) // 8
     self.render_mode = render_mode
     self.with_mask = with_mask
-    self.possible_agents = ["player_" + str(r) for r in range(2)]
+    self.num_players = len(pieces)
+    self.possible_agents = ["player_" + str(r) for r in range(self.num_players)]
     self.agent_name_mapping = dict(
         zip(self.possible_agents, list(range(len(self.possible_agents))))
     )
-    obs_space = dict(
-      board = gym.spaces.MultiBinary([8, 8]),
-      player = gym.spaces.Tuple([gym.spaces.Discrete(8)] * 2),
-      other_player = gym.spaces.Tuple([gym.spaces.Discrete(8)] * 2)
-    )    
-    self._observation_space = gym.spaces.Dict(spaces=obs_space)
-    self._action_space = gym.spaces.Tuple([gym.spaces.Discrete(8)] * 2)
+    if observation_mode == 'flat':
+      high = [255] * num_bytes + [board_size - 1] * 2 * self.num_players + ([255] * num_bytes if with_mask else [])
+      self._observation_space = gym.spaces.Box(
+        low=0, high=np.array(high, dtype=np.uint8), shape=(len(high),), dtype=np.uint8
+      )
+    else:
+      obs_space = dict(
+        board = (
+          gym.spaces.MultiBinary([board_size, board_size]) if observation_mode == 'dict'
+          else gym.spaces.Box(low=0, high=255, shape=(num_bytes,), dtype=np.uint8)
+        ),
+        player = gym.spaces.Tuple([gym.spaces.Discrete(board_size)] * 2),
+      )    
+      if self.num_players == 2:
+        obs_space['other_player'] = gym.spaces.Tuple([gym.spaces.Discrete(board_size)] * 2)
+      else:
+        obs_space['other_players'] = gym.spaces.Box(
+          low=0, high=board_size - 1, shape=(self.num_players - 1, 2), dtype=np.int64
+        )
+      if with_mask:
+        obs_space['mask'] = gym.spaces.MultiBinary(num_squares) # index row * board_size + col
+      self._observation_space = gym.spaces.Dict(spaces=obs_space)
+    self._action_space = gym.spaces.Tuple([gym.spaces.Discrete(board_size)] * 2)
 
     self.pieces = pieces
+    self.copy_observations = copy_observations
+    if not copy_observations and observation_mode == 'flat':
+      self._observation_buffers = [
+        np.zeros(self._observation_space.shape, dtype=np.uint8) for _ in self.possible_agents
+      ]
+      self._observation = [read_only_view(buffer) for buffer in self._observation_buffers]
+    elif not copy_observations:
+      # The locations twice, so that the other players of each agent (in their turns' order) are a slice.
+      self._shared_buffers = dict(
+        board=(
+          np.zeros((board_size, board_size), dtype=bool) if observation_mode == 'dict'
+          else np.zeros(num_bytes, dtype=np.uint8)
+        ),
+        locations=np.zeros((2 * self.num_players, 2), dtype=np.int64),
+      )
+      self._mask_buffers = [np.zeros(num_squares, dtype=bool) for _ in self.possible_agents] if with_mask else None
+      board = read_only_view(self._shared_buffers['board'])
+      locations = self._shared_buffers['locations']
+      self._observation = []
+      for i in range(self.num_players):
+        observation = dict(board=board, player=read_only_view(locations[i]))
+        if self.num_players == 2:
+          observation['other_player'] = read_only_view(locations[i + 1])
+        else:
+          observation['other_players'] = read_only_view(locations[i + 1 : i + self.num_players])
+        if with_mask:
+          observation['mask'] = read_only_view(self._mask_buffers[i])
+        self._observation.append(observation)
+      self._in_buffers = dict(board=None, masks=[None] * self.num_players)
     self.game = None
     self.previous_coins = None
+    self._np_random = None
     self.reset()
 
   # this cache ensures that same space object is returned for the same agent
@@ -75,9 +154,11 @@ class CollectCoinsEnv(AECEnv):
     - agent_selection
     And must set up the environment so that render(), step(), and observe()
     can be called without issues.
-    Here it sets up the state dictionary which is used by step() and the observations dictionary which is used by step() and observe()
+    Here it sets up the state dictionary which is used by step() (the observations are made by observe())
     """
-    self.game = CollectCoinsGame(self.pieces)
+    if seed is not None or self._np_random is None:
+      self._np_random, _ = seeding.np_random(seed)
+    self.game = CollectCoinsGame(self.pieces, self.board_size, self.coin_density, self._np_random)
 
     self.agents = self.possible_agents[:]
 
@@ -93,12 +174,10 @@ class CollectCoinsEnv(AECEnv):
     self.truncations = {agent: False for agent in self.agents}
     self.infos = {agent: {} for agent in self.agents}
     self.state = {agent: None for agent in self.agents}
-    self.observations = {
-      agent: self._get_observation(self.agent_name_mapping[agent]) for agent in self.agents
-    }
+    self._write_locations()
     self.num_moves = 0
 
-    self.previous_coins = [0, 0]
+    self.previous_coins = [0] * self.num_players
 
   def step(self, action):
       """
@@ -117,13 +196,6 @@ class CollectCoinsEnv(AECEnv):
 
       # print(type(action))
 
-      if isinstance(action, np.int64): 
-          action = (action // 8, action % 8)  # because for example, Tianshou may return np.int64 ?
-
-      # action = tuple(action) # because for example, Tianshou may return list
-      assert isinstance(action, tuple)
-      assert len(action) == 2
-
       if (
           self.terminations[self.agent_selection]
           or self.truncations[self.agent_selection]
@@ -134,9 +206,23 @@ class CollectCoinsEnv(AECEnv):
           self._was_dead_step(action)
           return
 
+      if isinstance(action, np.int64): 
+          action = divmod(int(action), self.board_size)  # because for example, Tianshou may return np.int64 ?
+
+      # action = tuple(action) # because for example, Tianshou may return list
+      # None passes, when the agent has no valid move (ex. blocked by the other pieces)
+      assert action is None or (isinstance(action, tuple) and len(action) == 2)
+
+      profiler = self.profiler # without one, the only cost is this check
+      if profiler is not None:
+          start = step_start = time.perf_counter()
+
       agent = self.agent_selection
       agent_idx = self.agent_name_mapping[agent]
       self.game.make_move(agent_idx, action)
+      self._write_locations(agent_idx)
+      if profiler is not None:
+          start = profiler.lap('make_move', start)
 
       # the agent which stepped last had its _cumulative_rewards accounted for
       # (because it was returned by last()), so the _cumulative_rewards for this
@@ -150,7 +236,7 @@ class CollectCoinsEnv(AECEnv):
       if self._agent_selector.is_last():
           # rewards for all agents are placed in the .rewards dictionary
           self.rewards.update({
-            self.agents[idx]: self._calc_reward(idx) for idx in range(2) 
+            self.agents[idx]: self._calc_reward(idx) for idx in range(self.num_players)
           })
 
           done = self.game.is_done()
@@ -169,18 +255,14 @@ class CollectCoinsEnv(AECEnv):
                player: truncation
               for player in self.truncations
             })
-
-          # observe the current state
-          for i in self.agents:
-            self.observations[i] = self._get_observation(self.agent_name_mapping[i]) # self.state[
-            #     self.agents[1 - self.agent_name_mapping[i]]
-            # ]
       else:
           # necessary so that observe() returns a reasonable observation at all times.
-          self.state[self.agents[1 - agent_idx]] = 0 # TODO:??
+          self.state[self.agents[agent_idx + 1]] = 0 # TODO:??
           # no rewards are allocated until both players give an action
           self._clear_rewards()
 
+      # the observations are made when observed (see observe), from the current state
+
       # selects the next agent.
       self.agent_selection = self._agent_selector.next()
 
@@ -188,27 +270,67 @@ class CollectCoinsEnv(AECEnv):
 
       # Adds .rewards to ._cumulative_rewards
       self._accumulate_rewards()
+      if profiler is not None:
+          profiler.lap('rewards', start)
+          profiler.end_step('step', step_start)
 
       if self.render_mode == "human":
           self.render()
 
   def _get_observation(self, player_idx: int):
-    obs = dict(
-      board=self.game.board,
-      player=self.game.locations[player_idx],
-      other_player=self.game.locations[1 - player_idx]
-    )
-
+    if self.observation_mode == 'flat':
+      observation = np.frombuffer(self.game.observation_bytes(player_idx, self.with_mask), dtype=np.uint8)
+      if self.copy_observations:
+        return observation.copy()
+      self._observation_buffers[player_idx][:] = observation
+      return self._observation[player_idx]
+    packed = self.observation_mode == 'packed'
+    if self.copy_observations:
+      obs = dict(
+        board=bitboard_to_bytes(self.game.coin_bits, self.board_size).copy() if packed else self.game.board.copy(),
+        player=self.game.locations[player_idx],
+      )
+      if self.num_players == 2:
+        obs['other_player'] = self.game.locations[1 - player_idx]
+      else:
+        locations = self.game.locations
+        obs['other_players'] = np.array([locations[other] for other in self.game.others(player_idx)], dtype=np.int64)
+
+      if self.with_mask:
+        obs['mask'] = self.game.action_mask(player_idx).copy()
+
+      return obs
+
+    # The board is shared by the agents, the game makes a new board array only when the coins change,
+    # copied only then. The locations are written on each move (see _write_locations).
+    buffers = self._shared_buffers
+    in_buffers = self._in_buffers
+    if packed:
+      if self.game.coin_bits != in_buffers['board']:
+        buffers['board'][:] = bitboard_to_bytes(self.game.coin_bits, self.board_size)
+        in_buffers['board'] = self.game.coin_bits
+    else:
+      board = self.game.board
+      if board is not in_buffers['board']:
+        buffers['board'][:] = board
+        in_buffers['board'] = board
     if self.with_mask:
-      all_moves = product(range(8), repeat=2)
-      mask = [self.check_action_valid(move, player_idx) for move in all_moves]
-      # mask = np.array([
-      #    [self.check_action_valid((row, col), player) for col in range(8)]
-      #    for row in range(8)
-      # ])
-      obs['mask'] = mask # TODO: should return a 8 x 8 matrix?
+      mask = self.game.action_mask(player_idx)
+      if mask is not in_buffers['masks'][player_idx]:
+        self._mask_buffers[player_idx][:] = mask
+        in_buffers['masks'][player_idx] = mask
+    return self._observation[player_idx]
 
-    return obs
+  def _write_locations(self, player_idx: int = None) -> None:
+    """
+    Copies the location of the player (of all the players when None) into the shared locations buffer.
+    """
+    if self.copy_observations or self.observation_mode == 'flat':
+      return
+    locations = self._shared_buffers['locations']
+    num_players = self.num_players
+    for i in (range(num_players) if player_idx is None else (player_idx,)):
+      locations[i] = locations[i + num_players] = self.game.locations[i]
 
   def _calc_reward(self, player_idx: int):
     current_coins = self.game.coins[player_idx]
@@ -216,23 +338,74 @@ class CollectCoinsEnv(AECEnv):
     self.previous_coins[player_idx] = current_coins
     done = self.game.is_done()
     if done:
-      draw = self.game.coins[player_idx] == self.game.coins[1 - player_idx]
-      win = self.game.coins[player_idx] > self.game.coins[1 - player_idx]
+      best_other = max(self.game.coins[other] for other in self.game.others(player_idx))
+      draw = self.game.coins[player_idx] == best_other
+      win = self.game.coins[player_idx] > best_other
       return 0 if draw else (1 if win else -1)
     else:
       return (current_coins - previous_coins) * 0.01
 
+  def get_state(self) -> tuple:
+    """
+    The state of the environment (see set_state), for example for a lookahead search.
+    """
+    return (
+      self.game.snapshot(),
+      tuple(self.previous_coins),
+      tuple(self.agents),
+      self.agent_selection,
+      (self._agent_selector._current_agent, self._agent_selector.selected_agent),
+      self.num_moves,
+      *(
+        tuple(d.items())
+        for d in (self.rewards, self._cumulative_rewards, self.terminations, self.truncations)
+      ),
+    )
+
+  def set_state(self, state: tuple) -> None:
+    (
+      game_state, previous_coins, agents, agent_selection, (current_agent, selected_agent), self.num_moves,
+      rewards, cumulative_rewards, terminations, truncations
+    ) = state
+    self.game.restore(game_state)
+    self.previous_coins = list(previous_coins)
+    self.agents = list(agents)
+    # the selector's position as it was (also after the episode's end, when there are no agents left)
+    self._agent_selector.reinit(self.agents)
+    self._agent_selector._current_agent = current_agent
+    self._agent_selector.selected_agent = selected_agent
+    self.agent_selection = agent_selection
+    self.rewards = dict(rewards)
+    self._cumulative_rewards = dict(cumulative_rewards)
+    self.terminations = dict(terminations)
+    self.truncations = dict(truncations)
+    self.infos = {agent: {} for agent in self.agents}
+    self._write_locations()
+
   def render(self, *args, **argv):
     self.game.render()
 
+  @property
+  def observations(self):
+    """
+    The agents' observations, by agent (as the former 'observations' attribute).
+    Made on access by observe, prefer observe(agent) for a single agent.
+    """
+    return {agent: self.observe(agent) for agent in self.agents}
+
   def observe(self, agent):
       """
       Observe should return the observation of the specified agent. This function
       should return a sane observation (though not necessarily the most up to date possible)
       at any time after reset() is called.
       """
-      # observation of one agent is the previous state of the other
-      return self.observations[agent]
+      profiler = self.profiler
+      if profiler is None:
+          return self._get_observation(self.agent_name_mapping[agent])
+      start = time.perf_counter()
+      observation = self._get_observation(self.agent_name_mapping[agent])
+      profiler.lap('observation', start)
+      return observation
 
   def close(self):
       """
@@ -247,21 +420,21 @@ class CollectCoinsEnv(AECEnv):
     This helper function can be used when initializing EnsureValidAction wrapper as an example (see in examples).
     """
 
-    player_idx = player_idx or self.agent_name_mapping[self.agent_selection]
+    if player_idx is None:
+      player_idx = self.agent_name_mapping[self.agent_selection]
 
-    # print(action)
+    if action is None: # the agent is done, or passes when it has no valid move (ex. blocked by the other pieces)
+      agent = self.possible_agents[player_idx]
+      done = self.terminations.get(agent, True) or self.truncations.get(agent, True)
+      return done or len(self.game.legal_moves(player_idx)) < 1
 
+    board_size = self.board_size
     if not isinstance(action, (tuple, np.ndarray, list)):
-        action = (action // 8, action % 8)  # because for example, Tianshou may return np.int64 ?
+      if not 0 <= action < board_size * board_size: # a flat index, because for example, Tianshou may return np.int64
+        return False
+      action = divmod(int(action), board_size)
 
-    # action = tuple(action)
-    assert isinstance(action, tuple)
-    assert len(action) == 2
-
-    return self.game.valid_move(
-      player_idx,
-      action
-    )
+    return self.game.valid_move(player_idx, action)
 
   def provide_alternative_valid_action(self, action, player: str=None):
     """
@@ -275,6 +448,5 @@ class CollectCoinsEnv(AECEnv):
 
     player_idx: int = self.agent_name_mapping[player]
 
-    all_moves = product(range(8), repeat=2)
-    all_valid_moves = [move for move in all_moves if self.check_action_valid(move, player_idx)]
-    return None if len(all_valid_moves) < 1 else random.choice(all_valid_moves)
+    legal_moves = self.game.legal_moves(player_idx)
+    return None if len(legal_moves) < 1 else random.choice(legal_moves)
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+import time
+from typing import Optional
+
+from qwertyenv.collect_coins_game import CollectCoinsGame
+
+
+WIN = 1000 # the value of a won game, more than any coins difference
+
+# transposition table entries' flags
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class _OutOfBudget(Exception):
+  pass
+
+
+class AlphaBetaPlayer:
+  """
+  A CollectCoins player that searches ahead with alpha-beta (negamax).
+
+  The search deepens iteratively (depth 1, 2, ...) till the budget of the move is used, and plays the best move
+  of the deepest completed search. The budget is a time limit and / or a limit on the number of nodes visited.
+  Positions are kept in a transposition table of bounded size, the least recently used entries are evicted.
+
+  A leaf is valued by the coins difference (for the player to move), a game that is done by WIN (or -WIN, or 0).
+  Statistics on the last search are found in 'last_search' (depth, nodes, elapsed seconds, value).
+
+  Can be used as the opponent of CollectCoinsEnv (a callable (game, player) -> move).
+  Two players games only (negamax: a player's gain is the other player's loss).
+  """
+
+  def __init__(self, max_time: Optional[float] = 0.005, max_nodes: Optional[int] = None,
+               max_depth: int = 64, tt_size: int = 2 ** 16):
+    """
+    max_time: seconds per move (None for no time limit)
+    max_nodes: nodes per move (None for no nodes limit)
+    max_depth: the deepest search (in plies)
+    tt_size: the maximal number of entries in the transposition table
+    """
+    assert max_time is not None or max_nodes is not None or max_depth < 64, "no budget"
+    self.max_time = max_time
+    self.max_nodes = max_nodes
+    self.max_depth = max_depth
+    self.tt_size = tt_size
+    self._tt = OrderedDict()
+    self.last_search = None
+
+  def __call__(self, game: CollectCoinsGame, player: int):
+    return self.best_move(game, player)
+
+  def best_move(self, game: CollectCoinsGame, player: int):
+    assert game.num_players == 2, f"AlphaBetaPlayer supports two players games only, not {game.num_players}"
+    assert game.turn == player
+    start = time.perf_counter()
+    self._deadline = None if self.max_time is None else start + self.max_time
+    self._nodes = 0
+    self._enforce_budget = False # depth 1 is always completed
+
+    best_move, best_value, completed_depth = None, None, 0
+    moves = game.legal_moves(player)
+    if len(moves) > 0 and not game.is_done():
+      best_move = moves[0]
+      for depth in range(1, self.max_depth + 1):
+        try:
+          value, move = self._negamax(game, depth, -WIN - 1, WIN + 1)
+        except _OutOfBudget:
+          break
+        if move is not None:
+          best_move, best_value, completed_depth = move, value, depth
+        if abs(value) >= WIN: # the outcome is known
+          break
+        self._enforce_budget = True
+
+    self.last_search = dict(
+      depth=completed_depth, nodes=self._nodes, elapsed=time.perf_counter() - start, value=best_value
+    )
+    return best_move
+
+  def _evaluate(self, game: CollectCoinsGame) -> int:
+    difference = game.coins[game.turn] - game.coins[1 - game.turn] # two players, see best_move
+    if game.is_done():
+      return 0 if difference == 0 else (WIN if difference > 0 else -WIN)
+    return difference
+
+  def _check_budget(self):
+    if not self._enforce_budget:
+      return
+    if self.max_nodes is not None and self._nodes > self.max_nodes:
+      raise _OutOfBudget()
+    if self._deadline is not None and time.perf_counter() > self._deadline:
+      raise _OutOfBudget()
+
+  def _negamax(self, game: CollectCoinsGame, depth: int, alpha: int, beta: int):
+    self._nodes += 1
+    self._check_budget()
+
+    if depth == 0 or game.is_done():
+      return self._evaluate(game), None
+
+    key = game.snapshot()
+    tt_move = None
+    entry = self._tt.get(key)
+    if entry is not None:
+      self._tt.move_to_end(key)
+      entry_depth, value, flag, tt_move = entry
+      if entry_depth >= depth:
+        if flag == EXACT:
+          return value, tt_move
+        if flag == LOWER:
+          alpha = max(alpha, value)
+        else:
+          beta = min(beta, value)
+        if alpha >= beta:
+          return value, tt_move
+
+    player = game.turn
+    moves = game.legal_moves(player)
+
+    def move_order(move):
+      # first the best move found so far, then the ones collecting a coin
+      if move == tt_move:
+        return 0
+      return 1 if game.coin_bits >> game.to_square(move) & 1 else 2
+
+    moves.sort(key=move_order)
+    if len(moves) < 1:
+      moves = [None] # a pass, blocked
+
+    original_alpha = alpha
+    best_value, best_move = -WIN - 1, None
+    for move in moves:
+      game.make_move(player, move, undoable=True)
+      try:
+        value = -self._negamax(game, depth - 1, -beta, -alpha)[0]
+      finally:
+        game.unmake_move()
+      if value > best_value:
+        best_value, best_move = value, move
+      alpha = max(alpha, value)
+      if alpha >= beta:
+        break
+
+    flag = UPPER if best_value <= original_alpha else (LOWER if best_value >= beta else EXACT)
+    self._tt[key] = (depth, best_value, flag, best_move)
+    if len(self._tt) > self.tt_size:
+      self._tt.popitem(last=False)
+    return best_value, best_move
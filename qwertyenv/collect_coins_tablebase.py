@@ -0,0 +1,319 @@
+"""Endgame tablebase of CollectCoins, the exact outcome of every position with up to a few coins left.
+
+Built by retrograde analysis, layer by layer (0 coins, 1 coin, ...): a position's moves either collect a coin
+(into the previous, already solved, layer) or stay within the layer. Within a layer the moves may go around in cycles,
+a game that never ends leaves the remaining coins to no one.
+
+Per position (coin set, the pieces' squares, turn) the table keeps the margin: the coins the player to move collects
+from now on minus the coins the other player collects, when both play optimally (for the margin).
+The outcome given the coins collected so far follows: the sign of the current difference plus the margin.
+Hence the coin difference is not a part of the index. The index is a perfect hash:
+the layer's offset + the colex rank of the coin set, then the turn and the two squares.
+"""
+
+import functools
+import math
+import multiprocessing
+import os
+import random
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from qwertyenv.collect_coins_game import BOARD_SIZE, CollectCoinsGame, Knight, Rock
+
+
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+POSITIONS = 2 * NUM_SQUARES * NUM_SQUARES # per coin set: (turn, square of player 0, square of player 1)
+INVALID = -128 # the margin of a position that can not happen (ex. both pieces on the same square)
+
+_PIECE_CLASSES = {'rock': Rock, 'knight': Knight}
+_BIG = 100 # beyond any margin, fits int8
+
+
+@functools.lru_cache(maxsize=None)
+def layer_offset(num_coins: int) -> int:
+  """
+  The index of the first position with 'num_coins' coins (the positions with fewer coins come first).
+  """
+  return sum(math.comb(NUM_SQUARES, k) for k in range(num_coins)) * POSITIONS
+
+
+def position_index(coin_bits: int, squares: Sequence[int], turn: int) -> int:
+  """
+  (coin set, as a bitboard, the squares of the pieces, turn) -> the index of the position in the tablebase
+  """
+  rank, k = 0, 0
+  while coin_bits:
+    low = coin_bits & -coin_bits
+    k += 1
+    rank += math.comb(low.bit_length() - 1, k)
+    coin_bits ^= low
+  return layer_offset(k) + ((rank * 2 + turn) * NUM_SQUARES + squares[0]) * NUM_SQUARES + squares[1]
+
+
+def _unrank(rank: int, k: int) -> List[int]:
+  """
+  colex rank -> the (sorted) coin squares
+  """
+  squares = []
+  for i in range(k, 0, -1):
+    square = i - 1
+    while math.comb(square + 1, i) <= rank:
+      square += 1
+    squares.append(square)
+    rank -= math.comb(square, i)
+  return squares[::-1]
+
+
+@functools.lru_cache(maxsize=None)
+def _successors(pieces: Tuple[str, str]) -> Tuple[np.ndarray, np.ndarray]:
+  """
+  Per position (in a layer) and move: the destination square (-1 when there is no such move), and the next position.
+  Both of shape (POSITIONS, 8).
+  """
+  tables = []
+  for piece in pieces:
+    table = np.full((NUM_SQUARES, 8), -1)
+    for square, destinations in enumerate(_PIECE_CLASSES[piece].destinations):
+      table[square, :len(destinations)] = destinations
+    tables.append(table)
+  positions = np.arange(POSITIONS)
+  turn, squares_0, squares_1 = positions // (NUM_SQUARES * NUM_SQUARES), positions // NUM_SQUARES % NUM_SQUARES, positions % NUM_SQUARES
+  white = (turn == 0)[:, None]
+  destinations = np.where(white, tables[0][squares_0], tables[1][squares_1])
+  other = np.where(white, squares_1[:, None], squares_0[:, None])
+  destinations[(destinations == other) | (squares_0 == squares_1)[:, None]] = -1
+  next_positions = np.where(
+    white,
+    (NUM_SQUARES + destinations) * NUM_SQUARES + squares_1[:, None], # black's turn next
+    squares_0[:, None] * NUM_SQUARES + destinations,
+  )
+  next_positions[destinations < 0] = 0
+  return destinations, next_positions
+
+
+def _solve_layer(pieces: Tuple[str, str], k: int, ranks: Sequence[int], previous: np.ndarray):
+  """
+  The margins and the steps (see CollectCoinsTablebase) of the positions of the given coin sets (k coins each).
+  'previous' is the layer of k - 1 coins, (number of coin sets, POSITIONS).
+  Returns two (len(ranks), POSITIONS) arrays.
+  """
+  destinations, next_positions = _successors(tuple(pieces))
+  white = np.arange(POSITIONS) < NUM_SQUARES * NUM_SQUARES
+  squares_0 = np.arange(POSITIONS) // NUM_SQUARES % NUM_SQUARES
+  squares_1 = np.arange(POSITIONS) % NUM_SQUARES
+
+  coins = np.array([_unrank(int(rank), k) for rank in ranks]).reshape(len(ranks), k)
+  rows = np.arange(len(ranks))[:, None]
+  coin_mask = np.zeros((len(ranks), NUM_SQUARES), dtype=bool)
+  coin_mask[rows, coins] = True
+  valid = ~(coin_mask[:, squares_0] | coin_mask[:, squares_1]) & (squares_0 != squares_1)
+
+  # the rank of the coin set without each of its coins, per coin set and square (of a coin)
+  binomials = np.array([[math.comb(n, i) for i in range(k + 1)] for n in range(NUM_SQUARES)])
+  i = np.arange(1, k + 1)
+  below, above = binomials[coins, i], binomials[coins, i - 1] # the terms of the coins before / after the removed one
+  child_ranks = np.zeros((len(ranks), NUM_SQUARES), dtype=np.int64)
+  for j in range(k):
+    child_ranks[rows[:, 0], coins[:, j]] = below[:, :j].sum(axis=1) + above[:, j + 1:].sum(axis=1)
+
+  has_move = destinations >= 0
+  collects = has_move & coin_mask[:, np.maximum(destinations, 0)] # (B, POSITIONS, 8)
+  # collecting moves end in the previous layer: their value (for player 0) is known, only the best of those is needed
+  b, p, m = np.nonzero(collects)
+  child = previous[child_ranks[b, destinations[p, m]], next_positions[p, m]].astype(np.int64)
+  exits = np.where(white, -_BIG, _BIG)[None, :, None].repeat(len(ranks), axis=0).repeat(8, axis=2)
+  exits[b, p, m] = np.where(white[p], 1 - child, -1 + child) # the child's margin is of the other player
+  best_exits = np.where(white, exits.max(axis=-1), exits.min(axis=-1)).astype(np.int8)
+  # the other moves stay in the layer, as indices into the flat values (with two sentinels per coin set,
+  # worst for player 0 and worst for player 1, for no such move)
+  width = POSITIONS + 2
+  inner = has_move & ~collects & valid[:, :, None]
+  sentinel = np.where(white, POSITIONS, POSITIONS + 1)[None, :, None]
+  inner_next = (np.where(inner, next_positions, sentinel) + rows[:, :, None] * width).astype(np.int32)
+  half = NUM_SQUARES * NUM_SQUARES
+
+  def iterate(clip):
+    # player 0's value, the least fixpoint from 0, clipped at 0 (from below or above), and when it was settled
+    values = np.zeros((len(ranks), width), dtype=np.int8)
+    values[:, POSITIONS], values[:, POSITIONS + 1] = -_BIG, _BIG
+    flat = values.reshape(-1)
+    steps = np.zeros((len(ranks), POSITIONS), dtype=np.int64)
+    step = 0
+    while True:
+      step += 1
+      candidates = flat[inner_next]
+      new_values = np.concatenate([
+        np.maximum(best_exits[:, :half], candidates[:, :half].max(axis=-1)), # player 0 to move
+        np.minimum(best_exits[:, half:], candidates[:, half:].min(axis=-1)), # player 1 to move
+      ], axis=1)
+      new_values = np.where(valid, clip(new_values, 0), 0).astype(np.int8)
+      changed = new_values != values[:, :POSITIONS]
+      if not changed.any():
+        return values[:, :POSITIONS].astype(np.int64), steps
+      steps[changed] = step
+      values[:, :POSITIONS] = new_values
+
+  positive, positive_steps = iterate(np.maximum) # what player 0 can force
+  negative, negative_steps = iterate(np.minimum) # what player 1 can force
+  values = np.where(positive > 0, positive, negative)
+  steps = np.where(positive > 0, positive_steps, np.where(negative < 0, negative_steps, 0))
+  margins = np.where(valid, np.where(white, values, -values), INVALID)
+  return margins.astype(np.int8), np.minimum(steps, 255).astype(np.uint8)
+
+
+def _paths(directory: str, pieces: Sequence[str]) -> Tuple[str, str]:
+  name = f"{pieces[0]}_{pieces[1]}"
+  return os.path.join(directory, f"{name}_margins.npy"), os.path.join(directory, f"{name}_steps.npy")
+
+
+def _build_chunk(args) -> None:
+  directory, pieces, k, start, stop = args
+  margins_path, steps_path = _paths(directory, pieces)
+  margins = np.load(margins_path, mmap_mode='r+')
+  steps = np.load(steps_path, mmap_mode='r+')
+  previous = np.asarray(margins[layer_offset(k - 1):layer_offset(k)]).reshape(-1, POSITIONS)
+  layer_margins, layer_steps = _solve_layer(pieces, k, range(start, stop), previous)
+  begin, end = layer_offset(k) + start * POSITIONS, layer_offset(k) + stop * POSITIONS
+  margins[begin:end] = layer_margins.reshape(-1)
+  steps[begin:end] = layer_steps.reshape(-1)
+  margins.flush()
+  steps.flush()
+
+
+def build_tablebase(
+  directory: str,
+  pieces: Sequence[str] = ('rock', 'rock'),
+  max_coins: int = 2,
+  num_workers: Optional[int] = None,
+  chunk_size: int = 32,
+  mp_context: Optional[str] = None,
+) -> Tuple[str, str]:
+  """
+  Solves all the positions with up to 'max_coins' coins, for the given pieces, into two memory-mappable .npy files
+  in 'directory': the margins (int8) and the steps (uint8). Returns their paths.
+
+  A layer's coin sets are solved in chunks of 'chunk_size', by 'num_workers' processes (None for the number of CPUs,
+  0 to solve in this process). The tables are NUM_SQUARES choose k * 8192 positions for k coins,
+  ex. 17 MB for up to 2 coins, 358 MB for up to 3.
+  """
+  assert len(pieces) == 2 and all(piece in _PIECE_CLASSES for piece in pieces)
+  os.makedirs(directory, exist_ok=True)
+  margins_path, steps_path = _paths(directory, pieces)
+  total = layer_offset(max_coins + 1)
+  margins = np.lib.format.open_memmap(margins_path, mode='w+', dtype=np.int8, shape=(total,))
+  steps = np.lib.format.open_memmap(steps_path, mode='w+', dtype=np.uint8, shape=(total,))
+  # no coins, the game is over
+  squares_0, squares_1 = np.arange(POSITIONS) // NUM_SQUARES % NUM_SQUARES, np.arange(POSITIONS) % NUM_SQUARES
+  margins[:POSITIONS] = np.where(squares_0 == squares_1, INVALID, 0)
+  steps[:POSITIONS] = 0
+  margins.flush()
+  steps.flush()
+  del margins, steps
+
+  def layers():
+    for k in range(1, max_coins + 1):
+      num_sets = math.comb(NUM_SQUARES, k)
+      yield [
+        (directory, tuple(pieces), k, start, min(start + chunk_size, num_sets))
+        for start in range(0, num_sets, chunk_size)
+      ]
+
+  if num_workers == 0:
+    for chunks in layers():
+      for chunk in chunks:
+        _build_chunk(chunk)
+  else:
+    context = multiprocessing.get_context(mp_context)
+    with context.Pool(num_workers) as pool:
+      for chunks in layers(): # a layer needs the previous one, the chunks of a layer are independent
+        pool.map(_build_chunk, chunks)
+  return margins_path, steps_path
+
+
+class CollectCoinsTablebase:
+  """
+  Lookups into a tablebase made with build_tablebase (memory-mapped, read only).
+
+  Can also play: called with (game, player) it returns the best move (a CollectCoinsEnv opponent),
+  or the move of 'fallback' when there are more coins on the board than in the tablebase (a random move when None).
+  The best move keeps the margin, and makes progress (toward the coins) when the margin is positive:
+  'steps' keeps per position in how many moves (within its layer) the margin is forced.
+  """
+
+  def __init__(self, directory: str, pieces: Sequence[str] = ('rock', 'rock'),
+               fallback: Optional[Callable[[CollectCoinsGame, int], Tuple[int, int]]] = None):
+    assert len(pieces) == 2 and all(piece in _PIECE_CLASSES for piece in pieces)
+    margins_path, steps_path = _paths(directory, pieces)
+    self.pieces = tuple(pieces)
+    self._piece_classes = tuple(_PIECE_CLASSES[piece] for piece in pieces)
+    self.margins = np.load(margins_path, mmap_mode='r')
+    self.steps = np.load(steps_path, mmap_mode='r')
+    self.max_coins = 0
+    while layer_offset(self.max_coins + 1) < len(self.margins):
+      self.max_coins += 1
+    assert layer_offset(self.max_coins + 1) == len(self.margins), "unexpected size of the tablebase"
+    self.fallback = fallback
+
+  def covers(self, game: CollectCoinsGame) -> bool:
+    """
+    Whether the game's position is in the tablebase: two players with the solved pieces (in order), on the default
+    8 x 8 board, with at most 'max_coins' coins left.
+    """
+    return (
+      game.board_size == BOARD_SIZE
+      and tuple(type(piece) for piece in game.pieces) == self._piece_classes
+      and game.num_coins <= self.max_coins
+    )
+
+  def margin(self, game: CollectCoinsGame) -> Optional[int]:
+    """
+    The coins the player to move collects from now on minus the other player's, with optimal play.
+    None when not covered (see covers), ex. there are more coins on the board than in the tablebase.
+    """
+    if not self.covers(game):
+      return None
+    return int(self.margins[position_index(game.coin_bits, game.squares, game.turn)])
+
+  def outcome(self, game: CollectCoinsGame, player: int) -> Optional[int]:
+    """
+    1 (win), 0 (draw), or -1 (lose) for the player, with optimal play from here. None when not covered.
+    """
+    margin = self.margin(game)
+    if margin is None:
+      return None
+    if player != game.turn:
+      margin = -margin
+    return int(np.sign(game.coins[player] - game.coins[1 - player] + margin))
+
+  def best_move(self, game: CollectCoinsGame) -> Optional[Tuple[int, int]]:
+    """
+    The best move of the player to move (None when not covered, or there is no valid move).
+    """
+    if not self.covers(game):
+      return None
+    best, best_key = None, None
+    for move in game.legal_moves(game.turn):
+      coin_bits = game.coin_bits
+      game.make_move(game.turn, move, undoable=True)
+      index = position_index(game.coin_bits, game.squares, game.turn)
+      collected = game.coin_bits != coin_bits
+      game.unmake_move()
+      value = int(collected) - int(self.margins[index])
+      steps = -1 if collected else int(self.steps[index])
+      # the higher value, then the fewer steps (winning) or the more steps (losing)
+      key = (value, -steps if value > 0 else steps)
+      if best_key is None or key > best_key:
+        best, best_key = move, key
+    return best
+
+  def __call__(self, game: CollectCoinsGame, player: int):
+    assert game.turn == player
+    move = self.best_move(game)
+    if move is not None:
+      return move
+    if self.fallback is not None:
+      return self.fallback(game, player)
+    legal_moves = game.legal_moves(player)
+    return None if len(legal_moves) < 1 else random.choice(legal_moves)
@@ -0,0 +1,189 @@
+from typing import List, Optional, Union
+
+import gymnasium as gym
+from gymnasium.utils import seeding
+import numpy as np
+
+from qwertyenv.collect_coins_game import BOARD_SIZE, Knight, Rock
+
+
+def destinations_table(piece) -> np.ndarray:
+  """
+  (64, 8) array, per square the destinations of the piece, padded with -1
+  """
+  table = np.full((BOARD_SIZE * BOARD_SIZE, 8), -1, dtype=np.int64)
+  for square, destinations in enumerate(piece.destinations):
+    table[square, :len(destinations)] = destinations
+  return table
+
+
+def bitboards_to_array(bits: np.ndarray) -> np.ndarray:
+  """
+  (N,) uint64 bitboards -> (N, 64) bool array (index row * 8 + col)
+  """
+  as_bytes = bits.astype('<u8').view(np.uint8).reshape(len(bits), 8)
+  return np.unpackbits(as_bytes, axis=1, bitorder='little').view(bool)
+
+
+class CollectCoinsVectorEnv(gym.vector.VectorEnv):
+  """
+  CollectCoins, vectorized.
+
+  Plays 'num_envs' games at once, against the same opponent as CollectCoinsEnv (a random valid move).
+  The games are kept as arrays: the coins as (N,) uint64 bitboards, the locations as an (N, 2, 2) array
+  (game, player, (row, col)) and the collected coins as (N, 2). Validating and making the moves, the opponent's
+  reply, the rewards and checking for the end of the games are array operations over all the games.
+
+  Observations, actions and rewards are the ones of CollectCoinsEnv, batched.
+  A game that is done is reset automatically, the observations the games ended with are found in
+  info['final_observation'] (an object array, a per-game dict where info['_final_observation'] is True, None elsewhere),
+  as with Gymnasium's vector environments.
+
+  Two players on the default 8 x 8 board only (a game's coins are a single uint64).
+  """
+
+  def __init__(self, num_envs: int = 64, pieces=['rock', 'rock'], player=0, max_episode_steps=300,
+               board_size=BOARD_SIZE):
+    """
+    player 0 is the first entry, AKA white
+    player 1 is the second entry, AKA black (then the opponent makes the first move)
+    max_episode_steps: games are truncated after that many steps (as 'qwertyenv/CollectCoins-v0' is registered)
+    board_size: must be 8 (BOARD_SIZE), other sizes are supported by CollectCoinsEnv
+    """
+    assert board_size == BOARD_SIZE, f"CollectCoinsVectorEnv supports only {BOARD_SIZE}x{BOARD_SIZE} boards, got {board_size}"
+    assert len(pieces) == 2
+    assert all(piece in ['rock', 'knight'] for piece in pieces)
+
+    obs_space = dict(
+      board = gym.spaces.Box(low=0, high=1, shape=(8 * 8,), dtype=bool),
+      player = gym.spaces.MultiDiscrete([8, 8]),
+      other_player = gym.spaces.MultiDiscrete([8, 8]),
+    )
+    super().__init__(num_envs, gym.spaces.Dict(spaces=obs_space), gym.spaces.MultiDiscrete([8, 8]))
+
+    pieces_classes = [Rock if piece == 'rock' else Knight for piece in pieces]
+    self._moves = [np.array(piece.moves, dtype=np.uint64) for piece in pieces_classes]
+    self._destinations = [destinations_table(piece) for piece in pieces_classes]
+
+    self.pieces = pieces
+    self.player = player
+    self.other_player = 1 - player
+    self.max_episode_steps = max_episode_steps
+
+    self._start_locations = np.array([(0, 0), (7, 7)])
+    start_squares = self._start_locations[:, 0] * BOARD_SIZE + self._start_locations[:, 1]
+    self._start_board = np.uint64(((1 << (BOARD_SIZE * BOARD_SIZE)) - 1) & ~sum(1 << int(s) for s in start_squares))
+
+    self.boards = np.zeros(num_envs, dtype=np.uint64)
+    self.locations = np.zeros((num_envs, 2, 2), dtype=np.int64)
+    self.coins = np.zeros((num_envs, 2), dtype=np.int64)
+    self.previous_coins = np.zeros(num_envs, dtype=np.int64)
+    self.num_steps = np.zeros(num_envs, dtype=np.int64)
+    self._all = np.ones(num_envs, dtype=bool)
+    self._actions = None
+
+  def squares(self, player) -> np.ndarray:
+    return self.locations[:, player, 0] * BOARD_SIZE + self.locations[:, player, 1]
+
+  def is_done(self) -> np.ndarray:
+    return self.boards == 0
+
+  def _new_games(self, mask):
+    self.boards[mask] = self._start_board
+    self.locations[mask] = self._start_locations
+    self.coins[mask] = 0
+    self.previous_coins[mask] = 0
+    self.num_steps[mask] = 0
+    if self.player == 1:
+      self._play_other(mask)
+
+  def reset_wait(
+    self,
+    seed: Optional[Union[int, List[int]]] = None,
+    options: Optional[dict] = None,
+  ):
+    if seed is not None:
+      self._np_random, _ = seeding.np_random(seed)
+    self._new_games(self._all)
+    return self._get_observation(), {}
+
+  def step_async(self, actions):
+    self._actions = np.asarray(actions)
+
+  def valid_moves(self, player, moves) -> np.ndarray:
+    """
+    moves: (N, 2) array of destinations (row, col), returns (N,) bool array
+    """
+    rows, cols = moves[:, 0], moves[:, 1]
+    in_board = (rows >= 0) & (rows < BOARD_SIZE) & (cols >= 0) & (cols < BOARD_SIZE)
+    squares = np.where(in_board, rows * BOARD_SIZE + cols, 0).astype(np.uint64)
+    reachable = (self._moves[player][self.squares(player)] >> squares) & np.uint64(1)
+    return in_board & (reachable == 1) & (squares != self.squares(1 - player))
+
+  def action_masks(self) -> np.ndarray:
+    """
+    (N, 64) bool array, the valid moves of the player (index row * 8 + col), ex. for EnsureValidAction(action_mask=...)
+    """
+    other_squares = np.left_shift(np.uint64(1), self.squares(self.other_player).astype(np.uint64))
+    return bitboards_to_array(self._moves[self.player][self.squares(self.player)] & ~other_squares)
+
+  def _make_moves(self, player, squares, mask):
+    """
+    moves the player's piece to the squares (flat index) in the games in mask, collecting the coins
+    """
+    bits = np.where(mask, np.left_shift(np.uint64(1), np.where(mask, squares, 0).astype(np.uint64)), np.uint64(0))
+    collected = (self.boards & bits) != 0
+    self.coins[:, player] += collected
+    self.boards &= ~bits
+    self.locations[mask, player, 0] = squares[mask] // BOARD_SIZE
+    self.locations[mask, player, 1] = squares[mask] % BOARD_SIZE
+
+  def _play_other(self, mask):
+    """
+    a random valid move, in the games in mask
+    """
+    candidates = self._destinations[self.other_player][self.squares(self.other_player)] # (N, 8)
+    valid = (candidates >= 0) & (candidates != self.squares(self.player)[:, None])
+    keys = np.where(valid, self.np_random.random(candidates.shape), -1.0)
+    choice = keys.argmax(axis=1)
+    squares = candidates[np.arange(self.num_envs), choice]
+    self._make_moves(self.other_player, squares, mask & valid.any(axis=1))
+
+  def _get_observation(self):
+    return dict(
+      board=bitboards_to_array(self.boards),
+      player=self.locations[:, self.player].copy(),
+      other_player=self.locations[:, self.other_player].copy(),
+    )
+
+  def _calc_reward(self):
+    current_coins = self.coins[:, self.player]
+    rewards = (current_coins - self.previous_coins) * 0.01
+    self.previous_coins[:] = current_coins
+    done = self.is_done()
+    rewards[done] = np.sign(current_coins - self.coins[:, self.other_player])[done]
+    return rewards
+
+  def step_wait(self):
+    actions = self._actions
+    assert self.valid_moves(self.player, actions).all(), "invalid move"
+    self._make_moves(self.player, actions[:, 0] * BOARD_SIZE + actions[:, 1], self._all)
+    self._play_other(~self.is_done())
+    rewards = self._calc_reward()
+    self.num_steps += 1
+
+    terminated = self.is_done()
+    truncated = ~terminated & (self.num_steps >= self.max_episode_steps)
+    infos = {}
+
+    finished = terminated | truncated
+    if finished.any():
+      final_obs = self._get_observation() # new arrays, rows of those are kept
+      final_observations = np.full(self.num_envs, None, dtype=object)
+      for i in np.flatnonzero(finished):
+        final_observations[i] = {key: value[i] for key, value in final_obs.items()}
+      infos['final_observation'] = final_observations
+      infos['_final_observation'] = finished
+      self._new_games(finished)
+
+    return self._get_observation(), rewards, terminated, truncated, infos
@@ -1,5 +1,8 @@
-from typing import TypeVar, Callable
+from typing import TypeVar, Callable, Optional, Union
 import gymnasium as gym
+import numpy as np
+
+from .valid_actions import NearestValidAction
 
 
 Action = TypeVar("Action")
@@ -11,20 +14,68 @@ class EnsureValidAction(gym.ActionWrapper):
   For example consider a Chess game, where you let the action_space be any piece moving to any square on the board,
   but then when a wrong move is taken, instead of returing a big negative reward, you just take another action,
   this time a valid one. To make sure the learning algorithm is aware of the action taken, a callback should be provided.
+
+  Alternatively to 'check_action_valid' and 'provide_alternative_valid_action', an 'action_mask' can be given:
+  either the key of the action mask in the (dict) observations, or a callable (no arguments) that returns the action mask.
+  Then an invalid action is replaced with the nearest valid action (see NearestValidAction).
+  In this mode the wrapped environment can also be a vector environment, the whole batch of actions is checked (and corrected)
+  at once, the masks are then batched as well, the callback is given the (batch of) actions taken,
+  and 'replaced' tells which of the actions were replaced.
   """
   def __init__(self, env: gym.Env,
-    check_action_valid: Callable[[Action], bool],
-    provide_alternative_valid_action: Callable[[Action], Action],
-    alternative_action_cb: Callable[[Action], None]):
+    check_action_valid: Optional[Callable[[Action], bool]] = None,
+    provide_alternative_valid_action: Optional[Callable[[Action], Action]] = None,
+    alternative_action_cb: Optional[Callable[[Action], None]] = None,
+    action_mask: Optional[Union[str, Callable[[], np.ndarray]]] = None):
 
     super().__init__(env)
+    assert (action_mask is None) == (check_action_valid is not None and provide_alternative_valid_action is not None), \
+      "either 'check_action_valid' and 'provide_alternative_valid_action', or 'action_mask'"
     self.check_action_valid = check_action_valid
     self.provide_alternative_valid_action = provide_alternative_valid_action
     self.alternative_action_cb = alternative_action_cb
+    self.action_mask = action_mask
+    self.is_vector_env = getattr(env, 'is_vector_env', False)
+    if self.is_vector_env: # the actions are the wrapped environment's, set explicitly (not left to attribute forwarding)
+      self.num_envs = env.num_envs
+      self.single_action_space = env.single_action_space
+      self.single_observation_space = env.single_observation_space
+    if action_mask is not None:
+      self._nearest = NearestValidAction(env.single_action_space if self.is_vector_env else env.action_space)
+    self._observation = None
+    self.replaced = None
+
+  def reset(self, **kwargs):
+    observation, info = self.env.reset(**kwargs)
+    self._observation = observation
+    return observation, info
+
+  def step(self, action):
+    observation, reward, terminated, truncated, info = self.env.step(self.action(action))
+    self._observation = observation
+    return observation, reward, terminated, truncated, info
 
   def action(self, action: Action) -> Action:
+    if self.action_mask is not None:
+      return self._masked_action(action)
     if self.check_action_valid(action):
       return action
     alternative_action = self.provide_alternative_valid_action(action)
-    self.alternative_action_cb(alternative_action)
-    return alternative_action
\ No newline at end of file
+    if self.alternative_action_cb is not None:
+      self.alternative_action_cb(alternative_action)
+    return alternative_action
+
+  def _masked_action(self, action: Action) -> Action:
+    if isinstance(self.action_mask, str):
+      mask = self._observation[self.action_mask]
+    else:
+      mask = self.action_mask()
+    if self.is_vector_env:
+      action, self.replaced = self._nearest(action, mask)
+      replaced = self.replaced.any()
+    else:
+      action, replaced = self._nearest.single(action, mask)
+      self.replaced = replaced
+    if replaced and self.alternative_action_cb is not None:
+      self.alternative_action_cb(action)
+    return action
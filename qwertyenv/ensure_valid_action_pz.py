@@ -1,6 +1,8 @@
-from typing import TypeVar, Callable
+from typing import TypeVar, Callable, Optional, Union
 import gymnasium as gym
+import numpy as np
 from .action_wrapper_pz import ActionWrapper
+from .valid_actions import NearestValidAction
 
 
 Action = TypeVar("Action")
@@ -12,21 +14,48 @@ class EnsureValidAction(ActionWrapper):
   For example consider a Chess game, where you let the action_space be any piece moving to any square on the board,
   but then when a wrong move is taken, instead of returing a big negative reward, you just take another action,
   this time a valid one. To make sure the learning algorithm is aware of the action taken, a callback should be provided.
+
+  Alternatively to 'check_action_valid' and 'provide_alternative_valid_action', an 'action_mask' can be given:
+  either the key of the action mask in the (dict) observations, or a callable that returns the action mask of the given agent.
+  Then an invalid action is replaced with the nearest valid action (see NearestValidAction).
   """
   def __init__(self, env: gym.Env,
-    check_action_valid: Callable[[Action], bool],
-    provide_alternative_valid_action: Callable[[Action], Action],
-    alternative_action_cb: Callable[[Action], None]):
+    check_action_valid: Optional[Callable[[Action], bool]] = None,
+    provide_alternative_valid_action: Optional[Callable[[Action], Action]] = None,
+    alternative_action_cb: Optional[Callable[[Action], None]] = None,
+    action_mask: Optional[Union[str, Callable[[str], np.ndarray]]] = None):
 
     super().__init__(env)
+    assert (action_mask is None) == (check_action_valid is not None and provide_alternative_valid_action is not None), \
+      "either 'check_action_valid' and 'provide_alternative_valid_action', or 'action_mask'"
     self.check_action_valid = check_action_valid
     self.provide_alternative_valid_action = provide_alternative_valid_action
     self.alternative_action_cb = alternative_action_cb
+    self.action_mask = action_mask
+    self._nearest = {} # per agent, made on first use
 
   def action(self, action: Action) -> Action:
+    if self.action_mask is not None:
+      return self._masked_action(action)
     if self.check_action_valid(action):
       return action
     alternative_action = self.provide_alternative_valid_action(action)
-    self.alternative_action_cb(alternative_action)
+    if self.alternative_action_cb is not None:
+      self.alternative_action_cb(alternative_action)
     return alternative_action
-  
\ No newline at end of file
+
+  def _masked_action(self, action: Action) -> Action:
+    agent = self.env.agent_selection
+    if action is None: # the agent is done
+      return action
+    if isinstance(self.action_mask, str):
+      mask = self.env.observe(agent)[self.action_mask]
+    else:
+      mask = self.action_mask(agent)
+    nearest = self._nearest.get(agent)
+    if nearest is None:
+      nearest = self._nearest[agent] = NearestValidAction(self.env.action_space(agent))
+    action, replaced = nearest.single(action, mask)
+    if replaced and self.alternative_action_cb is not None:
+      self.alternative_action_cb(action)
+    return action
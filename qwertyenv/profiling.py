@@ -0,0 +1,133 @@
+"""Per-phase timing of environments' steps.
+
+An environment (or wrapper) given a StepProfiler times the phases of its step (ex. the move, the opponent's move,
+making the observation) into fixed-size histograms, from which counts, totals and latency percentiles are available.
+Without a profiler (the default) the only cost is checking that there is none.
+"""
+
+import math
+import time
+from typing import Callable, Dict, Optional
+
+
+class PhaseHistogram:
+    """A histogram of durations (seconds) with log-spaced bins, of a fixed size.
+
+    Bins are 'bins_per_decade' per factor of 10, from 'low' to 'high' seconds,
+    shorter (longer) durations are counted in the first (last) bin.
+    """
+
+    def __init__(self, low: float = 1e-7, high: float = 100.0, bins_per_decade: int = 10):
+        self.low = low
+        self.bins_per_decade = bins_per_decade
+        self._log_low = math.log10(low)
+        self.num_bins = int(round((math.log10(high) - self._log_low) * bins_per_decade))
+        self.counts = [0] * self.num_bins
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        if seconds > 0:
+            index = int((math.log10(seconds) - self._log_low) * self.bins_per_decade)
+            index = 0 if index < 0 else (self.num_bins - 1 if index >= self.num_bins else index)
+        else:
+            index = 0
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def upper_edge(self, index: int) -> float:
+        return 10 ** (self._log_low + (index + 1) / self.bins_per_decade)
+
+    def percentile(self, q: float) -> float:
+        """The duration (the upper edge of its bin, at most the longest seen) that q percent of the durations are within."""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and cumulative > 0:
+                return min(self.upper_edge(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return dict(
+            count=self.count,
+            total=self.total,
+            mean=self.total / self.count if self.count else 0.0,
+            p50=self.percentile(50),
+            p90=self.percentile(90),
+            p99=self.percentile(99),
+            max=self.max,
+        )
+
+
+class StepProfiler:
+    """Collects the timings of the phases of steps, a PhaseHistogram per phase.
+
+    Usage in an environment's step (with self.profiler, None when not profiling):
+
+        profiler = self.profiler
+        if profiler is not None:
+            start = step_start = time.perf_counter()
+        ... # a phase
+        if profiler is not None:
+            start = profiler.lap("phase", start)
+        ...
+        if profiler is not None:
+            profiler.end_step("step", step_start)
+
+    Args:
+      sink: optional, called with the summary (see summary) every 'sink_every' steps, ex. to log it.
+      sink_every: the number of steps (end_step calls) between calls to the sink.
+      reset_on_sink: start new histograms after each call to the sink (the summaries are then per period).
+    """
+
+    def __init__(
+        self,
+        sink: Optional[Callable[[Dict[str, Dict[str, float]]], None]] = None,
+        sink_every: int = 10_000,
+        reset_on_sink: bool = False,
+    ):
+        self.sink = sink
+        self.sink_every = sink_every
+        self.reset_on_sink = reset_on_sink
+        self.histograms: Dict[str, PhaseHistogram] = {}
+        self.steps = 0
+
+    def record(self, phase: str, seconds: float) -> None:
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = PhaseHistogram()
+        histogram.record(seconds)
+
+    def lap(self, phase: str, start: float) -> float:
+        """Records the time since 'start' for the phase, returns now (the start of the next phase)."""
+        now = time.perf_counter()
+        self.record(phase, now - start)
+        return now
+
+    def end_step(self, phase: str, step_start: float) -> None:
+        """Records the whole step (as the phase), and calls the sink when due."""
+        self.lap(phase, step_start)
+        self.steps += 1
+        if self.sink is not None and self.steps % self.sink_every == 0:
+            self.flush()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per phase: count, total, mean, p50, p90, p99 and max (seconds)."""
+        return {phase: histogram.summary() for phase, histogram in self.histograms.items()}
+
+    def flush(self) -> None:
+        """Calls the sink with the summary (now)."""
+        if self.sink is not None:
+            self.sink(self.summary())
+        if self.reset_on_sink:
+            self.reset()
+
+    def reset(self) -> None:
+        self.histograms = {}
@@ -3,20 +3,52 @@
 Wrapping PettingZoo environments into the matching Gymnasium environments for specific agent by providing the action for all other agents.
 """
 
-from typing import Any, Callable, Dict, Optional
+from __future__ import annotations
+
+import copy
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Union
 
 import gymnasium as gym
 from gymnasium.core import ActType, ObsType
+from gymnasium.vector.utils import create_empty_array, iterate
+import numpy as np
+
+if TYPE_CHECKING: # pettingzoo environments are given to the functions below, no need to import it here
+    from pettingzoo import AECEnv, ParallelEnv
 
-from pettingzoo import AECEnv, ParallelEnv
+    from .profiling import StepProfiler
 
 
 # The first parameter is an agent (its identification), second parameter is the relevant observation.
 # The callable is expected to return the action that the given agent would like to take.
 ActOthers = Callable[[str, ObsType], ActType]
 
+# Batched version of ActOthers, the first parameter is a list of agents, the second the matching observations.
+# The callable is expected to return the actions (a sequence, one per agent) that those agents would like to take.
+ActOthersBatch = Callable[[List[str], List[ObsType]], Sequence[ActType]]
+
+
+def _batch_into(space: gym.Space, items: List[Any], out: Any) -> Any:
+    """Writes the items (of the space) into 'out', their preallocated batch (see create_empty_array).
+
+    As gymnasium.vector.utils.concatenate, but a field's items are assigned at once, no per item conversion
+    (ex. np.stack of Discrete's integers), a few times faster for small observations.
+    """
+    if isinstance(space, gym.spaces.Dict):
+        for key, subspace in space.spaces.items():
+            _batch_into(subspace, [item[key] for item in items], out[key])
+    elif isinstance(space, gym.spaces.Tuple):
+        for index, subspace in enumerate(space.spaces):
+            _batch_into(subspace, [item[index] for item in items], out[index])
+    else:
+        out[...] = items
+    return out
+
 
-def aec_to_gymnasium(aec_env: AECEnv, external_agent: str, act_others: ActOthers):
+def aec_to_gymnasium(
+    aec_env: AECEnv, external_agent: str, act_others: ActOthers, profiler: Optional[StepProfiler] = None
+):
     """Makes a Gymnasium environment out of a AECEnv.
 
     Wraps a PettingZoo environment (AECEnv) and make a Gymnasium environment out of it (for a single agent).
@@ -28,17 +60,22 @@ def aec_to_gymnasium(aec_env: AECEnv, external_agent: str, act_others: ActOthers
         In other words, this is the agent that would interact with this Gymnasium environment.
       act_other: is a callable that accepts an agent and a
         relevant observation and returns the action that should be taken on behalf of that agent.
+      profiler: optional, a StepProfiler (see qwertyenv.profiling) to time the phases of each step:
+        'env_step' (the external agent's step), 'act_others' and 'others_step' (per other agent's turn), and the whole 'step'.
 
     Returns:
       A Gymnasium environment.
     """
 
     class WrapperEnv(gym.Env):
-      def __init__(self, aec_env: AECEnv, external_agent: str, act_others: ActOthers):
+      def __init__(
+          self, aec_env: AECEnv, external_agent: str, act_others: ActOthers, profiler: Optional[StepProfiler]
+      ):
           super().__init__()
           self._aec_env = aec_env
           self._external_agent = external_agent
           self._act_others = act_others
+          self.profiler = profiler
           self.observation_space = self._aec_env.observation_space(external_agent)
           self.action_space = self._aec_env.action_space(external_agent)
 
@@ -54,21 +91,36 @@ def aec_to_gymnasium(aec_env: AECEnv, external_agent: str, act_others: ActOthers
           return observation, info
 
       def step(self, action):
+          profiler = self.profiler
+          if profiler is not None:
+              step_start = time.perf_counter()
           agent = self._aec_env.agent_selection
           assert agent == self._external_agent, f"expected it to be my turn, got {agent}"
           self._aec_env.step(action)
+          if profiler is not None:
+              profiler.lap('env_step', step_start)
           self._loop_others()
+          if profiler is not None:
+              profiler.end_step('step', step_start)
           return self._aec_env.last()
 
       def _loop_others(self):
+          profiler = self.profiler
           for agent in self._aec_env.agent_iter():
               if agent == self._external_agent:
                   break
               observation, _, terminated, truncated, _ = self._aec_env.last()
               if terminated or truncated:
                   break
-              action_current = self._act_others(agent, observation)
-              self._aec_env.step(action_current)
+              if profiler is None:
+                  action_current = self._act_others(agent, observation)
+                  self._aec_env.step(action_current)
+              else:
+                  start = time.perf_counter()
+                  action_current = self._act_others(agent, observation)
+                  start = profiler.lap('act_others', start)
+                  self._aec_env.step(action_current)
+                  profiler.lap('others_step', start)
 
       def render(self, *args, **kwargs):
           return self._aec_env.render(*args, **kwargs)
@@ -76,10 +128,165 @@ def aec_to_gymnasium(aec_env: AECEnv, external_agent: str, act_others: ActOthers
       def close(self):
           return self._aec_env.close()
 
-    return WrapperEnv(aec_env, external_agent, act_others)
+    return WrapperEnv(aec_env, external_agent, act_others, profiler)
+
+
+def aec_to_gymnasium_vector(
+    aec_envs: List[AECEnv],
+    external_agent: str,
+    act_others_batch: ActOthersBatch,
+    profiler: Optional[StepProfiler] = None,
+):
+    """Makes a Gymnasium vector environment out of AECEnvs.
+
+    As aec_to_gymnasium, for many AECEnv environments (ex. many copies of the same game) at once.
+    The other agents' actions are fetched in batches: all the environments are advanced to their pending turns of the other agents,
+    'act_others_batch' is then called once with all those agents and observations (ex. a single forward pass of a policy network),
+    and the actions are stepped back into the matching environments, and so on till it is the turn of the external agent again
+    (or the environments are done). As with other Gymnasium vector environments, environments that are done are reset automatically.
+    The observations are copied into the batch (and the final observations, see info['final_observation'], are copies),
+    hence the environments may reuse their observations' arrays (ex. CollectCoinsEnv(copy_observations=False)).
+
+    Args:
+      aec_envs: are the PettingZoo AECEnv environments to wrap, with the same spaces for the 'external_agent'.
+      external_agent: is the agent for which the Gymnasium 'step' function is called.
+      act_others_batch: is a callable that accepts a list of agents and the matching list of observations
+        and returns the actions that should be taken on behalf of those agents.
+      profiler: optional, a StepProfiler (see qwertyenv.profiling) to time the phases of each (batched) step:
+        'env_step' (the external agent's steps), 'act_others' and 'others_step' (per batch of the other agents' turns),
+        'autoreset', and the whole 'step'.
+
+    Returns:
+      A Gymnasium vector environment.
+    """
+
+    class WrapperVectorEnv(gym.vector.VectorEnv):
+      def __init__(
+          self,
+          aec_envs: List[AECEnv],
+          external_agent: str,
+          act_others_batch: ActOthersBatch,
+          profiler: Optional[StepProfiler],
+      ):
+          super().__init__(
+              len(aec_envs),
+              aec_envs[0].observation_space(external_agent),
+              aec_envs[0].action_space(external_agent),
+          )
+          self._aec_envs = aec_envs
+          self._external_agent = external_agent
+          self._act_others_batch = act_others_batch
+          self.profiler = profiler
+          self._observations = create_empty_array(self.single_observation_space, n=self.num_envs)
+          self._actions = None
+
+      def reset_wait(
+          self,
+          seed: Optional[Union[int, List[int]]] = None,
+          options: Optional[dict] = None,
+      ):
+          if seed is None or isinstance(seed, int):
+              seed = [None if seed is None else seed + i for i in range(self.num_envs)]
+          for aec_env, env_seed in zip(self._aec_envs, seed):
+              aec_env.reset(seed=env_seed)
+          self._loop_others(range(self.num_envs))
+          observations, infos = [], {}
+          for i, aec_env in enumerate(self._aec_envs):
+              observation, _, _, _, info = aec_env.last()
+              observations.append(observation)
+              infos = self._add_info(infos, info, i)
+          self._observations = _batch_into(self.single_observation_space, observations, self._observations)
+          return self._observations, infos
+
+      def step_async(self, actions):
+          self._actions = actions
+
+      def step_wait(self):
+          profiler = self.profiler
+          if profiler is not None:
+              step_start = time.perf_counter()
+          for aec_env, action in zip(self._aec_envs, iterate(self.action_space, self._actions)):
+              agent = aec_env.agent_selection
+              assert agent == self._external_agent, f"expected it to be my turn, got {agent}"
+              aec_env.step(action)
+          if profiler is not None:
+              profiler.lap('env_step', step_start)
+          self._loop_others(range(self.num_envs))
+
+          results = [aec_env.last() for aec_env in self._aec_envs]
+          done = [i for i, (_, _, terminated, truncated, _) in enumerate(results) if terminated or truncated]
+          if done:
+              if profiler is not None:
+                  start = time.perf_counter()
+              for i in done:
+                  # the environment may reuse its observation's arrays, those are overwritten by the reset
+                  observation, reward, terminated, truncated, info = results[i]
+                  results[i] = (copy.deepcopy(observation), reward, terminated, truncated, info)
+                  self._aec_envs[i].reset()
+              self._loop_others(done)
+              if profiler is not None:
+                  profiler.lap('autoreset', start)
+
+          observations, infos = [], {}
+          rewards = np.zeros(self.num_envs, dtype=np.float64)
+          terminateds = np.zeros(self.num_envs, dtype=bool)
+          truncateds = np.zeros(self.num_envs, dtype=bool)
+          for i, (observation, rewards[i], terminateds[i], truncateds[i], info) in enumerate(results):
+              if terminateds[i] or truncateds[i]:
+                  final_observation, final_info = observation, info
+                  observation, _, _, _, info = self._aec_envs[i].last()
+                  info = dict(info, final_observation=final_observation, final_info=final_info)
+              observations.append(observation)
+              infos = self._add_info(infos, info, i)
+          self._observations = _batch_into(self.single_observation_space, observations, self._observations)
+          if profiler is not None:
+              profiler.end_step('step', step_start)
+          return self._observations, rewards, terminateds, truncateds, infos
+
+      def _loop_others(self, indices):
+          profiler = self.profiler
+          pending = list(indices)
+          while pending:
+              waiting, agents, observations = [], [], []
+              for i in pending:
+                  aec_env = self._aec_envs[i]
+                  if not aec_env.agents:
+                      continue
+                  agent = aec_env.agent_selection
+                  if agent == self._external_agent or aec_env.terminations[agent] or aec_env.truncations[agent]:
+                      continue
+                  waiting.append(i)
+                  agents.append(agent)
+                  observations.append(aec_env.observe(agent))
+              if not waiting:
+                  break
+              if profiler is not None:
+                  start = time.perf_counter()
+              actions = self._act_others_batch(agents, observations)
+              if profiler is not None:
+                  start = profiler.lap('act_others', start)
+              for i, action in zip(waiting, actions):
+                  self._aec_envs[i].step(action)
+              if profiler is not None:
+                  profiler.lap('others_step', start)
+              pending = waiting
+
+      def render(self, *args, **kwargs):
+          return [aec_env.render(*args, **kwargs) for aec_env in self._aec_envs]
+
+      def close_extras(self, **kwargs):
+          for aec_env in self._aec_envs:
+              aec_env.close()
 
+    return WrapperVectorEnv(aec_envs, external_agent, act_others_batch, profiler)
 
-def parallel_to_gymnasium(parallel_env: ParallelEnv, external_agent: str, act_others: ActOthers):
+
+def parallel_to_gymnasium(
+    parallel_env: ParallelEnv,
+    external_agent: str,
+    act_others: ActOthers,
+    profiler: Optional[StepProfiler] = None,
+):
     """Makes a Gymnasium environment out of a ParallelEnv.
 
     Wraps a PettingZoo environment (ParallelEnv) and make a Gymnasium environment out of it (for a single agent).
@@ -91,6 +298,8 @@ def parallel_to_gymnasium(parallel_env: ParallelEnv, external_agent: str, act_ot
         In other words, this is the agent that would interact with this Gymnasium environment.
       act_other: is a callable that accepts an agent and a
         relevant observation and returns the action that should be taken on behalf of that agent.
+      profiler: optional, a StepProfiler (see qwertyenv.profiling) to time the phases of each step:
+        'act_others' (all the other agents' actions), 'env_step' (the ParallelEnv's step), and the whole 'step'.
 
     Returns:
       A Gymnasium environment.
@@ -98,12 +307,17 @@ def parallel_to_gymnasium(parallel_env: ParallelEnv, external_agent: str, act_ot
 
     class WrapperEnv(gym.Env):
       def __init__(
-          self, parallel_env: ParallelEnv, external_agent: str, act_others: ActOthers
+          self,
+          parallel_env: ParallelEnv,
+          external_agent: str,
+          act_others: ActOthers,
+          profiler: Optional[StepProfiler],
       ):
           super().__init__()
           self._parallel_env = parallel_env
           self._external_agent = external_agent
           self._act_others = act_others
+          self.profiler = profiler
           self.observation_space = self._parallel_env.observation_space(external_agent)
           self.action_space = self._parallel_env.action_space(external_agent)
           self._observations: Dict[str, Any]
@@ -118,6 +332,9 @@ def parallel_to_gymnasium(parallel_env: ParallelEnv, external_agent: str, act_ot
           return self._observations[self._external_agent], {}
 
       def step(self, action):
+          profiler = self.profiler
+          if profiler is not None:
+              start = step_start = time.perf_counter()
           assert self._observations is not None
           actions = {
               agent: (
@@ -127,6 +344,8 @@ def parallel_to_gymnasium(parallel_env: ParallelEnv, external_agent: str, act_ot
               )
               for agent in self._parallel_env.agents
           }
+          if profiler is not None:
+              start = profiler.lap('act_others', start)
           (
               observations,
               rewards,
@@ -135,6 +354,9 @@ def parallel_to_gymnasium(parallel_env: ParallelEnv, external_agent: str, act_ot
               infos,
           ) = self._parallel_env.step(actions)
           self._observations = observations
+          if profiler is not None:
+              profiler.lap('env_step', start)
+              profiler.end_step('step', step_start)
           return (
               self._observations[self._external_agent],
               rewards[self._external_agent],
@@ -149,4 +371,44 @@ def parallel_to_gymnasium(parallel_env: ParallelEnv, external_agent: str, act_ot
       def close(self):
           return self._parallel_env.close()
 
-    return WrapperEnv(parallel_env, external_agent, act_others)
+    return WrapperEnv(parallel_env, external_agent, act_others, profiler)
+
+
+class AECToGymnasium:
+    """A picklable factory of aec_to_gymnasium environments.
+
+    The environments made by aec_to_gymnasium are instances of a local class, hence they (and lambdas making them)
+    can not be sent to worker processes. An instance of this class can (given a picklable 'env_fn' and 'act_others',
+    ex. module level functions or functools.partial of those), and makes the Gymnasium environment when called.
+
+    Args:
+      env_fn: makes the PettingZoo AECEnv environment to wrap.
+      external_agent: is the agent for which the Gymnasium 'step' function is called.
+      act_others: as in aec_to_gymnasium.
+    """
+
+    def __init__(self, env_fn: Callable[[], AECEnv], external_agent: str, act_others: ActOthers):
+        self.env_fn = env_fn
+        self.external_agent = external_agent
+        self.act_others = act_others
+
+    def __call__(self) -> gym.Env:
+        return aec_to_gymnasium(self.env_fn(), self.external_agent, self.act_others)
+
+
+class ParallelToGymnasium:
+    """A picklable factory of parallel_to_gymnasium environments (see AECToGymnasium).
+
+    Args:
+      env_fn: makes the PettingZoo ParallelEnv environment to wrap.
+      external_agent: is the agent for which the Gymnasium 'step' function is called.
+      act_others: as in parallel_to_gymnasium.
+    """
+
+    def __init__(self, env_fn: Callable[[], ParallelEnv], external_agent: str, act_others: ActOthers):
+        self.env_fn = env_fn
+        self.external_agent = external_agent
+        self.act_others = act_others
+
+    def __call__(self) -> gym.Env:
+        return parallel_to_gymnasium(self.env_fn(), self.external_agent, self.act_others)
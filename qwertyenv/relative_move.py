@@ -0,0 +1,73 @@
+import functools
+from typing import Callable, Sequence, Tuple
+
+import gymnasium as gym
+import numpy as np
+
+from .collect_coins_game import BOARD_SIZE, ROCK_OFFSETS
+
+
+OFF_BOARD = -1 # the destination (square, row and col) of a move off the board
+
+
+@functools.lru_cache(maxsize=None)
+def relative_move_table(offsets: Tuple[Tuple[int, int], ...], board_size: int = BOARD_SIZE) -> np.ndarray:
+  """
+  (board_size * board_size, len(offsets)) array, per square (row * board_size + col) and direction (an index into offsets)
+  the destination square, OFF_BOARD when the move leaves the board. Read only.
+  """
+  rows, cols = np.divmod(np.arange(board_size * board_size), board_size)
+  d_rows, d_cols = np.array(offsets).T
+  to_rows, to_cols = rows[:, None] + d_rows[None, :], cols[:, None] + d_cols[None, :]
+  on_board = (to_rows >= 0) & (to_rows < board_size) & (to_cols >= 0) & (to_cols < board_size)
+  table = np.where(on_board, to_rows * board_size + to_cols, OFF_BOARD)
+  table.flags.writeable = False
+  return table
+
+
+class RelativeMove(gym.ActionWrapper):
+  """
+  A gym environment wrapper, the action is a direction (an index into 'offsets', ex. ROCK_OFFSETS, KNIGHT_OFFSETS)
+  when the wrapped environment actually expects a destination (row, col), as CollectCoins does.
+
+  The destinations are looked up in a table precomputed per (square, direction), see relative_move_table.
+  A move that leaves the board is translated to (OFF_BOARD, OFF_BOARD), an invalid move
+  (to be handled ex. by EnsureValidAction below this wrapper).
+  The wrapped environment can also be a vector environment, then 'get_current_location' returns an (N, 2) array
+  and the batch of directions is translated at once (an (N, 2) array of destinations).
+  """
+
+  def __init__(self, env: gym.Env,
+               get_current_location: Callable[[], Tuple[int, int]],
+               offsets: Sequence[Tuple[int, int]] = ROCK_OFFSETS,
+               board_size: int = BOARD_SIZE):
+
+    super().__init__(env)
+    self.get_current_location = get_current_location
+    self.offsets = tuple((int(d_row), int(d_col)) for d_row, d_col in offsets)
+    self.board_size = board_size
+    self.table = relative_move_table(self.offsets, board_size)
+    self.is_vector_env = getattr(env, 'is_vector_env', False)
+
+    if self.is_vector_env:
+      self.num_envs = env.num_envs
+      self.single_action_space = gym.spaces.Discrete(len(self.offsets))
+      self.single_observation_space = env.single_observation_space
+      self.action_space = gym.vector.utils.batch_space(self.single_action_space, env.num_envs)
+    else:
+      self.action_space = gym.spaces.Discrete(len(self.offsets))
+    # per square and direction the destination as a (row, col) tuple, for a cheap single environment's step
+    self._destinations = [
+      [(OFF_BOARD, OFF_BOARD) if square == OFF_BOARD else divmod(square, board_size) for square in row]
+      for row in self.table.tolist()
+    ]
+
+  def action(self, action):
+    location = self.get_current_location()
+    if self.is_vector_env:
+      locations = np.asarray(location)
+      squares = self.table[locations[:, 0] * self.board_size + locations[:, 1], np.asarray(action)]
+      rows, cols = np.divmod(squares, self.board_size)
+      return np.where((squares == OFF_BOARD)[:, None], OFF_BOARD, np.stack([rows, cols], axis=1))
+    return self._destinations[int(location[0]) * self.board_size + int(location[1])][int(action)]
+
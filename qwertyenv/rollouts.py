@@ -0,0 +1,168 @@
+"""Self-play rollouts of PettingZoo (AEC) environments, in worker processes.
+
+Each worker runs its own environment with the given policies and streams the transitions into preallocated
+columnar shards, saved as .npy files (one per field, memory-mappable with np.load(..., mmap_mode='r')).
+"""
+
+import json
+import multiprocessing
+import os
+import random
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from gymnasium.core import ActType, ObsType
+
+from .space_layout import SpaceLayout
+
+
+# The environment factory and the policies are sent to the worker processes, hence need to be picklable
+# (ex. module level functions or classes, functools.partial of those).
+EnvFactory = Callable[[], Any]
+Policy = Callable[[ObsType], ActType]
+
+
+def _shard_writer(directory: str, layouts: List[SpaceLayout], shard_size: int):
+    """Returns (columns, flush, shards): columns preallocated for shard_size transitions, flush(n) saves their first n
+    rows as a new shard, shards lists the directories of the saved shards."""
+    columns = {}
+    for layout in layouts:
+        columns.update(layout.allocate(shard_size))
+    shards = []
+
+    def flush(n: int):
+        if n < 1:
+            return
+        shard_directory = os.path.join(directory, f"shard_{len(shards):05d}")
+        os.makedirs(shard_directory, exist_ok=True)
+        for name, column in columns.items():
+            np.save(os.path.join(shard_directory, f"{name}.npy"), column[:n])
+        shards.append(shard_directory)
+
+    return columns, flush, shards
+
+
+def _run_worker(args) -> Dict[str, Any]:
+    env_fn, policies, worker, seed_sequence, num_steps, directory, shard_size = args
+
+    seed = int(seed_sequence.generate_state(1)[0])
+    random.seed(seed)
+    np.random.seed(seed)
+
+    env = env_fn()
+    env.reset(seed=seed)
+    some_agent = env.possible_agents[0]
+    obs_layout = SpaceLayout(env.observation_space(some_agent), prefix="obs")
+    action_layout = SpaceLayout(env.action_space(some_agent), prefix="action")
+    agent_index = {agent: i for i, agent in enumerate(env.possible_agents)}
+
+    worker_directory = os.path.join(directory, f"worker_{worker:03d}")
+    columns, flush, shards = _shard_writer(
+        worker_directory, [obs_layout, action_layout], shard_size
+    )
+    columns["agent"] = np.zeros(shard_size, dtype=np.uint8 if len(agent_index) < 256 else np.int32)
+    columns["reward"] = np.zeros(shard_size, dtype=np.float32)
+    columns["terminated"] = np.zeros(shard_size, dtype=bool)
+    columns["truncated"] = np.zeros(shard_size, dtype=bool)
+
+    start = time.perf_counter()
+    row, episodes = 0, 0
+    for _ in range(num_steps):
+        if not env.agents:
+            env.reset()
+        agent = env.agent_selection
+        observation, reward, terminated, truncated, _ = env.last()
+        done = terminated or truncated
+        action = None if done else policies[agent](observation)
+
+        obs_layout.write(columns, row, observation)
+        if action is not None:
+            action_layout.write(columns, row, action)
+        columns["agent"][row] = agent_index[agent]
+        columns["reward"][row] = reward
+        columns["terminated"][row] = terminated
+        columns["truncated"][row] = truncated
+        row += 1
+        if row == shard_size:
+            flush(row)
+            row = 0
+
+        env.step(action)
+        if done and not env.agents: # the last agent's terminated / truncated turn, the episode is over
+            episodes += 1
+    flush(row)
+    elapsed = time.perf_counter() - start
+    env.close()
+
+    return dict(
+        worker=worker,
+        steps=num_steps,
+        episodes=episodes,
+        seconds=elapsed,
+        steps_per_second=num_steps / elapsed if elapsed > 0 else float("inf"),
+        shards=shards,
+    )
+
+
+def generate_rollouts(
+    env_fn: EnvFactory,
+    policies: Dict[str, Policy],
+    directory: str,
+    num_workers: int = 4,
+    steps_per_worker: int = 100_000,
+    shard_size: int = 65_536,
+    seed: int = 0,
+    mp_context: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Generates self-play data in worker processes.
+
+    Each worker makes its own environment with env_fn, iterates it with agent_iter's protocol, and records,
+    for each agent's turn: the observation, the action taken (zeros when the agent is done, then None is stepped),
+    the reward, the terminated / truncated flags and the agent (its index in possible_agents).
+    Worker i saves its transitions under 'directory/worker_{i}/shard_{k}/{field}.npy', see load_shards.
+    Workers are seeded deterministically, from numpy's SeedSequence(seed) spawned per worker
+    (the environment's reset, Python's random and numpy's global random).
+
+    Args:
+      env_fn: makes a PettingZoo AEC environment (picklable).
+      policies: per agent, a callable returning the action given the observation (picklable).
+      directory: where to save the shards.
+      num_workers: the number of worker processes.
+      steps_per_worker: the number of agent steps (transitions) per worker.
+      shard_size: the number of transitions per shard.
+      seed: the root seed.
+      mp_context: the multiprocessing start method (ex. 'spawn'), None for the default.
+        Prefer 'spawn' when threaded libraries (ex. torch) were already imported, forked workers may deadlock.
+
+    Returns:
+      Per worker, a dict with: worker, steps, episodes (the episodes completed, not counting the last partial one),
+      seconds, steps_per_second and shards (the shards' directories).
+    """
+    os.makedirs(directory, exist_ok=True)
+    seed_sequences = np.random.SeedSequence(seed).spawn(num_workers)
+    args = [
+        (env_fn, policies, worker, seed_sequences[worker], steps_per_worker, directory, shard_size)
+        for worker in range(num_workers)
+    ]
+    context = multiprocessing.get_context(mp_context)
+    with context.Pool(num_workers) as pool:
+        stats = pool.map(_run_worker, args)
+    with open(os.path.join(directory, "stats.json"), "w") as f:
+        json.dump(stats, f, indent=2)
+    return stats
+
+
+def load_shards(directory: str, mmap_mode: Optional[str] = "r") -> Iterator[Dict[str, np.ndarray]]:
+    """Yields the shards saved by generate_rollouts, as dicts field -> (memory-mapped) array."""
+    for worker_directory in sorted(os.listdir(directory)):
+        worker_path = os.path.join(directory, worker_directory)
+        if not (worker_directory.startswith("worker_") and os.path.isdir(worker_path)):
+            continue
+        for shard_directory in sorted(os.listdir(worker_path)):
+            shard_path = os.path.join(worker_path, shard_directory)
+            yield {
+                file_name[: -len(".npy")]: np.load(os.path.join(shard_path, file_name), mmap_mode=mmap_mode)
+                for file_name in sorted(os.listdir(shard_path))
+                if file_name.endswith(".npy")
+            }
@@ -0,0 +1,240 @@
+"""A multi-process Gymnasium vector environment, exchanging the observations and actions through shared memory.
+
+The environments are split between worker processes, each hosting several of them. The observations, the actions,
+the rewards and the terminated / truncated flags are columns (see SpaceLayout) in shared memory. A step is then a single
+short command per worker, the workers write the results straight into the columns, only the (non empty) infos are pickled.
+"""
+
+import copy
+import multiprocessing
+from multiprocessing import shared_memory
+import traceback
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import gymnasium as gym
+import numpy as np
+
+from .space_layout import SpaceLayout
+
+
+# Makes a Gymnasium environment, sent to the worker processes hence needs to be picklable
+# (ex. a module level function, functools.partial, or the factories in pz_to_gymnasium_wrappers).
+EnvFn = Callable[[], gym.Env]
+
+_STEP, _RESET, _CLOSE = "step", "reset", "close"
+
+
+def _columns_spec(layouts: List[SpaceLayout], num_envs: int) -> List[Tuple[str, Tuple[int, ...], np.dtype]]:
+    spec = []
+    for layout in layouts:
+        spec += [(field.name, (num_envs,) + field.shape, field.dtype) for field in layout.fields]
+    spec += [
+        ("reward", (num_envs,), np.dtype(np.float64)),
+        ("terminated", (num_envs,), np.dtype(bool)),
+        ("truncated", (num_envs,), np.dtype(bool)),
+    ]
+    return spec
+
+
+def _attach(names: Dict[str, str], spec) -> Tuple[Dict[str, np.ndarray], List[shared_memory.SharedMemory]]:
+    """The columns over the shared memory blocks (by name) made by the main process."""
+    columns, blocks = {}, []
+    for name, shape, dtype in spec:
+        block = shared_memory.SharedMemory(name=names[name])
+        blocks.append(block)
+        columns[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return columns, blocks
+
+
+def _worker(
+    pipe, env_fns: Sequence[EnvFn], first: int, names: Dict[str, str], spec, obs_layout: SpaceLayout,
+    action_layout: SpaceLayout,
+):
+    envs, columns, blocks = [], {}, []
+    try:
+        # the setup is reported first, a failing factory is raised (with its traceback) by the main process
+        try:
+            for env_fn in env_fns:
+                envs.append(env_fn())
+            columns, blocks = _attach(names, spec)
+        except Exception:
+            pipe.send((False, traceback.format_exc()))
+            return
+        pipe.send((True, {}))
+
+        while True:
+            command, data = pipe.recv()
+            if command == _CLOSE:
+                break
+            infos = {}
+            try:
+                if command == _RESET:
+                    seeds, options = data
+                    for j, env in enumerate(envs):
+                        observation, info = env.reset(seed=seeds[j], options=options)
+                        obs_layout.write(columns, first + j, observation)
+                        if info:
+                            infos[first + j] = info
+                else:
+                    for j, env in enumerate(envs):
+                        i = first + j
+                        action = action_layout.read(columns, i)
+                        observation, reward, terminated, truncated, info = env.step(action)
+                        if terminated or truncated:
+                            # a copy, as the environment may reuse its observation's arrays in reset
+                            final_observation, final_info = copy.deepcopy(observation), info
+                            observation, info = env.reset()
+                            info = dict(info, final_observation=final_observation, final_info=final_info)
+                        obs_layout.write(columns, i, observation)
+                        columns["reward"][i] = reward
+                        columns["terminated"][i] = terminated
+                        columns["truncated"][i] = truncated
+                        if info:
+                            infos[i] = info
+                pipe.send((True, infos))
+            except Exception:
+                pipe.send((False, traceback.format_exc()))
+    finally:
+        for env in envs:
+            env.close()
+        del columns
+        for block in blocks:
+            block.close()
+
+
+class SharedMemoryVectorEnv(gym.vector.VectorEnv):
+    """Runs Gymnasium environments in worker processes, with the observations and the actions in shared memory.
+
+    Each worker hosts a slice of the environments, steps them all on a single command and writes their observations
+    into shared memory columns laid out from the observation space (see SpaceLayout), so observations are not pickled.
+    As with other Gymnasium vector environments, environments that are done are reset automatically
+    (info['final_observation'] and info['final_info'] per environment, where info['_final_observation'] is True).
+
+    Integer observations are kept in the smallest dtype that holds their range (ex. uint8 for MultiDiscrete([8, 8])).
+
+    Args:
+      env_fns: per environment, a picklable callable that makes it (ex. AECToGymnasium(...), ParallelToGymnasium(...)).
+      num_workers: the number of worker processes, by default one per CPU (at most one per environment).
+      copy: return copies of the observations, otherwise views of the shared memory, valid till the next step / reset.
+      mp_context: the multiprocessing start method (ex. 'spawn'), None for the default.
+    """
+
+    def __init__(
+        self,
+        env_fns: Sequence[EnvFn],
+        num_workers: Optional[int] = None,
+        copy: bool = True,
+        mp_context: Optional[str] = None,
+    ):
+        dummy_env = env_fns[0]()
+        super().__init__(len(env_fns), dummy_env.observation_space, dummy_env.action_space)
+        dummy_env.close()
+        del dummy_env
+
+        self.copy = copy
+        self._obs_layout = SpaceLayout(self.single_observation_space, prefix="obs")
+        self._action_layout = SpaceLayout(self.single_action_space, prefix="action")
+        spec = _columns_spec([self._obs_layout, self._action_layout], self.num_envs)
+        self._blocks = []
+        for _, shape, dtype in spec:
+            nbytes = max(int(np.prod(shape)) * dtype.itemsize, 1)
+            self._blocks.append(shared_memory.SharedMemory(create=True, size=nbytes))
+        names = {name: block.name for (name, _, _), block in zip(spec, self._blocks)}
+        self._columns = {
+            name: np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            for (name, shape, dtype), block in zip(spec, self._blocks)
+        }
+
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        num_workers = max(1, min(num_workers, self.num_envs))
+        context = multiprocessing.get_context(mp_context)
+        self._pipes, self._processes = [], []
+        for indices in np.array_split(np.arange(self.num_envs), num_workers):
+            first, last = int(indices[0]), int(indices[-1]) + 1
+            parent_pipe, child_pipe = context.Pipe()
+            process = context.Process(
+                target=_worker,
+                args=(
+                    child_pipe, list(env_fns[first:last]), first, names, spec, self._obs_layout,
+                    self._action_layout,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child_pipe.close()
+            self._pipes.append(parent_pipe)
+            self._processes.append(process)
+        try:
+            self._receive_infos() # the workers made their environments
+        except RuntimeError:
+            self.close()
+            raise
+
+    def reset_wait(
+        self,
+        seed: Optional[Union[int, List[int]]] = None,
+        options: Optional[dict] = None,
+    ):
+        if seed is None or isinstance(seed, int):
+            seed = [None if seed is None else seed + i for i in range(self.num_envs)]
+        assert len(seed) == self.num_envs
+        first = 0
+        for pipe, process_envs in zip(self._pipes, self._num_envs_per_worker()):
+            pipe.send((_RESET, (seed[first:first + process_envs], options)))
+            first += process_envs
+        infos = self._receive_infos()
+        return self._observations(), infos
+
+    def step_async(self, actions):
+        self._action_layout.write(self._columns, slice(None), actions)
+        for pipe in self._pipes:
+            pipe.send((_STEP, None))
+
+    def step_wait(self):
+        infos = self._receive_infos()
+        return (
+            self._observations(),
+            self._columns["reward"].copy(),
+            self._columns["terminated"].copy(),
+            self._columns["truncated"].copy(),
+            infos,
+        )
+
+    def _num_envs_per_worker(self) -> List[int]:
+        return [len(indices) for indices in np.array_split(np.arange(self.num_envs), len(self._pipes))]
+
+    def _receive_infos(self) -> dict:
+        results = [pipe.recv() for pipe in self._pipes]
+        errors = [result for success, result in results if not success]
+        if errors:
+            raise RuntimeError("a worker failed:\n" + "\n".join(errors))
+        infos = {}
+        for _, worker_infos in results:
+            for i, info in worker_infos.items():
+                infos = self._add_info(infos, info, i)
+        return infos
+
+    def _observations(self):
+        columns = self._columns
+        if self.copy:
+            columns = {field.name: columns[field.name].copy() for field in self._obs_layout.fields}
+        return self._obs_layout.read(columns, slice(None))
+
+    def close_extras(self, **kwargs):
+        for pipe in self._pipes:
+            try:
+                pipe.send((_CLOSE, None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for pipe in self._pipes:
+            pipe.close()
+        self._columns = {}
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
@@ -0,0 +1,100 @@
+"""Flat, columnar, layout of Gymnasium spaces.
+
+A (possibly nested) space is laid out as fields, one per leaf space, each with a fixed shape and dtype.
+Values of the space can then be written into, and read from, preallocated arrays (columns) with a leading batch dimension,
+for example in-memory buffers, memory-mapped files or shared memory.
+"""
+
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import gymnasium as gym
+import numpy as np
+
+
+class Field(NamedTuple):
+    name: str
+    path: Tuple[Any, ...]  # keys / indices into the (nested) value
+    shape: Tuple[int, ...]
+    dtype: np.dtype
+
+
+def _int_dtype(low, high) -> np.dtype:
+    return np.result_type(np.min_scalar_type(int(low)), np.min_scalar_type(int(high)))
+
+
+def _leaf_shape_and_dtype(space: gym.Space) -> Tuple[Tuple[int, ...], np.dtype]:
+    if isinstance(space, gym.spaces.Discrete):
+        return (), _int_dtype(space.start, space.start + space.n - 1)
+    if isinstance(space, gym.spaces.MultiDiscrete):
+        return space.shape, _int_dtype(0, np.max(space.nvec) - 1)
+    if isinstance(space, gym.spaces.MultiBinary):
+        return space.shape, np.dtype(bool)
+    if isinstance(space, gym.spaces.Box):
+        return space.shape, space.dtype
+    raise TypeError(f"{type(space).__name__} space {space} is not supported (Discrete, MultiDiscrete, MultiBinary or Box)")
+
+
+class SpaceLayout:
+    """Lays out a space as fields, one per leaf space (Discrete, MultiDiscrete, MultiBinary or Box).
+
+    Dict and Tuple spaces are walked, a field's name is made of the keys / indices on the way, joined with '.'
+    (ex. 'board', 'player.0'). Integers are kept in the smallest dtype that holds their range (ex. uint8 for Discrete(8)),
+    MultiBinary as bool.
+    """
+
+    def __init__(self, space: gym.Space, prefix: str = ""):
+        self.space = space
+        self.fields: List[Field] = []
+        self._prefix = prefix
+        self._add_fields(space, ())
+
+    def _add_fields(self, space: gym.Space, path: Tuple[Any, ...]):
+        if isinstance(space, gym.spaces.Dict):
+            for key, subspace in space.spaces.items():
+                self._add_fields(subspace, path + (key,))
+        elif isinstance(space, gym.spaces.Tuple):
+            for i, subspace in enumerate(space.spaces):
+                self._add_fields(subspace, path + (i,))
+        else:
+            shape, dtype = _leaf_shape_and_dtype(space)
+            parts = ([self._prefix] if self._prefix else []) + [str(key) for key in path]
+            name = ".".join(parts) or "value"
+            self.fields.append(Field(name, path, shape, dtype))
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of one value."""
+        return sum(int(np.prod(field.shape)) * field.dtype.itemsize for field in self.fields)
+
+    def allocate(
+        self, n: int, allocator: Callable[[Field, Tuple[int, ...]], np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """Columns for n values, by default zeroed in-memory arrays.
+
+        Args:
+          n: the number of values (rows).
+          allocator: optional, called with a field and the shape of its column, returns the column (ex. a memory-mapped array).
+        """
+        if allocator is None:
+            return {field.name: np.zeros((n,) + field.shape, dtype=field.dtype) for field in self.fields}
+        return {field.name: allocator(field, (n,) + field.shape) for field in self.fields}
+
+    def write(self, columns: Dict[str, np.ndarray], index, value) -> None:
+        """Writes the value into row 'index' of the columns (or rows, when value is batched)."""
+        for field in self.fields:
+            leaf = value
+            for key in field.path:
+                leaf = leaf[key]
+            columns[field.name][index] = leaf
+
+    def read(self, columns: Dict[str, np.ndarray], index) -> Any:
+        """Reads back the value (a nested dict / tuple) at row 'index' of the columns (or rows, for a slice)."""
+        leaves = iter(columns[field.name][index] for field in self.fields)
+        return self._build(self.space, leaves)
+
+    def _build(self, space: gym.Space, leaves):
+        if isinstance(space, gym.spaces.Dict):
+            return {key: self._build(subspace, leaves) for key, subspace in space.spaces.items()}
+        if isinstance(space, gym.spaces.Tuple):
+            return tuple(self._build(subspace, leaves) for subspace in space.spaces)
+        return next(leaves)
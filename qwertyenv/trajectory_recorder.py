@@ -0,0 +1,171 @@
+"""Records the transitions of a Gymnasium environment into columnar, memory-mappable, chunks.
+
+The observations and the actions are laid out by their spaces (see SpaceLayout), one column per field,
+integers in the smallest dtype for their range (ex. uint8 for the locations of CollectCoins), boolean fields of the observations
+(ex. the board) saved packed 8 per byte. The transitions are written into a chunk of preallocated columns, saved as .npy files when the chunk
+is full (and on close), and read back as memory-mapped batches.
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+import gymnasium as gym
+import numpy as np
+
+from .space_layout import SpaceLayout
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    """Records each step as a row: the observation the action was taken in, the action, the reward,
+    and the terminated / truncated flags. The next observation is the next row's, but for the last step of an episode
+    (terminated or truncated), as the next row is then the next episode's: its observation is in the 'final_obs' fields
+    of the row (zeros in the other rows), ex. to bootstrap truncated episodes.
+
+    Chunk k is saved under 'directory/chunk_{k}/{field}.npy' (see read_trajectories),
+    the layout of the fields in 'directory/layout.json'. Call close (or flush) to save the last, partial, chunk.
+
+    Args:
+      env: the environment to record (a single, not vector, environment).
+      directory: where to save the chunks.
+      chunk_size: the number of transitions (rows) per chunk.
+      pack_bits: pack boolean fields of the observation 8 per byte (the actions' fields are kept as they are).
+    """
+
+    def __init__(self, env: gym.Env, directory: str, chunk_size: int = 65_536, pack_bits: bool = True):
+        super().__init__(env)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+        obs_layout = SpaceLayout(env.observation_space, prefix="obs")
+        action_layout = SpaceLayout(env.action_space, prefix="action")
+        final_obs_layout = SpaceLayout(env.observation_space, prefix="final_obs")
+
+        # per field: its preallocated column, a Python list for scalars (cheaper to set one by one than numpy's elements),
+        # an array otherwise. Boolean fields are packed (and scalars converted) once per chunk, when saved.
+        self.columns: Dict[str, Any] = {}
+        self._dtypes: Dict[str, np.dtype] = {}
+        self._packed: Dict[str, bool] = {}
+        self._obs_writers, self._action_writers, self._final_obs_writers = [], [], []
+        layout = {}
+        for layout_fields, writers, pack in (
+            (obs_layout.fields, self._obs_writers, pack_bits),
+            (action_layout.fields, self._action_writers, False),
+            (final_obs_layout.fields, self._final_obs_writers, pack_bits),
+        ):
+            for field in layout_fields:
+                self._add_column(field.name, field.shape, field.dtype, pack and field.dtype == bool, layout)
+                writers.append((self.columns[field.name], field.path))
+        for name, dtype in (("reward", np.float32), ("terminated", bool), ("truncated", bool)):
+            self._add_column(name, (), np.dtype(dtype), False, layout)
+        self._rewards, self._terminateds, self._truncateds = (
+            self.columns["reward"], self.columns["terminated"], self.columns["truncated"]
+        )
+        self._final_obs_names = [field.name for field in final_obs_layout.fields]
+        with open(os.path.join(directory, "layout.json"), "w") as f:
+            json.dump(layout, f, indent=2)
+
+        self.chunks: List[str] = [] # the directories of the saved chunks
+        self.num_transitions = 0
+        self._row = 0
+
+    def _add_column(self, name: str, shape, dtype: np.dtype, packed: bool, layout: Dict[str, Any]) -> None:
+        if shape == ():
+            self.columns[name] = [dtype.type(0)] * self.chunk_size
+        else:
+            self.columns[name] = np.zeros((self.chunk_size,) + tuple(shape), dtype=dtype)
+        self._dtypes[name] = dtype
+        self._packed[name] = packed
+        layout[name] = dict(shape=list(shape), dtype=dtype.str, packed=packed)
+
+    def _write(self, writers, value) -> None:
+        row = self._row
+        for column, path in writers:
+            leaf = value
+            for key in path:
+                leaf = leaf[key]
+            column[row] = leaf
+
+    def reset(self, **kwargs):
+        observation, info = self.env.reset(**kwargs)
+        self._write(self._obs_writers, observation) # into the row of the next step (overwrites a pending one)
+        return observation, info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        row = self._row
+        self._write(self._action_writers, action)
+        self._rewards[row] = reward
+        self._terminateds[row] = terminated
+        self._truncateds[row] = truncated
+        if terminated or truncated:
+            self._write(self._final_obs_writers, observation)
+        self._row = row + 1
+        self.num_transitions += 1
+        if self._row == self.chunk_size:
+            self.flush()
+        # the observations are written when received, environments may reuse (overwrite) their observations' arrays
+        self._write(self._obs_writers, observation)
+        return observation, reward, terminated, truncated, info
+
+    def flush(self) -> None:
+        """Saves the rows recorded so far (if any) as a new chunk."""
+        n = self._row
+        if n < 1:
+            return
+        chunk_directory = os.path.join(self.directory, f"chunk_{len(self.chunks):05d}")
+        os.makedirs(chunk_directory, exist_ok=True)
+        for name, column in self.columns.items():
+            if isinstance(column, list):
+                data = np.array(column[:n], dtype=self._dtypes[name])
+            elif self._packed[name]:
+                data = np.packbits(column[:n].reshape(n, -1), axis=1)
+            else:
+                data = column[:n]
+            np.save(os.path.join(chunk_directory, f"{name}.npy"), data)
+        for name in self._final_obs_names: # written only at the ends of episodes, zeros in the other rows
+            column = self.columns[name]
+            if isinstance(column, list):
+                column[:n] = [self._dtypes[name].type(0)] * n
+            else:
+                column[:n] = 0
+        self.chunks.append(chunk_directory)
+        self._row = 0
+
+    def close(self):
+        self.flush()
+        return super().close()
+
+
+def unpack_bits(column: np.ndarray, shape) -> np.ndarray:
+    """A packed boolean column (rows of bytes) -> rows of the given shape (a new array)."""
+    count = int(np.prod(shape))
+    return np.unpackbits(column, axis=-1, count=count).view(bool).reshape((len(column),) + tuple(shape))
+
+
+def read_trajectories(
+    directory: str, batch_size: Optional[int] = None, unpack: bool = False
+) -> Iterator[Dict[str, np.ndarray]]:
+    """Yields the transitions saved by TrajectoryRecorder as batches, dicts field -> array.
+
+    The arrays are views of the memory-mapped chunks (no copy), except for packed fields when 'unpack' is True.
+    A batch does not span chunks (the last batch of a chunk may be smaller), without a batch_size a batch is a chunk.
+    """
+    with open(os.path.join(directory, "layout.json")) as f:
+        layout: Dict[str, Any] = json.load(f)
+    for chunk_directory in sorted(os.listdir(directory)):
+        chunk_path = os.path.join(directory, chunk_directory)
+        if not (chunk_directory.startswith("chunk_") and os.path.isdir(chunk_path)):
+            continue
+        columns = {
+            name: np.load(os.path.join(chunk_path, f"{name}.npy"), mmap_mode="r") for name in layout
+        }
+        num_rows = len(columns["reward"])
+        step = batch_size or num_rows
+        for start in range(0, num_rows, step):
+            batch = {name: column[start : start + step] for name, column in columns.items()}
+            if unpack:
+                for name, field in layout.items():
+                    if field["packed"]:
+                        batch[name] = unpack_bits(batch[name], field["shape"])
+            yield batch
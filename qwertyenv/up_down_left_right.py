@@ -7,6 +7,9 @@ class UpDownLeftRight(gym.ActionWrapper):
   """
   A gym environment wrapper to enable U/D/L/R action space when the wrapped environment
   actually expects a destination in cartesian coordinates.
+
+  Note: the offsets are (x, y), for a (row, col) destination (as CollectCoins expects), other sets of moves
+  (ex. a knight's), off board moves and vector environments, see RelativeMove.
   """
 
   def __init__(self, env: gym.Env,
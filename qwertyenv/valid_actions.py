@@ -0,0 +1,165 @@
+from typing import Tuple
+
+import gymnasium as gym
+import numpy as np
+
+
+class NearestValidAction:
+  """
+  Replaces invalid actions with the nearest valid ones, given the action masks, for a batch of actions at once.
+
+  The actions of a Discrete, MultiDiscrete or Tuple (of Discrete) action space are numbered
+  (ex. (row, col) -> row * 8 + col for MultiDiscrete([8, 8]), as the masks of CollectCoins are).
+  The nearest valid action is the valid action of the smallest (Euclidean) distance, ties by number.
+  For up to 'max_table' actions, a table keeps per action the rank of each action by distance (ties by number),
+  a single action is then corrected by the valid action of the smallest rank, with no array made for a mask given
+  as an int (see single). For bigger action spaces (ex. a 128 x 128 board) the distances are computed per query.
+  A batch is searched among the valid actions of its masks, in chunks of up to 'max_chunk' distances.
+  """
+
+  max_chunk = 1 << 20
+  max_table = 1024
+
+  def __init__(self, action_space: gym.Space):
+    if isinstance(action_space, gym.spaces.Discrete):
+      nvec, starts = (int(action_space.n),), (int(action_space.start),)
+    elif isinstance(action_space, gym.spaces.MultiDiscrete):
+      assert action_space.nvec.ndim == 1
+      nvec, starts = tuple(int(n) for n in action_space.nvec), (0,) * len(action_space.nvec)
+    elif isinstance(action_space, gym.spaces.Tuple):
+      assert all(isinstance(space, gym.spaces.Discrete) for space in action_space.spaces)
+      nvec = tuple(int(space.n) for space in action_space.spaces)
+      starts = tuple(int(space.start) for space in action_space.spaces)
+    else:
+      raise NotImplementedError(f"action space {action_space} is not supported")
+    self.action_space = action_space
+    self.nvec = nvec
+    self._starts = np.array(starts)
+    self._starts_list = list(starts)
+    self._is_tuple = isinstance(action_space, gym.spaces.Tuple)
+    self._is_discrete = isinstance(action_space, gym.spaces.Discrete)
+    self.n = int(np.prod(nvec))
+
+    # per action number, its coordinates (from 0 in each dimension)
+    self.coordinates = np.stack(np.unravel_index(np.arange(self.n), nvec), axis=1)
+    self.coordinates.flags.writeable = False
+    self._coordinates = [tuple(row) for row in self.coordinates.tolist()] # for a single action's scalar search
+    # per action number, the rank by distance of each action number (ties by number), an (n, n) table as lists
+    self._ranks = None
+    if self.n <= self.max_table:
+      distances = ((self.coordinates[:, None, :] - self.coordinates[None, :, :]) ** 2).sum(axis=2)
+      ranks = np.empty((self.n, self.n), dtype=np.int64)
+      np.put_along_axis(ranks, np.argsort(distances, axis=1, kind='stable'), np.arange(self.n)[None, :], axis=1)
+      self._ranks = ranks.tolist()
+    # per action number, the action (as a tuple, for single), and back
+    self._actions = [tuple(c + start for c, start in zip(row, starts)) for row in self._coordinates]
+    self._numbers = {action: number for number, action in enumerate(self._actions)}
+
+  def nearest(self, indices: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    """
+    (R,) action numbers and (R, n) bool masks (each with a valid action) -> (R,) the nearest valid action numbers
+    """
+    result = np.empty(len(indices), dtype=np.int64)
+    rows_per_chunk = max(1, self.max_chunk // self.n)
+    for start in range(0, len(indices), rows_per_chunk):
+      chunk = slice(start, start + rows_per_chunk)
+      rows, candidates = np.nonzero(masks[chunk]) # the valid actions only
+      distances = ((self.coordinates[candidates] - self.coordinates[indices[chunk]][rows]) ** 2).sum(axis=1)
+      order = np.lexsort((candidates, distances, rows)) # per row, the nearest first (ties, the smallest number)
+      rows = rows[order]
+      first = np.ones(len(rows), dtype=bool)
+      first[1:] = rows[1:] != rows[:-1]
+      result[chunk] = candidates[order[first]]
+    return result
+
+  def to_index(self, actions) -> np.ndarray:
+    """
+    A batch of actions (as a vector environment expects them) -> (B,) array of action numbers
+    (out of range actions are clipped into range)
+    """
+    return self._to_index(actions)[0]
+
+  def _to_index(self, actions) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(self.action_space, gym.spaces.Tuple):
+      columns = [np.asarray(column, dtype=np.int64).reshape(-1) for column in actions]
+    else:
+      columns = np.asarray(actions, dtype=np.int64).reshape(-1, len(self.nvec)).T
+    columns = [column - start for column, start in zip(columns, self._starts_list)]
+    in_range = np.logical_and.reduce([(column >= 0) & (column < n) for column, n in zip(columns, self.nvec)])
+    return np.ravel_multi_index(tuple(columns), self.nvec, mode='clip'), in_range
+
+  def from_index(self, indices: np.ndarray):
+    """
+    (B,) array of action numbers -> a batch of actions (as a vector environment expects them)
+    """
+    if isinstance(self.action_space, gym.spaces.Discrete):
+      return indices + self._starts[0]
+    columns = [column + start for column, start in zip(np.unravel_index(indices, self.nvec), self._starts)]
+    if isinstance(self.action_space, gym.spaces.MultiDiscrete):
+      return np.stack(columns, axis=1)
+    return tuple(columns)
+
+  def __call__(self, actions, masks) -> Tuple[object, np.ndarray]:
+    """
+    actions: a batch of actions, masks: (B, n) bool array (or anything that reshapes to it).
+    Returns the actions, where invalid replaced by the nearest valid ones, and (B,) bool array, which were replaced.
+    When no action is valid (an all False mask) the action is kept.
+    """
+    indices, in_range = self._to_index(actions)
+    masks = np.asarray(masks, dtype=bool).reshape(len(indices), self.n)
+    rows = np.arange(len(indices))
+    replace = ~(in_range & masks[rows, indices]) & masks.any(axis=1)
+    if not replace.any():
+      return actions, replace
+    indices = indices.copy()
+    indices[replace] = self.nearest(indices[replace], masks[replace])
+    return self.from_index(indices), replace
+
+  def single(self, action, mask) -> Tuple[object, bool]:
+    """
+    As __call__, for a single action (and its mask). Scalar operations, a single environment's step should stay cheap.
+    The mask can also be given as an int, bit i for action number i (ex. CollectCoinsGame.legal_move_bits),
+    then no array is made. A replaced MultiDiscrete action is given as a tuple (as the space contains it).
+    """
+    if isinstance(action, np.ndarray) and action.ndim == 1:
+      parts = action.tolist()
+    elif isinstance(action, tuple):
+      parts = action
+    elif isinstance(action, int):
+      parts = (action,)
+    else:
+      parts = np.ravel(action).tolist()
+    index = self._numbers.get(tuple(parts))
+    if index is None: # out of range (or not ints), clipped into range
+      index = 0
+      for part, start, n in zip(parts, self._starts_list, self.nvec):
+        index = index * n + min(max(int(part) - start, 0), n - 1)
+    elif (mask >> index & 1) if isinstance(mask, int) else mask[index]:
+      return action, False
+    candidate = None
+    bits = isinstance(mask, int)
+    if bits and self._ranks is not None:
+      # the set bits of the mask, the one of the smallest rank
+      ranks, best_rank = self._ranks[index], self.n
+      while mask:
+        number = (mask & -mask).bit_length() - 1
+        mask &= mask - 1
+        if ranks[number] < best_rank:
+          candidate, best_rank = number, ranks[number]
+    else:
+      if bits:
+        valid = [number for number in range(mask.bit_length()) if mask >> number & 1]
+      else:
+        valid = np.flatnonzero(np.asarray(mask, dtype=bool).reshape(-1)).tolist()
+      if self._ranks is not None:
+        candidate = min(valid, key=self._ranks[index].__getitem__, default=None)
+      else:
+        target = self._coordinates[index]
+        coordinates = self._coordinates
+        candidate = min( # the first of the nearest, the smallest number
+          valid, key=lambda candidate: sum((c - t) ** 2 for c, t in zip(coordinates[candidate], target)), default=None
+        )
+    if candidate is None:
+      return action, False # no valid action
+    taken = self._actions[candidate] # a tuple, also for MultiDiscrete (as the space contains it)
+    return (taken[0] if self._is_discrete else taken), True
@@ -0,0 +1,63 @@
+import json
+import time
+
+from qwertyenv import bench
+
+
+def test_compare():
+  baseline = {
+    'a.step': dict(value=1000.0, unit='steps/s'),
+    'a.memory': dict(value=1000.0, unit='bytes'),
+    'b.step': dict(value=1000.0, unit='steps/s'),
+  }
+  results = {
+    'a.step': dict(value=850.0, unit='steps/s'), # within 20%
+    'a.memory': dict(value=1300.0, unit='bytes'), # more memory, a regression
+    'b.step': dict(value=700.0, unit='steps/s'), # slower, a regression
+    'c.step': dict(value=1.0, unit='steps/s'), # not in the baseline
+  }
+  regressions = bench.compare(results, baseline, threshold=0.2)
+  assert len(regressions) == 2
+  assert regressions[0].startswith('a.memory') and regressions[1].startswith('b.step')
+
+
+def test_main(tmp_path):
+  output = tmp_path / 'run.json'
+  assert bench.main(['black_jack', '--duration', '0.01', '--output', str(output)]) == 0
+  report = json.loads(output.read_text())
+  assert report['results']['black_jack.step']['unit'] == 'steps/s'
+  assert report['results']['black_jack.step']['value'] > 0
+
+  # a baseline 10 times faster than this run
+  for result in report['results'].values():
+    result['value'] *= 10 if bench.higher_is_better(result['unit']) else 0.1
+  baseline = tmp_path / 'baseline.json'
+  baseline.write_text(json.dumps(report))
+  assert bench.main(['black_jack', '--duration', '0.01', '--baseline', str(baseline)]) == 1
+
+
+def test_mask_not_slower_than_callbacks():
+  # EnsureValidAction on CollectCoins, the same (mostly invalid) actions, the mask given as a bitboard
+  # (the environment's step, the same in both modes, is left out)
+  from qwertyenv import EnsureValidAction
+  from qwertyenv.collect_coins import CollectCoinsEnv
+
+  env = CollectCoinsEnv()
+  env.reset(seed=0)
+  env.action_space.seed(0)
+  actions = [env.action_space.sample() for _ in range(1000)]
+  callbacks = EnsureValidAction(env, env.check_action_valid, env.provide_alternative_valid_action, lambda a: None)
+  mask = EnsureValidAction(env, action_mask=lambda: env.game.legal_move_bits(env.player))
+
+  def seconds(wrapped):
+    start = time.perf_counter()
+    for action in actions:
+      wrapped.action(action)
+    return time.perf_counter() - start
+
+  # interleaved, the best of each, as the machine's load varies
+  best_mask, best_callbacks = float('inf'), float('inf')
+  for _ in range(20):
+    best_mask = min(best_mask, seconds(mask))
+    best_callbacks = min(best_callbacks, seconds(callbacks))
+  assert best_mask <= best_callbacks * 1.1 # within the timing noise
@@ -0,0 +1,76 @@
+import numpy as np
+
+from qwertyenv.black_jack import BJEnv, DEALER_FINAL_SUMS, dealer_outcome_table, dealer_expected_reward_table
+
+
+def test_dealer_outcome_table():
+  table = dealer_outcome_table()
+  assert table.shape == (10, 10, len(DEALER_FINAL_SUMS))
+  assert np.allclose(table.sum(axis=-1), 1)
+  assert np.allclose(table, table.transpose(1, 0, 2)) # the order of the cards does not matter
+  assert table[9, 6, 17 - 17] == 1 # 10 and 7, the dealer stops
+  assert table[0, 5, 17 - 17] == 1 # Ace and 6 is a (soft) 17
+  assert np.allclose(table[9, 5], 1 / 10) # 10 and 6, one more card, any final sum is as likely
+
+
+def test_expected_reward():
+  env = BJEnv(expected_reward=True)
+  env.reset()
+  env.state.player_sum = 20
+  env.state.dealer_cards = [10, 10]
+  _, reward, done, _, info = env.step(1)
+  assert done
+  assert reward == 0 # a draw for sure
+  assert 'dealer sum' not in info
+
+  expected = dealer_expected_reward_table()
+  assert expected.shape == (10, 10, 11)
+  assert np.all(expected[:, :, 21 - 11] >= expected[:, :, 20 - 11])
+
+
+def play(env, seed, episodes=50):
+  trajectory = []
+  obs, _ = env.reset(seed=seed)
+  for _ in range(episodes):
+    done = False
+    while not done:
+      obs, reward, done, _, info = env.step(1 if obs['player_sum'] + 11 >= 17 else 0)
+      trajectory.append((tuple(obs.values()), reward))
+    obs, _ = env.reset()
+  return trajectory
+
+
+def test_seeding():
+  import random
+
+  assert play(BJEnv(), seed=0) == play(BJEnv(), seed=0) # seed 0 is a seed too
+  assert play(BJEnv(), seed=0) != play(BJEnv(), seed=1)
+
+  # each environment has its own generator, not affected by the global one (nor by other environments)
+  expected = play(BJEnv(), seed=3, episodes=1)
+  env, other = BJEnv(), BJEnv()
+  obs, _ = env.reset(seed=3)
+  other.reset(seed=3)
+  trajectory, done = [], False
+  while not done:
+    random.seed(0)
+    random.random()
+    other.step(0)
+    other.reset()
+    obs, reward, done, _, info = env.step(1 if obs['player_sum'] + 11 >= 17 else 0)
+    trajectory.append((tuple(obs.values()), reward))
+  assert trajectory == expected
+
+
+def test_state_default_randoms():
+  # as before BJEnv.State was given the environment's random numbers, by default Python's global random module
+  import random
+
+  states = []
+  for _ in range(2):
+    random.seed(7)
+    state = BJEnv.State()
+    state.hits()
+    states.append((state.player_sum, state.player_useful_Ace, state.dealer_cards, state.stick()))
+  assert states[0] == states[1]
+  assert all(1 <= card <= 10 for card in states[0][2])
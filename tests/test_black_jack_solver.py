@@ -0,0 +1,50 @@
+import numpy as np
+
+from qwertyenv.black_jack import BJEnv
+from qwertyenv.black_jack_solver import evaluate_policy, policy_table, solve, start_value, stick_values
+
+
+def test_solve():
+  policy, v, q = solve()
+  assert policy.shape == (11, 2, 10)
+  assert v.shape == (11, 2, 10)
+  assert q.shape == (11, 2, 10, 2)
+  assert np.allclose(v, q.max(axis=-1))
+  assert np.all(policy[21 - 11] == 1) # always stick with 21
+  assert np.all(policy[11 - 11] == 0) # never bust with 11, always hit
+  assert np.allclose(q[..., 1], stick_values()[:, None, :])
+  assert np.all(v[:, 1] >= v[:, 0] - 1e-12) # a useful Ace never hurts
+
+
+def test_evaluate_policy():
+  policy, v, _ = solve()
+  v_optimal, _ = evaluate_policy(policy)
+  assert np.allclose(v_optimal, v)
+
+  always_sticks = np.ones((11, 2, 10), dtype=np.int64)
+  v_sticks, _ = evaluate_policy(always_sticks)
+  assert np.allclose(v_sticks, stick_values()[:, None, :])
+  assert np.all(v_sticks <= v + 1e-12)
+
+  random_policy = np.full((11, 2, 10, 2), 0.5)
+  v_random, _ = evaluate_policy(random_policy)
+  assert start_value(v_random) < start_value(v)
+
+  sticks_on_17 = policy_table(lambda observation: 1 if observation['player_sum'] + 11 >= 17 else 0)
+  assert sticks_on_17.shape == (11, 2, 10)
+  assert start_value(evaluate_policy(sticks_on_17)[0]) <= start_value(v)
+
+
+def test_against_monte_carlo():
+  policy, v, _ = solve()
+  env = BJEnv(expected_reward=True)
+  env.reset(seed=7)
+  episodes, total = 20_000, 0.0
+  for _ in range(episodes):
+    observation, _ = env.reset()
+    done = False
+    while not done:
+      action = policy[observation['player_sum'], observation['player_useful_Ace'], observation['dealer_shown_card']]
+      observation, reward, done, _, _ = env.step(action)
+      total += reward
+  assert abs(total / episodes - start_value(v)) < 0.03
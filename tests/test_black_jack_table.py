@@ -0,0 +1,63 @@
+import numpy as np
+from gymnasium.utils.env_checker import check_env
+from pettingzoo.test import parallel_api_test
+
+from qwertyenv import parallel_to_gymnasium
+from qwertyenv.black_jack import dealer_expected_reward_table
+from qwertyenv.black_jack_table import BJTableEnv
+
+
+def sticks_on_17(observation):
+  return 1 if observation['player_sum'] + 11 >= 17 else 0
+
+
+def test_api():
+  parallel_api_test(BJTableEnv(num_seats=4), num_cycles=100)
+
+
+def test_shared_dealer():
+  env = BJTableEnv(num_seats=5)
+  for round in range(200):
+    observations = env.reset(seed=round)
+    assert len({obs['dealer_shown_card'] for obs in observations.values()}) == 1
+    dealer_sums = set()
+    while env.agents:
+      actions = {agent: sticks_on_17(observations[agent]) for agent in env.agents}
+      observations, rewards, terminations, truncations, infos = env.step(actions)
+      for agent, action in actions.items():
+        player_sum = observations[agent]['player_sum'] + 11
+        if action == 1:
+          assert terminations[agent]
+          dealer_sum = infos[agent]['dealer sum']
+          dealer_sums.add(dealer_sum)
+          assert rewards[agent] == (1 if dealer_sum > 21 else np.sign(player_sum - dealer_sum))
+        elif player_sum > 21:
+          assert terminations[agent] and rewards[agent] == -1
+        else:
+          assert not terminations[agent] and rewards[agent] == 0
+    assert len(dealer_sums) <= 1
+
+
+def test_expected_reward():
+  env = BJTableEnv(num_seats=3, expected_reward=True)
+  observations = env.reset(seed=1)
+  _, rewards, terminations, _, _ = env.step({agent: 1 for agent in env.agents})
+  first, second = env.dealer_cards
+  for agent, observation in observations.items():
+    assert terminations[agent]
+    assert rewards[agent] == dealer_expected_reward_table()[first - 1, second - 1, observation['player_sum']]
+  assert env.agents == []
+
+
+def test_parallel_to_gymnasium():
+  gym_env = parallel_to_gymnasium(
+    BJTableEnv(num_seats=3),
+    external_agent='seat_1',
+    act_others=lambda agent, observation: sticks_on_17(observation),
+  )
+  check_env(gym_env)
+  observation, info = gym_env.reset(seed=42)
+  for _ in range(50):
+    observation, reward, terminated, truncated, info = gym_env.step(sticks_on_17(observation))
+    if terminated or truncated:
+      observation, info = gym_env.reset()
@@ -0,0 +1,53 @@
+import numpy as np
+
+from qwertyenv.black_jack import BJEnv
+from qwertyenv.black_jack_vector import BJVectorEnv
+
+
+def test_matches_bj_env():
+  player_sums = [20, 17, 21, 12, 19]
+  useful_Aces = [False, True, False, False, True]
+  dealer_cards = [[10, 7], [9, 10], [1, 8], [10, 10], [6, 1]] # the dealer does not draw for those
+  actions = [1, 1, 0, 1, 1]
+
+  env = BJVectorEnv(num_envs=len(actions))
+  env.reset(seed=0)
+  env.player_sum[:] = player_sums
+  env.player_useful_Ace[:] = useful_Aces
+  env.dealer_cards[:] = dealer_cards
+  obs, rewards, terminated, truncated, info = env.step(np.array(actions))
+
+  single_env = BJEnv()
+  for i, action in enumerate(actions):
+    single_env.reset()
+    single_env.state.player_sum = player_sums[i]
+    single_env.state.player_useful_Ace = useful_Aces[i]
+    single_env.state.dealer_cards = list(dealer_cards[i])
+    single_obs, reward, done, _, single_info = single_env.step(action)
+    assert rewards[i] == reward
+    assert terminated[i] == done
+    if action == 1: # no new card drawn
+      assert info['final_observation'][i] == single_obs
+    else: # an int per hand, 1 where BJEnv reports 'A'
+      assert info['_new card'][i] and info['new card'][i] in range(1, 11)
+      assert single_info['new card'] in ['A'] + list(range(2, 11))
+  assert np.issubdtype(info['new card'].dtype, np.integer)
+  assert info['_final_observation'].all()
+  assert not truncated.any()
+  assert env.observation_space.contains(obs)
+
+
+def test_rollout():
+  env = BJVectorEnv(num_envs=256)
+  obs, _ = env.reset(seed=42)
+  for _ in range(20):
+    obs, rewards, terminated, truncated, info = env.step(env.action_space.sample())
+    assert env.observation_space.contains(obs)
+    assert set(np.unique(rewards)) <= {-1, 0, 1}
+    assert (info['dealer sum'][info['_dealer sum']] >= 17).all()
+    if 'final_observation' in info:
+      assert info['final_observation'].dtype == object
+      for i, done in enumerate(terminated):
+        assert (info['final_observation'][i] is not None) == done
+        if done: # (a busted hand's sum is past the observation space's, as in BJEnv)
+          assert info['final_observation'][i].keys() == env.single_observation_space.spaces.keys()
@@ -1,7 +1,9 @@
+import numpy as np
 import pytest
 
 import gymnasium as gym
 from qwertyenv import EnsureValidAction
+from qwertyenv.collect_coins import CollectCoinsEnv
 from stable_baselines3 import PPO
 from stable_baselines3.ppo.policies import MultiInputPolicy
 from stable_baselines3.common.evaluation import evaluate_policy
@@ -44,3 +46,45 @@ def test_evaluate():
     # print()
 
   mean_reward, std_reward = evaluate_policy(agent_w, env, deterministic=True)
+
+
+@pytest.mark.parametrize("copy_observations", [True, False])
+def test_observation_buffers(copy_observations):
+  env = gym.make('qwertyenv/CollectCoins-v0', pieces=['knight', 'rock'], copy_observations=copy_observations)
+  obs, _ = env.reset()
+  first_board = obs['board'].copy()
+  for _ in range(10):
+    action = env.unwrapped.provide_alternative_valid_action(None)
+    new_obs, *_ = env.step(action)
+    assert (new_obs['board'] == env.unwrapped.game.board.flatten()).all()
+    assert tuple(new_obs['player']) == env.unwrapped.game.locations[0]
+  assert (new_obs is obs) == (not copy_observations)
+  if copy_observations:
+    assert (obs['board'] == first_board).all()
+  else:
+    assert not new_obs['board'].flags.writeable
+
+
+@pytest.mark.parametrize("copy_observations", [True, False])
+def test_observation_modes(copy_observations):
+  def first_legal_move(game, player):
+    return game.legal_moves(player)[0]
+
+  envs = {
+    mode: CollectCoinsEnv(pieces=['rock', 'knight'], opponent=first_legal_move,
+                          copy_observations=copy_observations, observation_mode=mode)
+    for mode in ['dict', 'packed', 'flat']
+  }
+  observations = {mode: env.reset()[0] for mode, env in envs.items()}
+  for _ in range(10):
+    for mode, env in envs.items():
+      assert env.observation_space.contains(observations[mode])
+    board = np.asarray(observations['dict']['board'])
+    packed = np.packbits(board.reshape(8, 8), axis=1, bitorder='little').reshape(-1)
+    np.testing.assert_array_equal(observations['packed']['board'], packed)
+    np.testing.assert_array_equal(observations['flat'][:8], packed)
+    np.testing.assert_array_equal(observations['flat'][8:10], observations['dict']['player'])
+    np.testing.assert_array_equal(observations['flat'][10:], observations['dict']['other_player'])
+    np.testing.assert_array_equal(observations['packed']['player'], observations['dict']['player'])
+    action = first_legal_move(envs['dict'].game, 0)
+    observations = {mode: env.step(action)[0] for mode, env in envs.items()}
@@ -0,0 +1,170 @@
+from itertools import product
+import random
+
+import numpy as np
+import pytest
+
+from qwertyenv.collect_coins import CollectCoinsEnv
+from qwertyenv.collect_coins_game import CollectCoinsGame
+from qwertyenv.collect_coins_pz import CollectCoinsEnv as CollectCoinsPZEnv
+
+
+def naive_valid_move(game, player, move):
+  if any(c < 0 or c > 7 for c in move):
+    return False
+  if any(tuple(location) == move for location in game.locations):
+    return False
+  d_row, d_col = (abs(m - c) for m, c in zip(move, game.locations[player]))
+  if game.pieces[player].__class__.__name__ == 'Rock':
+    return (d_row, d_col) in [(0, 1), (1, 0)]
+  return (d_row, d_col) in [(1, 2), (2, 1)]
+
+
+@pytest.mark.parametrize("pieces", [['rock', 'rock'], ['knight', 'rock'], ['knight', 'knight']])
+def test_against_naive_rules(pieces):
+  random.seed(0)
+  game = CollectCoinsGame(pieces)
+  board = np.full((8, 8), True)
+  board[0, 0] = board[7, 7] = False
+  coins = [0, 0]
+  for _ in range(200):
+    player = game.turn
+    all_moves = list(product(range(-1, 9), repeat=2))
+    valid_moves = [move for move in all_moves if naive_valid_move(game, player, move)]
+    assert valid_moves == [move for move in all_moves if game.valid_move(player, move)]
+    assert sorted(game.legal_moves(player)) == valid_moves
+    assert [divmod(i, 8) for i in np.flatnonzero(game.action_mask(player))] == valid_moves
+    move = random.choice(valid_moves)
+    coins[player] += int(board[move])
+    board[move] = False
+    game.make_move(player, np.array(move), undoable=True)
+    assert game.locations[player] == move
+    assert game.coins == coins
+    assert (game.board == board).all()
+    assert game.is_done() == (not board.any())
+
+
+def test_snapshot_and_undo():
+  random.seed(1)
+  game = CollectCoinsGame(['knight', 'knight'])
+  snapshots = []
+  for _ in range(100):
+    snapshots.append(game.snapshot())
+    game.make_move(game.turn, random.choice(game.legal_moves(game.turn)), undoable=True)
+  final = game.snapshot()
+  board = game.board.copy()
+  for snapshot in reversed(snapshots):
+    game.unmake_move()
+    assert game.snapshot() == snapshot
+  assert game.snapshot() == CollectCoinsGame(['knight', 'knight']).snapshot()
+  game.restore(final)
+  assert game.snapshot() == final
+  assert (game.board == board).all()
+  assert sorted(game.legal_moves(game.turn)) == [
+    move for move in product(range(8), repeat=2) if game.valid_move(game.turn, move)
+  ]
+
+
+@pytest.mark.parametrize('board_size', [5, 32, 128])
+@pytest.mark.parametrize('pieces', [['rock', 'rock'], ['knight', 'rock']])
+def test_board_size(board_size, pieces):
+  random.seed(board_size)
+  game = CollectCoinsGame(pieces, board_size=board_size, coin_density=0.1, np_random=np.random.default_rng(board_size))
+  assert game.locations == [(0, 0), (board_size - 1, board_size - 1)]
+  board = game.board.copy()
+  assert board.shape == (board_size, board_size)
+  assert game.num_coins == board.sum()
+  assert not board[0, 0] and not board[-1, -1]
+  start = game.snapshot()
+  for _ in range(200):
+    player = game.turn
+    valid_moves = [move for move in product(range(board_size), repeat=2) if game.valid_move(player, move)]
+    assert sorted(game.legal_moves(player)) == valid_moves
+    assert [divmod(int(i), board_size) for i in np.flatnonzero(game.action_mask(player))] == valid_moves
+    move = random.choice(valid_moves) if valid_moves else None
+    if move is not None:
+      board[move] = False
+    game.make_move(player, move, undoable=True)
+    assert game.num_coins == board.sum()
+    assert (game.board == board).all()
+  assert game.num_coins + sum(game.coins) == bin(start[0]).count('1')
+  for _ in range(200):
+    game.unmake_move()
+  assert game.snapshot() == start
+  assert game.num_coins == bin(start[0]).count('1')
+
+
+def test_sparse_coins():
+  dense = CollectCoinsGame(board_size=32)
+  assert dense.num_coins == 32 * 32 - 2
+  sparse = CollectCoinsGame(board_size=32, coin_density=0.25, np_random=np.random.default_rng(0))
+  assert 0.2 < sparse.num_coins / (32 * 32) < 0.3
+  assert CollectCoinsGame(board_size=32, coin_density=0.0).is_done()
+
+
+@pytest.mark.parametrize('observation_mode', ['dict', 'packed', 'flat'])
+def test_envs_board_size(observation_mode):
+  for copy_observations in (True, False):
+    env = CollectCoinsEnv(
+      observation_mode=observation_mode, copy_observations=copy_observations, board_size=32, coin_density=0.3
+    )
+    obs, _ = env.reset(seed=3)
+    assert env.observation_space.contains(obs)
+    assert env.action_space.nvec.tolist() == [32, 32]
+    first_game = env.game.snapshot()
+    env.reset(seed=3)
+    assert env.game.snapshot() == first_game
+    for _ in range(20):
+      obs, _, done, _, _ = env.step(env.provide_alternative_valid_action(None))
+      assert env.observation_space.contains(obs)
+      if done:
+        break
+
+    pz_env = CollectCoinsPZEnv(
+      observation_mode=observation_mode, copy_observations=copy_observations, with_mask=True, board_size=32,
+      coin_density=0.3
+    )
+    pz_env.reset(seed=3)
+    space = pz_env.observation_space('player_0')
+    for _ in range(20):
+      agent = pz_env.agent_selection
+      assert space.contains(pz_env.observe(agent))
+      action = pz_env.provide_alternative_valid_action(None)
+      assert pz_env.check_action_valid(action) and pz_env.check_action_valid(action[0] * 32 + action[1])
+      pz_env.step(action)
+
+
+@pytest.mark.parametrize('num_players', [3, 4, 16])
+def test_num_players(num_players):
+  random.seed(num_players)
+  pieces = ['rock', 'knight'] * (num_players // 2) + ['rock'] * (num_players % 2)
+  game = CollectCoinsGame(pieces)
+  assert len(set(game.locations)) == num_players
+  assert all(0 in location or 7 in location for location in game.locations) # on the edge
+  if num_players == 4:
+    assert game.locations == [(0, 0), (0, 7), (7, 7), (7, 0)]
+  assert game.others(1) == [(1 + i) % num_players for i in range(1, num_players)]
+  board = np.full((8, 8), True)
+  for location in game.locations:
+    board[location] = False
+  start = game.snapshot()
+  for turn in range(300):
+    player = game.turn
+    assert player == turn % num_players
+    all_moves = list(product(range(-1, 9), repeat=2))
+    valid_moves = [move for move in all_moves if naive_valid_move(game, player, move)]
+    assert valid_moves == [move for move in all_moves if game.valid_move(player, move)]
+    assert sorted(game.legal_moves(player)) == valid_moves
+    assert [divmod(i, 8) for i in np.flatnonzero(game.action_mask(player))] == valid_moves
+    move = random.choice(valid_moves) if valid_moves else None
+    if move is not None:
+      board[move] = False
+    game.make_move(player, move, undoable=True)
+    assert (game.board == board).all()
+    assert game.num_coins == board.sum()
+    observation = game.observation_bytes(player)
+    assert len(observation) == 8 + 2 * num_players
+  for _ in range(300):
+    game.unmake_move()
+  assert game.snapshot() == start
+  assert sorted(game.legal_moves(0)) == [move for move in product(range(8), repeat=2) if naive_valid_move(game, 0, move)]
@@ -1,4 +1,5 @@
 # import pytest
+import numpy as np
 
 # import gym
 from qwertyenv.ensure_valid_action_pz import EnsureValidAction
@@ -63,3 +64,164 @@ def test_with_tianshou():
   collector = Collector(policies, env)
 
   result = collector.collect(n_step=200, render=0.1)
+
+
+def test_mask():
+
+  env = CollectCoinsEnv(pieces=['rock', 'knight'], with_mask=True)
+
+  for agent in env.agent_iter(max_iter=50):
+    observation, _, terminated, truncated, _ = env.last()
+    assert env.observation_space(agent).contains(observation)
+    valid_actions = [divmod(i, 8) for i in range(8 * 8) if env.check_action_valid(i)]
+    assert valid_actions == [divmod(i, 8) for i in np.flatnonzero(observation['mask'])]
+    assert valid_actions == sorted(env.game.legal_moves(env.agent_name_mapping[agent]))
+    action = None if terminated or truncated else env.provide_alternative_valid_action(None)
+    assert action is None or env.check_action_valid(action)
+    env.step(action)
+
+
+def test_observation_buffers():
+
+  envs = [CollectCoinsEnv(pieces=['knight', 'rock'], with_mask=True, copy_observations=copy) for copy in [True, False]]
+
+  for _ in range(10):
+    observations = [env.observe(env.agent_selection) for env in envs]
+    for key in observations[0]:
+      assert np.array_equal(observations[0][key], observations[1][key])
+    assert not observations[1]['mask'].flags.writeable
+    action = envs[0].provide_alternative_valid_action(None)
+    for env in envs:
+      env.step(action)
+
+
+def test_observations_property():
+
+  env = CollectCoinsEnv(pieces=['rock', 'knight'], with_mask=True)
+  env.step(env.provide_alternative_valid_action(None))
+
+  observations = env.observations
+  assert list(observations) == env.agents
+  for agent, observation in observations.items():
+    expected = env.observe(agent)
+    for key in expected:
+      assert np.array_equal(observation[key], expected[key])
+
+
+def test_get_set_state():
+
+  env = CollectCoinsEnv(pieces=['knight', 'rock'], with_mask=True)
+  for _ in range(5):
+    env.step(env.provide_alternative_valid_action(None))
+  state = env.get_state()
+  observation = env.last()
+  for _ in range(6):
+    env.step(env.provide_alternative_valid_action(None))
+  env.set_state(state)
+  assert env.get_state() == state
+  for a, b in zip(env.last(), observation):
+    if isinstance(a, dict):
+      assert all(np.array_equal(a[key], b[key]) for key in a)
+    else:
+      assert a == b
+
+
+def test_set_state_at_episode_end():
+  env = CollectCoinsEnv(pieces=['rock', 'rock'], board_size=4)
+  env.reset(seed=0)
+  for agent in env.agent_iter():
+    _, _, terminated, truncated, _ = env.last()
+    env.step(None if terminated or truncated else env.provide_alternative_valid_action(None))
+  assert env.agents == []
+  assert env.game._undo == [] # the environment's moves are not kept for unmake_move
+  state = env.get_state()
+
+  other = CollectCoinsEnv(pieces=['rock', 'rock'], board_size=4)
+  other.reset(seed=1)
+  other.set_state(state)
+  assert other.get_state() == state
+  assert other.agents == []
+
+
+def test_observation_modes():
+
+  envs = {
+    mode: CollectCoinsEnv(pieces=['knight', 'rock'], with_mask=True, observation_mode=mode)
+    for mode in ['dict', 'packed', 'flat']
+  }
+
+  for _ in range(10):
+    agent = envs['dict'].agent_selection
+    observations = {mode: env.observe(agent) for mode, env in envs.items()}
+    for mode, env in envs.items():
+      assert env.observation_space(agent).contains(observations[mode])
+    flat, packed = observations['flat'], observations['packed']
+    assert flat.shape == (20,)
+    np.testing.assert_array_equal(np.unpackbits(flat[:8], bitorder='little').reshape(8, 8), observations['dict']['board'])
+    np.testing.assert_array_equal(packed['board'], flat[:8])
+    assert tuple(flat[8:10]) == observations['dict']['player']
+    assert tuple(flat[10:12]) == observations['dict']['other_player']
+    np.testing.assert_array_equal(np.unpackbits(flat[12:], bitorder='little'), observations['dict']['mask'])
+    np.testing.assert_array_equal(packed['mask'], observations['dict']['mask'])
+    action = envs['dict'].provide_alternative_valid_action(None)
+    for env in envs.values():
+      env.step(action)
+
+
+def test_num_players():
+
+  pieces = ['rock', 'knight', 'rock', 'knight']
+  env = CollectCoinsEnv(pieces=pieces, with_mask=True)
+  assert env.possible_agents == ['player_0', 'player_1', 'player_2', 'player_3']
+  assert env.game.locations == [(0, 0), (0, 7), (7, 7), (7, 0)]
+  api_test(EnsureValidAction(env, env.check_action_valid, env.provide_alternative_valid_action), num_cycles=100)
+
+  for mode in ['dict', 'packed', 'flat']:
+    envs = [
+      CollectCoinsEnv(pieces=pieces * 4, with_mask=True, observation_mode=mode, copy_observations=copy)
+      for copy in [True, False]
+    ]
+    for _ in range(50):
+      for agent in envs[0].agents:
+        observations = [env.observe(agent) for env in envs]
+        assert envs[1].observation_space(agent).contains(observations[1])
+        if mode == 'flat':
+          np.testing.assert_array_equal(observations[0], observations[1])
+          continue
+        for key in observations[0]:
+          np.testing.assert_array_equal(observations[0][key], observations[1][key])
+        i = envs[0].agent_name_mapping[agent]
+        assert [tuple(location) for location in observations[0]['other_players']] == [
+          envs[0].game.locations[(i + k) % 16] for k in range(1, 16)
+        ]
+      action = envs[0].provide_alternative_valid_action(None)
+      for env in envs:
+        env.step(action)
+
+
+def test_blocked_agent_passes():
+
+  env = CollectCoinsEnv(pieces=['knight', 'knight', 'rock'], board_size=2)  # a knight has no move on a 2x2 board
+  for agent in ['player_0', 'player_1']:
+    assert env.agent_selection == agent
+    assert env.provide_alternative_valid_action(None) is None
+    assert env.check_action_valid(None)
+    assert not env.check_action_valid((1, 0))
+    env.step(None)
+  assert env.agent_selection == 'player_2'
+  assert not env.check_action_valid(None)  # the rock can take the free square
+  assert env.check_action_valid((1, 0))
+  env.step((1, 0))
+  assert all(env.terminations.values())  # the last coin was collected
+  assert env.check_action_valid(None)
+
+
+def test_num_players_rewards():
+
+  env = CollectCoinsEnv(pieces=['rock'] * 3, board_size=4)
+  while not all(env.terminations.values()):
+    env.step(env.provide_alternative_valid_action(None))
+  coins = env.game.coins
+  for i, agent in enumerate(env.agents):
+    best_other = max(coins[:i] + coins[i + 1:])
+    assert env.rewards[agent] == (0 if coins[i] == best_other else (1 if coins[i] > best_other else -1))
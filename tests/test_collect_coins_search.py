@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+from qwertyenv.collect_coins import CollectCoinsEnv
+from qwertyenv.collect_coins_game import CollectCoinsGame, to_square
+from qwertyenv.collect_coins_search import AlphaBetaPlayer, WIN
+
+
+def test_takes_the_last_coin():
+  game = CollectCoinsGame(['rock', 'rock'])
+  # one coin left, next to player 0, who is behind by one coin
+  state = (1 << to_square((3, 4)), (to_square((3, 3)), to_square((0, 0))), (5, 5), 0)
+  game.restore(state)
+  player = AlphaBetaPlayer(max_time=None, max_nodes=1000)
+  assert player(game, 0) == (3, 4)
+  assert player.last_search['value'] == WIN
+  assert game.snapshot() == state # the search leaves the game as it was
+
+
+def test_budget():
+  random.seed(0)
+  player = AlphaBetaPlayer(max_time=None, max_nodes=500, tt_size=100)
+  env = CollectCoinsEnv(pieces=['knight', 'knight'], opponent=player)
+  env.reset()
+  for _ in range(20):
+    env.step(env.provide_alternative_valid_action(None))
+    assert player.last_search['depth'] >= 1
+    assert player.last_search['nodes'] <= 500 + 1 + 8 # + depth 1, that is always completed
+    assert len(player._tt) <= 100
+
+
+def test_two_players_only():
+  game = CollectCoinsGame(['rock', 'rock', 'rock'])
+  with pytest.raises(AssertionError, match='two players'):
+    AlphaBetaPlayer(max_time=None, max_nodes=100)(game, 0)
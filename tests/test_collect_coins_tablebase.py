@@ -0,0 +1,86 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from qwertyenv.collect_coins import CollectCoinsEnv
+from qwertyenv.collect_coins_game import CollectCoinsGame, to_square
+from qwertyenv.collect_coins_tablebase import (
+  CollectCoinsTablebase, build_tablebase, layer_offset, position_index, _unrank, POSITIONS
+)
+
+
+@pytest.fixture(scope='module')
+def tablebase(tmp_path_factory):
+  directory = str(tmp_path_factory.mktemp('tablebase'))
+  build_tablebase(directory, ('rock', 'knight'), max_coins=1, num_workers=0)
+  return CollectCoinsTablebase(directory, ('rock', 'knight'))
+
+
+def _game(coins, squares, turn=0, collected=(0, 0)):
+  game = CollectCoinsGame(['rock', 'knight'])
+  game.restore((sum(1 << to_square(coin) for coin in coins), tuple(to_square(s) for s in squares), collected, turn))
+  return game
+
+
+def test_index():
+  assert layer_offset(0) == 0 and layer_offset(1) == POSITIONS and layer_offset(2) == 65 * POSITIONS
+  for rank in range(math.comb(64, 2)):
+    squares = _unrank(rank, 2)
+    assert position_index(sum(1 << square for square in squares), (0, 0), 0) == layer_offset(2) + rank * POSITIONS
+
+
+def test_lookups(tablebase):
+  assert tablebase.max_coins == 1
+  game = _game(coins=[(3, 4)], squares=[(3, 3), (7, 7)]) # the rock takes the coin next to it
+  assert tablebase.margin(game) == 1
+  assert tablebase.best_move(game) == (3, 4)
+  assert tablebase.outcome(game, 0) == 1
+  assert tablebase.outcome(_game(coins=[(3, 4)], squares=[(3, 3), (7, 7)], collected=(0, 3)), 0) == -1
+
+  game = _game(coins=[(5, 6)], squares=[(0, 0), (7, 7)], turn=1) # the knight is a move away
+  assert tablebase.margin(game) == 1
+  assert tablebase.best_move(game) == (5, 6)
+
+  assert tablebase.margin(CollectCoinsGame(['rock', 'knight'])) is None # too many coins
+
+
+def test_not_covered(tablebase):
+  # only the solved pieces, two players, on the 8 x 8 board
+  assert tablebase.covers(_game(coins=[(3, 4)], squares=[(3, 3), (7, 7)]))
+  for game in [
+    CollectCoinsGame(['knight', 'rock'], coin_density=0.0),
+    CollectCoinsGame(['rock', 'knight'], board_size=6, coin_density=0.0),
+    CollectCoinsGame(['rock', 'knight', 'rock'], coin_density=0.0),
+  ]:
+    assert not tablebase.covers(game)
+    assert tablebase.margin(game) is None and tablebase.best_move(game) is None
+
+
+def test_consistent(tablebase):
+  # a position's margin is the best of its moves'
+  random.seed(1)
+  for _ in range(500):
+    squares = random.sample(range(64), 3)
+    game = CollectCoinsGame(['rock', 'knight'])
+    game.restore((1 << squares[2], tuple(squares[:2]), (0, 0), random.randint(0, 1)))
+    values = []
+    for move in game.legal_moves(game.turn):
+      coin_bits = game.coin_bits
+      game.make_move(game.turn, move, undoable=True)
+      values.append(int(game.coin_bits != coin_bits) - tablebase.margin(game))
+      game.unmake_move()
+    assert tablebase.margin(game) == max(values)
+
+
+def test_parallel_build(tmp_path, tablebase):
+  build_tablebase(str(tmp_path), ('rock', 'knight'), max_coins=1, num_workers=2, mp_context='spawn')
+  np.testing.assert_array_equal(CollectCoinsTablebase(str(tmp_path), ('rock', 'knight')).margins, tablebase.margins)
+
+
+def test_opponent(tablebase):
+  env = CollectCoinsEnv(pieces=['rock', 'knight'], opponent=tablebase)
+  env.reset()
+  _, _, done, _, _ = env.step(env.provide_alternative_valid_action(None)) # many coins, the fallback plays
+  assert not done
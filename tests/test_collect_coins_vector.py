@@ -0,0 +1,50 @@
+import random
+
+import numpy as np
+import pytest
+
+from qwertyenv.collect_coins_game import CollectCoinsGame
+from qwertyenv.collect_coins_vector import CollectCoinsVectorEnv
+
+
+@pytest.mark.parametrize("pieces", [['rock', 'rock'], ['knight', 'rock']])
+def test_against_game(pieces):
+  random.seed(0)
+  num_envs = 8
+  env = CollectCoinsVectorEnv(num_envs=num_envs, pieces=pieces)
+  obs, _ = env.reset(seed=0)
+  games = [CollectCoinsGame(pieces) for _ in range(num_envs)]
+  previous_coins = [0] * num_envs
+
+  num_finished = 0
+  for _ in range(400):
+    actions = np.array([random.choice(game.legal_moves(0)) for game in games])
+    obs, rewards, terminated, truncated, info = env.step(actions)
+    assert env.observation_space.contains(obs)
+    for i, game in enumerate(games):
+      if info.get('_final_observation', np.zeros(num_envs, dtype=bool))[i]:
+        final_obs = info['final_observation'][i]
+        assert env.single_observation_space.contains(final_obs)
+      else:
+        assert info.get('final_observation', [None] * num_envs)[i] is None
+        final_obs = {key: value[i] for key, value in obs.items()}
+      game.make_move(0, actions[i])
+      if not game.is_done():
+        game.make_move(1, final_obs['other_player'])
+      assert (final_obs['board'] == game.board.flatten()).all()
+      if game.is_done():
+        assert terminated[i]
+        assert rewards[i] == np.sign(game.coins[0] - game.coins[1])
+      else:
+        assert rewards[i] == pytest.approx((game.coins[0] - previous_coins[i]) * 0.01)
+      previous_coins[i] = game.coins[0]
+      if terminated[i] or truncated[i]:
+        num_finished += 1
+        games[i] = CollectCoinsGame(pieces)
+        previous_coins[i] = 0
+  assert num_finished > 0
+
+
+def test_board_size():
+  with pytest.raises(AssertionError, match='8x8'):
+    CollectCoinsVectorEnv(num_envs=2, board_size=16)
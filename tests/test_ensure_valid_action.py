@@ -0,0 +1,115 @@
+import gymnasium as gym
+import numpy as np
+
+from qwertyenv import EnsureValidAction
+from qwertyenv.collect_coins_pz import CollectCoinsEnv
+from qwertyenv.collect_coins_vector import CollectCoinsVectorEnv
+from qwertyenv.ensure_valid_action_pz import EnsureValidAction as EnsureValidActionPZ
+from qwertyenv.valid_actions import NearestValidAction
+
+
+def test_nearest_valid_action():
+  nearest = NearestValidAction(gym.spaces.MultiDiscrete([8, 8]))
+  all_valid = np.ones((64, 64), dtype=bool)
+  assert np.array_equal(nearest.nearest(np.arange(64), all_valid), np.arange(64)) # an action is the nearest to itself
+
+  masks = np.zeros((3, 64), dtype=bool)
+  masks[0, 3 * 8 + 3] = True # the only valid action
+  masks[1, [0 * 8 + 0, 5 * 8 + 6]] = True
+  masks[2, 2 * 8 + 2] = True
+  actions = np.array([[0, 0], [5, 5], [2, 2]])
+  corrected, replaced = nearest(actions, masks)
+  assert np.array_equal(corrected, [[3, 3], [5, 6], [2, 2]])
+  assert np.array_equal(replaced, [True, True, False])
+
+  nearest = NearestValidAction(gym.spaces.Tuple([gym.spaces.Discrete(8)] * 2))
+  assert nearest.single((5, 5), masks[1]) == ((5, 6), True)
+  assert nearest.single((0, 0), masks[1]) == ((0, 0), False)
+  assert nearest.single((0, 0), np.zeros(64, dtype=bool)) == ((0, 0), False) # no valid action
+
+  nearest = NearestValidAction(gym.spaces.Discrete(5, start=1))
+  corrected, replaced = nearest(np.array([1, 5]), [[0, 0, 1, 0, 0], [1, 0, 0, 1, 0]])
+  assert np.array_equal(corrected, [3, 4])
+
+
+def test_vector_env():
+  env = CollectCoinsVectorEnv(num_envs=16, pieces=['knight', 'rock'])
+  taken = []
+  env = EnsureValidAction(env, alternative_action_cb=taken.append, action_mask=env.action_masks)
+  env.reset(seed=0)
+  for _ in range(50):
+    env.step(env.action_space.sample()) # mostly invalid, would assert in the environment
+  assert env.replaced.shape == (16,)
+  assert env.single_action_space == gym.spaces.MultiDiscrete([8, 8])
+  assert env.action_space == gym.vector.utils.batch_space(env.single_action_space, 16)
+  assert len(taken) > 0
+
+
+def test_gym_env():
+  env = gym.make('qwertyenv/CollectCoins-v0', pieces=['rock', 'rock'])
+  game_env = env.unwrapped
+  env = EnsureValidAction(env, action_mask=lambda: game_env.game.legal_move_bits(game_env.player))
+  env.reset(seed=0)
+  env.action_space.seed(0)
+  for _ in range(50):
+    _, _, terminated, truncated, _ = env.step(env.action_space.sample())
+    if terminated or truncated:
+      env.reset()
+
+
+def test_pz_env():
+  env = CollectCoinsEnv(pieces=['knight', 'knight'], with_mask=True)
+  taken = []
+  env = EnsureValidActionPZ(env, alternative_action_cb=taken.append, action_mask='mask')
+  env.reset(seed=0)
+  for agent in env.agent_iter(max_iter=100):
+    observation, reward, terminated, truncated, info = env.last()
+    action = None if terminated or truncated else (3, 3)
+    if action is not None and not observation['mask'][3 * 8 + 3]:
+      expected, _ = NearestValidAction(env.action_space(agent)).single(action, observation['mask'])
+    else:
+      expected = action
+    env.step(action)
+    if action is not None and expected != action:
+      assert taken[-1] == expected
+
+
+def test_out_of_range():
+  nearest = NearestValidAction(gym.spaces.Discrete(4))
+  corrected, replaced = nearest(np.array([7, -1]), [[0, 0, 1, 1], [1, 1, 0, 0]])
+  assert np.array_equal(corrected, [3, 0])
+  assert np.array_equal(replaced, [True, True])
+  assert nearest.single(9, [0, 1, 1, 0]) == (2, True)
+
+
+def test_big_action_space():
+  # no (n, n) table (more than max_table actions), a 128 x 128 board's actions
+  nearest = NearestValidAction(gym.spaces.MultiDiscrete([128, 128]))
+  masks = np.zeros((100, 128 * 128), dtype=bool)
+  masks[:, 64 * 128 + 64] = True
+  masks[:, 64 * 128 + 66] = True
+  nearest.max_chunk = 5 * 128 * 128 # a few chunks
+  actions = np.tile([64, 65], (100, 1)) # as far from both, the smaller number is taken
+  corrected, replaced = nearest(actions, masks)
+  assert replaced.all()
+  assert np.array_equal(corrected, np.tile([64, 64], (100, 1)))
+  assert np.array_equal(nearest.single(np.array([0, 127]), masks[0])[0], [64, 66])
+  bits = (1 << 64 * 128 + 64) | (1 << 64 * 128 + 66)
+  assert nearest.single((0, 127), bits) == ((64, 66), True)
+
+
+def test_single_bits_mask():
+  # a mask as an int (bit i for action i) corrects as the array mask, and as a batch
+  nearest = NearestValidAction(gym.spaces.MultiDiscrete([8, 8]))
+  rng = np.random.default_rng(0)
+  masks = rng.random((200, 64)) < 0.05
+  masks[:, 0] |= ~masks.any(axis=1)
+  actions = rng.integers(0, 8, size=(200, 2))
+  corrected, replaced = nearest(actions, masks)
+  for action, mask, expected, was_replaced in zip(actions, masks, corrected, replaced):
+    bits = sum(1 << int(i) for i in np.flatnonzero(mask))
+    taken, single_replaced = nearest.single(action, bits)
+    assert single_replaced == was_replaced
+    assert np.array_equal(taken, expected)
+    assert np.array_equal(nearest.single(action, mask)[0], expected)
+  assert nearest.single((3, 3), 0) == ((3, 3), False) # no valid action, kept
@@ -6,6 +6,7 @@ from pettingzoo.butterfly import pistonball_v6
 from pettingzoo.classic import tictactoe_v3
 from qwertyenv import (
     aec_to_gymnasium,
+    aec_to_gymnasium_vector,
     parallel_to_gymnasium,
 )
 
@@ -47,6 +48,100 @@ def test_tictactoe(me, other):
     gym_env.close()
 
 
+@pytest.mark.parametrize(
+    ["me", "other"],
+    [
+        ("player_1", "player_2"),
+        ("player_2", "player_1"),
+    ],
+)
+def test_tictactoe_vector(me, other):
+    num_envs = 5
+
+    def first_free_square(obs):
+        return int(np.flatnonzero(obs["action_mask"])[0])
+
+    batches = []
+
+    def act_others_batch(agents, observations):
+        assert all(agent == other for agent in agents)
+        batches.append(len(agents))
+        return [first_free_square(observation) for observation in observations]
+
+    vector_env = aec_to_gymnasium_vector(
+        aec_envs=[tictactoe_v3.env() for _ in range(num_envs)],
+        external_agent=me,
+        act_others_batch=act_others_batch,
+    )
+    gym_envs = [
+        aec_to_gymnasium(
+            aec_env=tictactoe_v3.env(),
+            external_agent=me,
+            act_others=lambda agent, observation: first_free_square(observation),
+        )
+        for _ in range(num_envs)
+    ]
+
+    observations, infos = vector_env.reset(seed=42)
+    expected = [gym_env.reset(seed=42 + i)[0] for i, gym_env in enumerate(gym_envs)]
+    for i in range(num_envs):
+        assert np.array_equal(observations["action_mask"][i], expected[i]["action_mask"])
+
+    for _ in range(12):
+        batches.clear()
+        actions = np.array([first_free_square(observation) for observation in expected])
+        observations, rewards, terminateds, truncateds, infos = vector_env.step(actions)
+        assert len(batches) <= 2  # one round for the other player, one more for the envs that were reset
+        for i, gym_env in enumerate(gym_envs):
+            observation, reward, terminated, truncated, _ = gym_env.step(actions[i])
+            assert reward == rewards[i]
+            assert terminated == terminateds[i]
+            assert truncated == truncateds[i]
+            if terminated or truncated:
+                assert np.array_equal(
+                    infos["final_observation"][i]["observation"], observation["observation"]
+                )
+                observation, _ = gym_env.reset()
+            assert np.array_equal(observations["observation"][i], observation["observation"])
+            assert np.array_equal(observations["action_mask"][i], observation["action_mask"])
+            expected[i] = observation
+    vector_env.close()
+
+
+
+def test_aec_to_gymnasium_vector_final_observation():
+    # the final observations are kept even when the environments reuse their observations' arrays
+    from qwertyenv.collect_coins_pz import CollectCoinsEnv
+
+    def first_valid_move(observation):
+        return divmod(int(np.flatnonzero(observation["mask"])[0]), 4)
+
+    def make(copy_observations):
+        return aec_to_gymnasium_vector(
+            [CollectCoinsEnv(with_mask=True, board_size=4, copy_observations=copy_observations) for _ in range(3)],
+            "player_0",
+            lambda agents, observations: [first_valid_move(observation) for observation in observations],
+        )
+
+    vector_envs = [make(True), make(False)]
+    observations = [vector_env.reset(seed=0)[0] for vector_env in vector_envs]
+    episodes = 0
+    for _ in range(250):  # at the latest, truncated after 200 rounds
+        squares = observations[0]["mask"].argmax(axis=1)
+        results = [vector_env.step((squares // 4, squares % 4)) for vector_env in vector_envs]
+        (copied, _, _, _, copied_infos), (reused, _, _, _, reused_infos) = results
+        for key in copied:
+            np.testing.assert_array_equal(np.asarray(copied[key]), np.asarray(reused[key]))
+        if "final_observation" in copied_infos:
+            episodes += 1
+            for i in np.flatnonzero(copied_infos["_final_observation"]):
+                for key in copied_infos["final_observation"][i]:
+                    np.testing.assert_array_equal(
+                        copied_infos["final_observation"][i][key], reused_infos["final_observation"][i][key]
+                    )
+        observations = [copied, reused]
+    assert episodes > 0
+
 @pytest.mark.parametrize(
     "me",
     [
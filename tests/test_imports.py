@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import qwertyenv
+
+
+def modules_after(statements):
+  code = f"import sys; {statements}; print(' '.join(sorted(sys.modules)))"
+  output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+  return set(output.split())
+
+
+def test_games_without_pettingzoo():
+  modules = modules_after("import qwertyenv.black_jack, qwertyenv.collect_coins_game, qwertyenv.collect_coins")
+  assert 'pettingzoo' not in modules
+  assert 'qwertyenv.pz_to_gymnasium_wrappers' not in modules
+
+
+def test_lazy_names():
+  modules = modules_after("import qwertyenv; qwertyenv.aec_to_gymnasium")
+  assert 'qwertyenv.pz_to_gymnasium_wrappers' in modules
+  assert 'pettingzoo' not in modules # only needed by the PettingZoo environments themselves
+
+  for name in qwertyenv.__all__:
+    assert callable(getattr(qwertyenv, name))
+  assert 'aec_to_gymnasium' in dir(qwertyenv)
+
+
+def test_gym_envs_without_pettingzoo():
+  modules = modules_after("sys.modules['pettingzoo'] = None; import qwertyenv") # None blocks the import
+  assert 'qwertyenv.black_jack' not in modules # registered by name, the module is imported on make
+  assert 'qwertyenv.collect_coins' not in modules
+
+  code = "\n".join([
+    "import sys",
+    "sys.modules['pettingzoo'] = None",
+    "import qwertyenv",
+    "import gymnasium as gym",
+    "env = gym.make('qwertyenv/BlackJack-v0')",
+    "env.reset(seed=0)",
+    "env.step(env.action_space.sample())",
+    "env = gym.make('qwertyenv/CollectCoins-v0')",
+    "env.reset(seed=0)",
+    "env.step(env.unwrapped.provide_alternative_valid_action(None))",
+    "assert 'pettingzoo' not in sys.modules or sys.modules['pettingzoo'] is None",
+  ])
+  subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_registered_when_gymnasium_first():
+  modules = modules_after("import gymnasium as gym; import qwertyenv; gym.spec('qwertyenv/CollectCoins-v0')")
+  assert 'qwertyenv.collect_coins' not in modules
@@ -0,0 +1,98 @@
+import numpy as np
+
+from pettingzoo.classic import tictactoe_v3
+from qwertyenv import aec_to_gymnasium
+from qwertyenv.collect_coins import CollectCoinsEnv
+from qwertyenv.collect_coins_pz import CollectCoinsEnv as CollectCoinsPZEnv
+from qwertyenv.profiling import PhaseHistogram, StepProfiler
+
+
+def test_histogram_percentiles():
+    histogram = PhaseHistogram()
+    for seconds in [1e-6] * 90 + [1e-3] * 9 + [1.0]:
+        histogram.record(seconds)
+    assert histogram.count == 100
+    assert len(histogram.counts) == histogram.num_bins # fixed size
+    assert 1e-6 <= histogram.percentile(50) <= 1.3e-6
+    assert 1e-3 <= histogram.percentile(95) <= 1.3e-3
+    assert histogram.percentile(100) == 1.0
+    assert histogram.summary()['max'] == 1.0
+
+    histogram.record(0.0) # and out of range durations are counted at the edges
+    histogram.record(1e6)
+    assert histogram.counts[0] == 1 and histogram.counts[-1] == 1
+
+
+def test_collect_coins_phases():
+    summaries = []
+    profiler = StepProfiler(sink=summaries.append, sink_every=5)
+    env = CollectCoinsEnv(profiler=profiler)
+    env.reset()
+    steps = 0
+    done = False
+    while not done and steps < 12:
+        action = env.provide_alternative_valid_action(None)
+        _, _, done, _, _ = env.step(action)
+        steps += 1
+
+    summary = profiler.summary()
+    assert summary['step']['count'] == steps
+    assert summary['make_move']['count'] == steps
+    assert summary['observation']['count'] == steps
+    assert summary['reward']['count'] == steps
+    assert 0 < summary['play_other']['count'] <= steps
+    assert summary['step']['total'] >= summary['make_move']['total']
+    assert len(summaries) == steps // 5
+
+    profiler.reset()
+    assert profiler.summary() == {}
+
+
+def test_no_profiler_same_game():
+    # the profiled step plays the same as the plain one
+    def first_legal_move(game, player):
+        return game.legal_moves(player)[0]
+
+    plain = CollectCoinsEnv(opponent=first_legal_move)
+    profiled = CollectCoinsEnv(opponent=first_legal_move, profiler=StepProfiler())
+    for action in [(1, 0), (2, 0), (2, 1)]:
+        for left, right in zip(plain.step(action), profiled.step(action)):
+            if isinstance(left, dict):
+                for key in left:
+                    np.testing.assert_array_equal(left[key], right[key])
+            else:
+                assert left == right
+
+
+def test_collect_coins_pz_phases():
+    profiler = StepProfiler()
+    env = CollectCoinsPZEnv(profiler=profiler)
+    env.reset(seed=0)
+    for steps, agent in enumerate(env.agent_iter(max_iter=10), start=1):
+        env.last()
+        env.step(env.provide_alternative_valid_action(None, agent))
+
+    summary = profiler.summary()
+    assert summary['step']['count'] == steps
+    assert summary['make_move']['count'] == steps
+    assert summary['rewards']['count'] == steps
+    assert summary['observation']['count'] == steps # observed by last()
+    assert summary['step']['total'] >= summary['make_move']['total']
+
+
+def test_aec_to_gymnasium_phases():
+    profiler = StepProfiler()
+
+    def first_free_square(agent, observation):
+        return int(np.argmax(observation["action_mask"]))
+
+    gym_env = aec_to_gymnasium(tictactoe_v3.env(), "player_1", first_free_square, profiler=profiler)
+    observation, _ = gym_env.reset(seed=1)
+    gym_env.step(int(np.argmax(observation["action_mask"])))
+
+    summary = profiler.summary()
+    assert summary['step']['count'] == 1
+    assert summary['env_step']['count'] == 1
+    assert summary['act_others']['count'] == 1
+    assert summary['others_step']['count'] == 1
+    assert summary['act_others']['p99'] > 0
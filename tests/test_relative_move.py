@@ -0,0 +1,46 @@
+import gymnasium as gym
+import numpy as np
+
+from qwertyenv import EnsureValidAction
+from qwertyenv.collect_coins_game import KNIGHT_OFFSETS, ROCK_OFFSETS, Knight, Rock
+from qwertyenv.collect_coins_vector import CollectCoinsVectorEnv
+from qwertyenv.relative_move import OFF_BOARD, RelativeMove, relative_move_table
+
+
+def test_relative_move_table():
+  for piece in [Rock, Knight]:
+    table = relative_move_table(piece.offsets)
+    assert table.shape == (64, len(piece.offsets))
+    for square, destinations in enumerate(piece.destinations):
+      assert sorted(table[square][table[square] != OFF_BOARD]) == sorted(destinations)
+
+
+def test_single_env():
+  env = gym.make('qwertyenv/CollectCoins-v0', pieces=['rock', 'rock'])
+  env = RelativeMove(env, lambda: (5, 5))
+  assert env.action_space == gym.spaces.Discrete(4)
+  assert [env.action(a) for a in range(4)] == [(4, 5), (6, 5), (5, 4), (5, 6)] # as ROCK_OFFSETS, (row, col)
+
+  env = RelativeMove(env, lambda: (0, 1), offsets=KNIGHT_OFFSETS)
+  assert env.action(KNIGHT_OFFSETS.index((2, 1))) == (2, 2)
+  assert env.action(KNIGHT_OFFSETS.index((-2, 1))) == (OFF_BOARD, OFF_BOARD)
+
+
+def test_vector_env():
+  env = CollectCoinsVectorEnv(num_envs=32, pieces=['knight', 'knight'])
+  game_env = env
+  env = EnsureValidAction(env, action_mask=game_env.action_masks) # off board moves are replaced
+  env = RelativeMove(env, lambda: game_env.locations[:, game_env.player], offsets=KNIGHT_OFFSETS)
+  assert env.action_space.shape == (32,)
+  assert env.single_action_space == gym.spaces.Discrete(len(KNIGHT_OFFSETS))
+  env.reset(seed=0)
+  env.action_space.seed(0)
+  for _ in range(20):
+    directions = env.action_space.sample()
+    destinations = env.action(directions)
+    locations = game_env.locations[:, game_env.player]
+    expected = locations + np.array(KNIGHT_OFFSETS)[directions]
+    on_board = ((expected >= 0) & (expected < 8)).all(axis=1)
+    assert np.array_equal(destinations[on_board], expected[on_board])
+    assert (destinations[~on_board] == OFF_BOARD).all()
+    env.step(directions)
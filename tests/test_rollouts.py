@@ -0,0 +1,46 @@
+import functools
+
+import numpy as np
+
+from qwertyenv.collect_coins_pz import CollectCoinsEnv
+from qwertyenv.rollouts import generate_rollouts, load_shards
+
+
+def random_valid_move(observation):
+  # numpy's global random, seeded per worker by generate_rollouts
+  return divmod(int(np.random.choice(np.flatnonzero(observation['mask']))), 8)
+
+
+def test_generate_rollouts(tmp_path):
+  env_fn = functools.partial(CollectCoinsEnv, pieces=['knight', 'knight'], with_mask=True)
+  policies = {'player_0': random_valid_move, 'player_1': random_valid_move}
+
+  stats = generate_rollouts(env_fn, policies, str(tmp_path), num_workers=2, steps_per_worker=500, shard_size=200,
+                             mp_context='spawn')
+
+  assert [s['steps'] for s in stats] == [500, 500]
+  assert all(s['steps_per_second'] > 0 for s in stats)
+  shards = list(load_shards(str(tmp_path)))
+  assert len(shards) == 2 * 3
+  assert sum(len(shard['reward']) for shard in shards) == 1000
+  shard = shards[0]
+  assert shard['obs.board'].shape == (200, 8, 8)
+  assert shard['obs.player.0'].dtype == np.uint8
+  assert isinstance(shard['obs.board'], np.memmap)
+  for s, worker_shards in zip(stats, [shards[:3], shards[3:]]):
+    # each agent steps its terminated / truncated turn, the last partial episode is not counted
+    done = sum(np.count_nonzero(shard['terminated'] | shard['truncated']) for shard in worker_shards)
+    assert s['episodes'] == done // 2 > 0
+  assert set(shard['agent']) == {0, 1}
+  # the workers are seeded differently
+  assert not all(np.array_equal(shards[0][name], shards[3][name]) for name in shards[0])
+
+  # the same root seed reproduces the same shards
+  generate_rollouts(env_fn, policies, str(tmp_path / 'again'), num_workers=2, steps_per_worker=500, shard_size=200,
+                    mp_context='spawn')
+  shards_again = list(load_shards(str(tmp_path / 'again')))
+  assert len(shards_again) == len(shards)
+  for shard, again in zip(shards, shards_again):
+    assert shard.keys() == again.keys()
+    for name in shard:
+      assert np.array_equal(shard[name], again[name])
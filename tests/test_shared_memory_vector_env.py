@@ -0,0 +1,80 @@
+import numpy as np
+import gymnasium as gym
+import pytest
+
+from pettingzoo.classic import tictactoe_v3
+from qwertyenv.pz_to_gymnasium_wrappers import AECToGymnasium
+from qwertyenv.shared_memory_vector_env import SharedMemoryVectorEnv
+
+
+def first_free_square(agent, observation):
+    return int(np.flatnonzero(observation["action_mask"])[0])
+
+
+def test_tictactoe():
+    num_envs = 5
+    env_fn = AECToGymnasium(tictactoe_v3.env, external_agent="player_1", act_others=first_free_square)
+
+    vector_env = SharedMemoryVectorEnv([env_fn] * num_envs, num_workers=2, mp_context="spawn")
+    sync_env = gym.vector.SyncVectorEnv([env_fn] * num_envs)
+    assert vector_env.single_observation_space == sync_env.single_observation_space
+
+    observations, infos = vector_env.reset(seed=42)
+    expected, _ = sync_env.reset(seed=42)
+    episodes = 0
+    try:
+        for _ in range(12):
+            for key in ["observation", "action_mask"]:
+                assert np.array_equal(observations[key], expected[key])
+            actions = np.array([first_free_square(None, {"action_mask": mask}) for mask in expected["action_mask"]])
+            observations, rewards, terminateds, truncateds, infos = vector_env.step(actions)
+            expected, expected_rewards, expected_terminateds, expected_truncateds, expected_infos = sync_env.step(actions)
+            assert np.array_equal(rewards, expected_rewards)
+            assert np.array_equal(terminateds, expected_terminateds)
+            assert np.array_equal(truncateds, expected_truncateds)
+            for i in np.flatnonzero(terminateds | truncateds):
+                episodes += 1
+                assert infos["_final_observation"][i]
+                assert np.array_equal(
+                    infos["final_observation"][i]["observation"],
+                    expected_infos["final_observation"][i]["observation"],
+                )
+        assert episodes > 0
+    finally:
+        vector_env.close()
+        sync_env.close()
+
+
+def collect_coins_reusing_observations():
+    from qwertyenv import EnsureValidAction
+    from qwertyenv.collect_coins import CollectCoinsEnv
+
+    env = CollectCoinsEnv(copy_observations=False, board_size=4)
+    return EnsureValidAction(env, action_mask=lambda: env.game.legal_move_bits(env.player))
+
+
+def test_final_observation_copied():
+    # the environment overwrites its observation's arrays on reset, the final observation is kept as it was
+    vector_env = SharedMemoryVectorEnv([collect_coins_reusing_observations] * 2, num_workers=1, mp_context="spawn")
+    try:
+        vector_env.reset(seed=0)
+        vector_env.action_space.seed(0)
+        episodes = 0
+        for _ in range(300):
+            _, _, terminateds, _, infos = vector_env.step(vector_env.action_space.sample())
+            for i in np.flatnonzero(terminateds):
+                episodes += 1
+                assert not infos["final_observation"][i]["board"].any() # all the coins were collected
+        assert episodes > 0
+    finally:
+        vector_env.close()
+
+
+def failing_env():
+    raise ValueError("no such environment")
+
+
+def test_failing_env_fn():
+    env_fn = AECToGymnasium(tictactoe_v3.env, external_agent="player_1", act_others=first_free_square)
+    with pytest.raises(RuntimeError, match="no such environment"): # the worker's traceback
+        SharedMemoryVectorEnv([env_fn, failing_env], num_workers=2, mp_context="spawn")
@@ -0,0 +1,130 @@
+import gymnasium as gym
+import numpy as np
+import pytest
+
+from pettingzoo.classic import tictactoe_v3
+from qwertyenv import TrajectoryRecorder, aec_to_gymnasium
+from qwertyenv.black_jack import BJEnv
+from qwertyenv.collect_coins import CollectCoinsEnv
+from qwertyenv.trajectory_recorder import read_trajectories
+
+
+def test_collect_coins(tmp_path):
+    # the env reuses its observations' arrays, the recorder keeps what was observed
+    env = TrajectoryRecorder(CollectCoinsEnv(copy_observations=False), str(tmp_path), chunk_size=50)
+    observation, _ = env.reset()
+    expected = []
+    for _ in range(120):
+        action = env.unwrapped.provide_alternative_valid_action(None)
+        row = {key: np.copy(value) for key, value in observation.items()}
+        observation, reward, terminated, truncated, _ = env.step(action)
+        expected.append((row, action, reward, terminated))
+        if terminated or truncated:
+            observation, _ = env.reset()
+    env.close()
+    assert len(env.chunks) == 3 # 50, 50 and 20 rows
+    assert env.num_transitions == 120
+
+    batches = list(read_trajectories(str(tmp_path), batch_size=32, unpack=True))
+    assert [len(batch["reward"]) for batch in batches] == [32, 18, 32, 18, 20]
+    columns = {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+    assert columns["obs.board"].dtype == bool and columns["obs.board"].shape == (120, 64)
+    assert columns["obs.player"].dtype == np.uint8
+    for i, (row, action, reward, terminated) in enumerate(expected):
+        for key, value in row.items():
+            np.testing.assert_array_equal(columns[f"obs.{key}"][i], value)
+        np.testing.assert_array_equal(columns["action"][i], action)
+        assert columns["reward"][i] == np.float32(reward)
+        assert columns["terminated"][i] == terminated
+
+
+def test_final_observation_of_truncated_episodes(tmp_path):
+    # the observation after an episode's last step is kept in 'final_obs', though the reset's is the next row's
+    env = gym.wrappers.TimeLimit(CollectCoinsEnv(copy_observations=False), max_episode_steps=20)
+    env = TrajectoryRecorder(env, str(tmp_path), chunk_size=16)
+    env.reset(seed=0)
+    final_observations = {}
+    for step in range(50):
+        observation, _, terminated, truncated, _ = env.step(env.unwrapped.provide_alternative_valid_action(None))
+        if terminated or truncated:
+            final_observations[step] = {key: np.copy(value) for key, value in observation.items()}
+            env.reset()
+    env.close()
+    assert sorted(final_observations) == [19, 39]
+
+    batches = list(read_trajectories(str(tmp_path), unpack=True))
+    columns = {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+    assert np.flatnonzero(columns["truncated"]).tolist() == [19, 39]
+    for step, observation in final_observations.items():
+        for key, value in observation.items():
+            np.testing.assert_array_equal(columns[f"final_obs.{key}"][step], value)
+    others = np.ones(50, dtype=bool)
+    others[[19, 39]] = False
+    assert not columns["final_obs.board"][others].any() and not columns["final_obs.player"][others].any()
+
+
+def test_packed_and_zero_copy(tmp_path):
+    env = TrajectoryRecorder(CollectCoinsEnv(), str(tmp_path), chunk_size=16)
+    env.reset()
+    for _ in range(10):
+        env.step(env.unwrapped.provide_alternative_valid_action(None))
+    env.close()
+    (batch,) = read_trajectories(str(tmp_path))
+    assert batch["obs.board"].shape == (10, 8) # 64 bits in 8 bytes
+    assert isinstance(batch["obs.board"], np.memmap) and isinstance(batch["reward"], np.memmap)
+
+
+class _BitsEnv(gym.Env):
+    observation_space = gym.spaces.MultiBinary(10)
+    action_space = gym.spaces.MultiBinary(3)
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        return self.observation_space.sample(), {}
+
+    def step(self, action):
+        return self.observation_space.sample(), 0.0, False, False, {}
+
+
+def test_only_observations_packed(tmp_path):
+    env = TrajectoryRecorder(_BitsEnv(), str(tmp_path))
+    env.reset(seed=0)
+    actions = [np.array([1, 0, 1], dtype=np.int8), np.array([0, 1, 1], dtype=np.int8)]
+    for action in actions:
+        env.step(action)
+    env.close()
+    (batch,) = read_trajectories(str(tmp_path))
+    assert batch["obs"].shape == (2, 2) # 10 bits in 2 bytes
+    np.testing.assert_array_equal(batch["action"], actions) # as taken, not packed
+
+
+def test_black_jack_and_aec(tmp_path):
+    env = TrajectoryRecorder(BJEnv(), str(tmp_path / "bj"))
+    env.reset(seed=0)
+    for _ in range(5):
+        _, _, terminated, _, _ = env.step(0)
+        if terminated:
+            env.reset()
+    env.close()
+    (batch,) = read_trajectories(str(tmp_path / "bj"))
+    assert len(batch["reward"]) == 5
+    assert set(batch) >= {"obs.player_sum", "obs.player_useful_Ace", "obs.dealer_shown_card", "action"}
+
+    def first_free_square(agent, observation):
+        return int(np.argmax(observation["action_mask"]))
+
+    env = TrajectoryRecorder(
+        aec_to_gymnasium(tictactoe_v3.env(), "player_1", first_free_square), str(tmp_path / "ttt")
+    )
+    observation, _ = env.reset(seed=0)
+    env.step(first_free_square(None, observation))
+    env.close()
+    (batch,) = read_trajectories(str(tmp_path / "ttt"))
+    assert batch["obs.observation"].shape == (1, 3, 3, 2)
+
+
+def test_unsupported_space(tmp_path):
+    env = gym.make("CartPole-v1")
+    env.observation_space = gym.spaces.Dict({"text": gym.spaces.Text(5)})
+    with pytest.raises(TypeError, match="Text space"):
+        TrajectoryRecorder(env, str(tmp_path))